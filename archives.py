@@ -0,0 +1,217 @@
+from datetime import date
+import os
+
+from workboy import (archivefilePrefix, blobfolderPath, catalogfilePath, countWork, datafolderPath, decodeRecord,
+    displayBuffer, encodeRecord, get, linkFile, openStore, parseDate, printBuffer, readIndexOrExit,
+    shardfolderPath, storeLock, syncFolder, writeFileAtomically)
+
+# An archive is a manifest naming, for each company, the blob its record was in: a file in the blob
+# folder named for the hash of its contents, as shards are. Records which are the same from one
+# archive to the next share one blob, so each archive stores only what changed since the others.
+# Blobs are kept apart from the shards so that nothing but deleting an archive ever removes them.
+# Manifests are compressed with lzma. Archives made before this hold a copy of every record
+# instead, and are read as they were.
+#
+# The catalog file holds each archive's file name, size, record count and checksum by date, so
+# listing the archives or finding one never opens the archives themselves.
+
+def archiveBlob(store, index, id):
+    """Stores index's record id in a blob, unless one holding the same is already there, and returns its
+    name. A journal store's shards are already blobs by another name, so they are linked in as they are."""
+    import hashlib
+    if store.format != 'sqlite':
+        blob = index.savedShard(id)
+        path = os.path.join(blobfolderPath, blob)
+        if not os.path.exists(path):
+            linkFile(os.path.join(shardfolderPath, blob), path)
+        return blob
+    data = encodeRecord(index[id], False)
+    blob = hashlib.sha1(data).hexdigest()
+    path = os.path.join(blobfolderPath, blob)
+    if not os.path.exists(path):
+        writeFileAtomically(path, data)
+    return blob
+
+def readArchiveFile(path):
+    """Returns the contents of the archive file at path, decompressed as it is read if it was compressed
+    with lzma or gzip. Raises ValueError if it can't be decompressed or read."""
+    import json
+    with open(path, 'rb') as archivefile:
+        magic = archivefile.read(6)
+    opener, errors = open, ()
+    if magic == b'\xfd7zXZ\x00':
+        import lzma
+        opener, errors = lzma.open, (lzma.LZMAError, EOFError)
+    elif magic.startswith(b'\x1f\x8b'):
+        import gzip
+        opener, errors = gzip.open, (gzip.BadGzipFile, EOFError)
+    try:
+        with opener(path, 'rt') as archivefile:
+            return json.load(archivefile)
+    except errors:
+        raise ValueError('The archive file {} is damaged.'.format(path))
+
+def archiveRecords(path, checksum=None):
+    """Yields the (ID, record) pairs held in the archive at path, reading each record's blob only as it is
+    asked for. Raises ValueError if the archive can't be read, doesn't match the given checksum, or names
+    a blob which is missing or damaged."""
+    import hashlib
+    if checksum != None and fileChecksum(path) != checksum:
+        raise ValueError('The archive file does not match the checksum it was catalogued with.')
+    archive = readArchiveFile(path)
+    if 'blobs' not in archive:
+        yield from archive.items()      # a copy of every record, as archives used to be
+        return
+    for id, blob in archive['blobs'].items():
+        try:
+            with open(os.path.join(blobfolderPath, blob), 'rb') as blobfile:
+                data = blobfile.read()
+        except FileNotFoundError:
+            raise ValueError('Record {} is missing from the archive blobs.'.format(id))
+        if hashlib.sha1(data).hexdigest() != blob:
+            raise ValueError('Record {} is damaged in the archive blobs.'.format(id))
+        yield id, decodeRecord(data)
+
+def fileChecksum(path):
+    "Returns the SHA-256 checksum of the file at path, read in chunks."
+    import hashlib
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(64 * 1024):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+def catalogEntry(path):
+    "Returns the catalog's entry for the archive file at path."
+    archive = readArchiveFile(path)
+    return {
+        'file': path[len(datafolderPath) + 1:],
+        'size': os.path.getsize(path),
+        'records': len(archive.get('blobs', archive)),
+        'checksum': fileChecksum(path)
+    }
+
+def archivePath(entry):
+    "Returns the path of the archive file a catalog entry is for."
+    return os.path.join(datafolderPath, entry['file'])
+
+def readCatalog():
+    """Returns the archive catalog: a dictionary from each archive's date to its catalog entry. If there is no
+    catalog yet, it is made from the archive files there are."""
+    import glob
+    import json
+    import re
+    try:
+        with open(catalogfilePath, 'r') as catalogfile:
+            return json.loads(catalogfile.read())
+    except FileNotFoundError:
+        pass
+
+    catalog = {}
+    for path in sorted(glob.glob(glob.escape(archivefilePrefix) + '*')):
+        countWork('regexes evaluated')
+        match = re.fullmatch(r'(\d{4}-\d{2}-\d{2})(\.xz|\.gz)?', path[len(archivefilePrefix):])
+        if match != None:
+            try:
+                catalog[match[1]] = catalogEntry(path)
+            except (OSError, ValueError):
+                print('Warning: archive file {} could not be read, and was left out of the catalog.'.format(path))
+    writeCatalog(catalog)
+    return catalog
+
+def writeCatalog(catalog):
+    "Writes the archive catalog, in order of date."
+    import json
+    writeFileAtomically(catalogfilePath, json.dumps(dict(sorted(catalog.items()))))
+
+def collectArchiveBlobs():
+    "Deletes the blobs which no archive refers to. Leaves them all if any archive can't be read."
+    import glob
+    referenced = set()
+    for path in glob.glob(glob.escape(archivefilePrefix) + '*'):
+        try:
+            referenced |= set(readArchiveFile(path).get('blobs', {}).values())
+        except (OSError, ValueError):
+            return
+    for blob in os.listdir(blobfolderPath):
+        if blob not in referenced:
+            os.remove(os.path.join(blobfolderPath, blob))
+
+def archiveDatafile(argv):
+    "Archives the current record under today's date."
+    import json
+    import lzma
+    store = openStore()
+    if not store.exists():
+        print('Failed: no record to archive.')
+        return
+
+    archivefilePath = archivefilePrefix + str(date.today()) + '.xz'
+    index = readIndexOrExit(store)
+    with storeLock:
+        manifest = { 'blobs': { id: archiveBlob(store, index, id) for id in sorted(index) } }
+        syncFolder(blobfolderPath)
+        writeFileAtomically(archivefilePath, lzma.compress(json.dumps(manifest).encode()))
+
+        catalog = readCatalog()
+        replaced = catalog.get(str(date.today()))
+        catalog[str(date.today())] = catalogEntry(archivefilePath)
+        writeCatalog(catalog)
+        if replaced != None:
+            if archivePath(replaced) != archivefilePath:
+                os.remove(archivePath(replaced))
+            collectArchiveBlobs()
+    print("History archived at:")
+    print("    " + archivefilePath)
+
+def restoreArchive(argv):
+    "Restores the archive from the specified date."
+    dateStr = dateStr if (dateStr := get(1, argv)) != None else ''
+    when = parseDate(dateStr)
+
+    if when == None:
+        print('Date input was malformed or did not exist. Could not identify which archive date to process.')
+        return
+    
+    entry = readCatalog().get(str(when))
+    if entry == None:
+        print('Failed: no archive from date "{}" exists.'.format(when))
+        return
+    try:
+        openStore().replace(archiveRecords(archivePath(entry), entry['checksum']))
+        print('Archive restored.')
+    except (OSError, ValueError) as e:
+        print(e)
+        print('Failed: the archive from date "{}" could not be read.'.format(when))
+
+def displayArchives(argv):
+    "Prints the archives held, as listed in the catalog."
+    catalog = readCatalog()
+
+    pre = "Held archives:\n" if len(catalog) > 0 else "No archived records."
+    printBuffer(pre)
+    for when, entry in catalog.items():
+        printBuffer('{}  {:>6} records  {:>10,} bytes'.format(when, entry['records'], entry['size']))
+
+    displayBuffer()
+
+def deleteArchive(argv):
+    "Deletes an archive file, and the blobs only it referred to."
+    dateStr = dateStr if (dateStr := get(1, argv)) != None else ''
+    when = parseDate(dateStr)
+
+    if when == None:
+        print('Date input was malformed or did not exist. Could not identify which archive data to delete.')
+        return
+
+    with storeLock:
+        catalog = readCatalog()
+        entry = catalog.pop(str(when), None)
+        if entry == None:
+            print('Failed: no archive from date "{}" exists.'.format(when))
+            return
+        if os.path.exists(archivePath(entry)):
+            os.remove(archivePath(entry))
+        writeCatalog(catalog)
+        collectArchiveBlobs()
+    print('Archive removed.')
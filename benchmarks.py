@@ -0,0 +1,454 @@
+from datetime import date
+from datetime import datetime
+import os
+import sys
+
+import workboy
+from workboy import (CompanyIndex, InputProcessorState, InterpreterConfig, buildTerms, classifyArgument,
+    compactHeaderMagic, dateFromString, dateToString, decodeRecord, decodeSnapshot, displayAll, displayBuffer,
+    displayRecentActivity, displayRecents, encodeRecord, encodeSnapshot, exportFormats, foldName, fuzzyMatches,
+    get, globalRecordSet, inputProcessor, interpretArgument, listToIDDictionary, newCompany, newContact, newLog,
+    openStore, parseDate, parseIDNumber, parsePhoneNumber, printBuffer, rankCompanies, regexCheck, regexDate,
+    regexDateShort, regexEmail, regexName, regexPhoneNumber, regexStreetAddress, regexURL, searchTokens,
+    summarizeCompany)
+
+# workboy's benchmarks, run by 'workboy bench'. They are kept out of workboy.py itself so that no other
+# command pays to compile or import them.
+
+
+# Tokens of every kind interpretArgument sees, plus a few that fool the patterns ahead of them.
+benchmarkTokens = [
+    'Jan 02, 2020', '1-2-20', '10-15', 'hr@example.com', '(555) 123-4567', '555 123 4567',
+    '123 Main St, Austin, TX 78701', 'Austin, TX', 'www.example.com/careers', 'Jane Smith',
+    'Had a phone screen with the hiring manager; next round is a take-home.', 'a, b, c'
+    ]
+
+def classifyArgumentChain(s):
+    "The regexCheck chain interpretArgument used before classifyArgument, kept as a baseline for benchmarking."
+    if regexCheck(regexDate, s) or regexCheck(regexDateShort, s):
+        date = parseDate(s)
+        return ('date', dateToString(date) if date else None)
+    if regexCheck(regexEmail, s):
+        return ('email', s)
+    if regexCheck(regexPhoneNumber, s):
+        return ('phone', parsePhoneNumber(s))
+    if regexCheck(regexStreetAddress, s):
+        return ('address', s)
+    if regexCheck(regexURL, s):
+        return ('url', s)
+    if regexCheck(regexName, s):
+        return ('name', s)
+    return (None, s)
+
+def benchmarkClassifier(rounds=2000):
+    "Times classifyArgument against the regexCheck chain over benchmarkTokens, after checking they agree."
+    import timeit
+
+    for token in benchmarkTokens:
+        assert classifyArgument(token) == classifyArgumentChain(token), 'Classifiers disagree on {!r}'.format(token)
+
+    printBuffer('interpretArgument field classification, {} tokens × {} rounds:'.format(len(benchmarkTokens), rounds))
+    results = []
+    for label, classify in (('regexCheck chain', classifyArgumentChain), ('compiled classifier', classifyArgument)):
+        seconds = timeit.timeit(lambda: [ classify(token) for token in benchmarkTokens ], number=rounds)
+        results.append(seconds)
+        printBuffer('    {:<20}: {:>7.2f} µs per token'.format(label, seconds / rounds / len(benchmarkTokens) * 10**6))
+    printBuffer('    {:.2f}× faster'.format(results[0] / results[1]))
+
+def benchmarkDates(rounds=200):
+    "Times dateFromString, with and without its memo cache, against strptime over a spread of stored dates."
+    import inspect
+    import timeit
+
+    samples = [ dateToString(date.fromordinal(date(2020, 1, 1).toordinal() + i % 365)) for i in range(2000) ]
+
+    printBuffer('Stored-date parsing, {} dates × {} rounds:'.format(len(samples), rounds))
+    for label, parse in (
+        ('strptime', lambda s: datetime.strptime(s, '%b %d, %Y').date()),
+        ('hand-rolled', inspect.unwrap(dateFromString)),
+        ('memoized', dateFromString)
+        ):
+        seconds = timeit.timeit(lambda: [ parse(s) for s in samples ], number=rounds)
+        printBuffer('    {:<20}: {:>7.2f} µs per date'.format(label, seconds / rounds / len(samples) * 10**6))
+
+# Wall-clock budgets for a cold start, in milliseconds over the bare interpreter's own startup.
+startupBudgets = {
+    'help': 60,
+    'dashboard': 120
+    }
+
+def timeRuns(args, env, cwd, rounds):
+    "Runs the interpreter with the given arguments rounds times, and returns how long each run took in milliseconds."
+    import subprocess
+    import time
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, env=env, cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def benchmarkStartup(rounds=10):
+    """Times whole runs of the script against its startup budgets, using a scratch data folder. Returns
+    the exit status: 1 if any run is over its budget."""
+    import subprocess
+    import tempfile
+
+    def bestRun(args, env, cwd):
+        return min(timeRuns(args, env, cwd, rounds))
+
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, LOCALAPPDATA=folder)
+        script = os.path.abspath(workboy.__file__)
+        interpreter = bestRun(['-c', 'pass'], env, folder)
+        subprocess.run([sys.executable, script, 'once', 'add', 'Benchmark Co'], env=env, cwd=folder,
+            stdout=subprocess.DEVNULL, check=True)
+
+        printBuffer('Cold start, best of {} runs ({:.1f} ms of which is the interpreter):'.format(rounds, interpreter))
+        status = 0
+        for label, args in (('help', ['help']), ('dashboard', ['--no-pager'])):
+            elapsed = bestRun([script] + args, env, folder) - interpreter
+            verdict = 'ok' if elapsed <= startupBudgets[label] else 'OVER BUDGET'
+            status = 1 if verdict != 'ok' else status
+            printBuffer('    {:<20}: {:>7.1f} ms (budget {} ms) {}'.format(label, elapsed, startupBudgets[label], verdict))
+    return status
+
+def syntheticCompany(n):
+    "Returns the nth of a repeatable series of made-up company records, with a few contacts, notes and log entries each."
+    record = newCompany('Company {}'.format(n))
+    record['url'] = 'www.company{}.com'.format(n)
+    record['phone'] = str(5550000000 + n)
+    record['address'] = '{} Main St, Austin, TX 78701'.format(n % 900 + 100)
+    record['contacts'] = listToIDDictionary([
+        { 'name': 'Contact {}'.format(c), 'email': 'contact{}@company{}.com'.format(c, n), 'phone': '', 'primary': c == 0 }
+        for c in range(n % 3) ], l=2)
+    record['info'] = listToIDDictionary([ 'Note {} about company {}.'.format(i, n) for i in range(n % 4) ], l=2)
+    start = date(2020, 1, 1).toordinal() + n % 700
+    record['log'] = listToIDDictionary([
+        { 'date': dateToString(date.fromordinal(start + 9 * i)), 'message': 'Interaction {} with company {}.'.format(i, n) }
+        for i in range(n % 6) ], l=2)
+    record['defunct'] = n % 7 == 0
+    record['summary'] = summarizeCompany(record)
+    return record
+
+def syntheticIndex(count):
+    "Returns a company index of count synthetic companies, each given a stand-in shard name."
+    import hashlib
+    index = CompanyIndex(records={ parseIDNumber(n, 4): syntheticCompany(n) for n in range(count) })
+    for id in index:
+        index.stubs[id].shard = hashlib.sha1(id.encode()).hexdigest()
+    return index
+
+def benchmarkFormat(count=20000, rounds=3):
+    "Compares the JSON and compact formats' size, load time and loaded footprint over a large synthetic index."
+    import json
+    import timeit
+    import tracemalloc
+
+    index = syntheticIndex(count)
+    records = [ index[id] for id in index ]
+    snapshots = { 'json': encodeSnapshot(index) }
+    index.compact = True
+    snapshots['compact'] = encodeSnapshot(index)
+    assert snapshots['compact'].startswith(compactHeaderMagic), 'The synthetic index fell back to JSON'
+
+    def footprint(load):
+        tracemalloc.start()
+        loaded = load()     # held until measured, so that its memory is counted
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded
+        return size
+
+    printBuffer('Index header of {} companies:'.format(count))
+    printBuffer('    {:<20}: {:>9} bytes, loads in {:>6.1f} ms to {:>9} bytes'.format('as plain dicts',
+        len(snapshots['json']), min(timeit.repeat(lambda: json.loads(snapshots['json']), number=1, repeat=rounds)) * 1000,
+        footprint(lambda: json.loads(snapshots['json']))))
+    for label, data in snapshots.items():
+        seconds = min(timeit.repeat(lambda: decodeSnapshot(data), number=1, repeat=rounds))
+        printBuffer('    {:<20}: {:>9} bytes, loads in {:>6.1f} ms to {:>9} bytes'.format(label,
+            len(data), seconds * 1000, footprint(lambda: decodeSnapshot(data))))
+
+    printBuffer('Company records, {} shards:'.format(count))
+    for compact in (False, True):
+        shards = [ encodeRecord(record, compact) for record in records ]
+        seconds = min(timeit.repeat(lambda: [ decodeRecord(shard) for shard in shards ], number=1, repeat=rounds))
+        printBuffer('    {:<20}: {:>9} bytes, {:>6.1f} µs per record read'.format('compact' if compact else 'json',
+            sum(len(shard) for shard in shards), seconds / count * 10**6))
+
+searchQueries = ('interaction', 'note about company', 'company 1234', 'interaction 4 with company 777')
+
+def benchmarkSearch(count=20000, rounds=20):
+    """Times ranking searches over a large synthetic index held in memory, then whole search commands,
+    from starting the interpreter to printing the results, over a store of the same companies."""
+    import json
+    import subprocess
+    import tempfile
+    import timeit
+
+    index = syntheticIndex(count)
+    index.terms, index.termsComplete = buildTerms(index), True
+    printBuffer('Search index of {} companies in memory, {} tokens:'.format(count, len(index.terms)))
+
+    for query in searchQueries:
+        tokens = list(dict.fromkeys(searchTokens(query)))
+        matches = len(rankCompanies(index, tokens))
+        seconds = timeit.timeit(lambda: rankCompanies(index, tokens), number=rounds) / rounds
+        printBuffer('    {:<32}: {:>7.2f} ms, {} companies'.format("'{}'".format(query), seconds * 1000, matches))
+
+    printBuffer('Fuzzy name resolution over the same index:')
+    for name in ('Compnay 1234', 'company 12345', 'Contact 1 of 777', 'Compny'):
+        best = fuzzyMatches(index, name)[:1]
+        seconds = timeit.timeit(lambda: fuzzyMatches(index, name), number=rounds) / rounds
+        printBuffer('    {:<32}: {:>7.2f} ms, best {}'.format("'{}'".format(name), seconds * 1000, best[0][2] if best else None))
+
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, LOCALAPPDATA=folder)
+        script = os.path.abspath(workboy.__file__)
+        rows = os.path.join(folder, 'companies.jsonl')
+        with open(rows, 'w') as rowsfile:
+            for n in range(count):
+                record = syntheticCompany(n)
+                log = next(iter(record['log'].values()), { 'date': '', 'message': '' })
+                rowsfile.write(json.dumps({ 'name': record['name'], 'url': record['url'], 'info': next(iter(record['info'].values()), ''),
+                    'date': log['date'], 'log': log['message'] }) + '\n')
+        subprocess.run([sys.executable, script, 'import', rows], env=env, cwd=folder, stdout=subprocess.DEVNULL, check=True)
+
+        searches = max(rounds // 4, 1)
+        printBuffer('Whole search commands over a store of the same companies, {} runs each:'.format(searches))
+        for query in searchQueries:
+            times = timeRuns([script, 'search', '--no-pager'] + query.split(), env, folder, searches)
+            printBuffer('    {:<32}: {:>7.1f} ms best, {:>7.1f} ms first'.format("'{}'".format(query), min(times), times[0]))
+
+def benchmarkExport(count=20000):
+    """Times each export format over a large synthetic index, and measures the memory each uses beyond the
+    index at a quarter of the size and at full size, which should be about the same."""
+    import time
+    import tracemalloc
+
+    def peak(format, index):
+        tracemalloc.start()
+        for chunk in exportFormats[format](index):
+            pass
+        size = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size
+
+    small, index = syntheticIndex(count // 4), syntheticIndex(count)
+    printBuffer('Export of {} companies:'.format(count))
+    for format in exportFormats:
+        start = time.perf_counter()
+        size = sum( len(chunk) for chunk in exportFormats[format](index) )
+        seconds = time.perf_counter() - start
+        printBuffer('    {:<8}: {:>8.0f} companies/s, {:>6.1f} MB/s, peak {:>7} bytes ({:>7} at {} companies)'.format(format,
+            count / seconds, size / seconds / 10**6, peak(format, index), peak(format, small), count // 4))
+
+# The suite times whole command paths over a store of realistic made-up companies, built afresh in a
+# scratch data folder by a second workboy process so that the user's own store is never touched.
+
+suiteNameWords = (
+    ('Acme', 'Blue', 'Bright', 'Cedar', 'Delta', 'Echo', 'Granite', 'Harbor', 'Iron', 'Juniper', 'Keystone',
+        'Lumen', 'Maple', 'North', 'Orbit', 'Pioneer', 'Quarry', 'River', 'Summit', 'Tidal', 'Union', 'Vertex'),
+    ('Analytics', 'Bank', 'Cloud', 'Data', 'Devices', 'Energy', 'Foods', 'Games', 'Health', 'Labs', 'Logistics',
+        'Media', 'Robotics', 'Security', 'Software', 'Systems', 'Telecom', 'Travel', 'Ventures', 'Works'),
+    ('', '', '', 'Inc.', 'LLC', 'Group', 'Co.', 'Partners')
+    )
+suitePeople = ('Alex', 'Jordan', 'Sam', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn'), \
+    ('Smith', 'Garcia', 'Chen', 'Patel', 'Kim', 'Nguyen', 'Brown', 'Lopez', 'Okafor', 'Novak')
+suitePlaces = (('Austin', 'TX'), ('Denver', 'CO'), ('Seattle', 'WA'), ('Boston', 'MA'), ('Raleigh', 'NC'), ('Chicago', 'IL'))
+suiteNotes = (
+    'Remote friendly, team of {} engineers.', 'Found through a referral from {}.', 'Stack is mostly Python and Postgres.',
+    'Salary band posted at {}k.', 'Glassdoor reviews mention long hours.', 'Hiring for the {} team.'
+    )
+suiteEvents = (
+    'Applied through the careers page.', 'Recruiter screen with {}.', 'Technical interview, {} rounds.',
+    'Take-home assignment sent.', 'Followed up by email.', 'Onsite with the hiring manager.', 'Rejected after round {}.',
+    'Offer call; asked for {} days to decide.'
+    )
+
+def seededCompanies(count, seed=0):
+    """Yields count realistic made-up company records, built with newCompany(), newContact() and newLog(), the
+    same ones for the same seed: a few contacts, notes and log entries each over the last two years, and
+    about a fifth of the applications closed."""
+    import random
+    rng = random.Random(seed)
+    names = set()
+    today = date.today().toordinal()
+    for n in range(count):
+        name = ' '.join(filter(None, (rng.choice(words) for words in suiteNameWords)))
+        if foldName(name) in names:
+            name += ' {}'.format(n)
+        names.add(foldName(name))
+        slug = ''.join(c for c in name.lower() if c.isalnum())
+        city, state = rng.choice(suitePlaces)
+
+        record = newCompany(name)
+        record['url'] = 'www.{}.com'.format(slug)
+        record['phone'] = str(rng.randrange(2000000000, 9999999999))
+        record['address'] = '{} {} St, {}, {} {:05}'.format(rng.randrange(1, 9999), rng.choice(suitePeople[1]), city, state, rng.randrange(10000, 99999))
+
+        contacts = []
+        for c in range(rng.choice((0, 1, 1, 2, 3))):
+            contact = newContact()
+            first, last = rng.choice(suitePeople[0]), rng.choice(suitePeople[1])
+            contact['name'] = '{} {}'.format(first, last)
+            contact['email'] = '{}.{}@{}.com'.format(first, last, slug).lower()
+            contact['phone'] = str(rng.randrange(2000000000, 9999999999)) if rng.random() < 0.5 else ''
+            contact['primary'] = c == 0
+            contacts.append(contact)
+        record['contacts'] = listToIDDictionary(contacts, l=2)
+        record['info'] = listToIDDictionary([ rng.choice(suiteNotes).format(rng.randrange(2, 200))
+            for i in range(rng.choice((0, 1, 1, 2, 4))) ], l=2)
+
+        logs = []
+        for when in sorted( today - rng.randrange(730) for i in range(rng.choice((0, 1, 2, 3, 5, 8))) ):
+            log = newLog()
+            log['date'] = dateToString(date.fromordinal(when))
+            log['message'] = rng.choice(suiteEvents).format(rng.choice(suitePeople[0]) if rng.random() < 0.5 else rng.randrange(2, 6))
+            logs.append(log)
+        record['log'] = listToIDDictionary(logs, l=2)
+        record['defunct'] = rng.random() < 0.2
+        record['summary'] = summarizeCompany(record)
+        yield record
+
+def benchmarkSuite(args):
+    """Runs the suite at each size given among args, each in its own scratch data folder, and prints each
+    operation's first and best times, compared against a baseline if one is given. Returns the exit
+    status: 1 if anything regressed past the tolerance."""
+    import json
+    import subprocess
+    import tempfile
+
+    def option(name, default):
+        return args[args.index(name) + 1] if name in args and args.index(name) + 1 < len(args) else default
+    seed, rounds = int(option('--seed', 0)), int(option('--rounds', 5))
+    if '--scratch' in args:
+        return benchmarkSuiteRun(int(args[args.index('--scratch') + 1]), seed, rounds)
+    sizes = [ int(arg) for i, arg in enumerate(args) if arg.isdigit() and (i == 0 or not args[i - 1].startswith('--')) ] or [1000, 10000]
+    tolerance = float(option('--tolerance', 25)) / 100
+
+    baseline = {}
+    if (path := option('--baseline', None)) != None:
+        try:
+            with open(path, 'r') as baselinefile:
+                for line in baselinefile:
+                    if line.strip():
+                        result = json.loads(line)
+                        baseline[(result['scale'], result['operation'])] = result['best_ms']
+        except (OSError, ValueError, KeyError) as e:
+            printBuffer('Failed: could not read the baseline from {}: {}'.format(path, e))
+            return 1
+
+    regressions = 0
+    script = os.path.abspath(workboy.__file__)
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            run = subprocess.run([sys.executable, script, 'bench', 'suite', '--scratch', str(size), '--seed', str(seed), '--rounds', str(rounds)],
+                env=dict(os.environ, LOCALAPPDATA=folder), cwd=folder, capture_output=True, text=True)
+        if run.returncode != 0:
+            printBuffer('Failed: the suite at {} companies stopped with: {}'.format(size, run.stderr.strip().splitlines()[-1:]))
+            return 1
+
+        printBuffer('Suite over {} companies, seed {}, {} rounds:'.format(size, seed, rounds))
+        for result in map(json.loads, run.stdout.splitlines()):
+            line = '    {:<22}: {:>9.2f} ms best, {:>9.2f} ms first'.format(result['operation'], result['best_ms'], result['first_ms'])
+            before = baseline.get((result['scale'], result['operation']))
+            if before != None:
+                result['baseline_ms'] = before
+                result['regression'] = result['best_ms'] > before * (1 + tolerance)
+                regressions += result['regression']
+                line += ', {:+.0f}% on baseline{}'.format((result['best_ms'] / before - 1) * 100 if before else 0,
+                    ' REGRESSION' if result['regression'] else '')
+            printBuffer(line, result)
+    if baseline:
+        printBuffer('{} operations regressed by more than {:.0f}%.'.format(regressions, tolerance * 100))
+    return 1 if regressions else 0
+
+def benchmarkSuiteRun(count, seed, rounds):
+    """Builds a store of count seeded companies in the data folder, which must hold no store yet, and times
+    each operation on it over the given number of rounds, printing one JSON line for each. Returns the
+    exit status."""
+    import contextlib
+    import json
+    import random
+    import time
+
+    store = openStore()
+    if store.exists():
+        print('Failed: the suite only runs against an empty scratch data folder.', file=sys.stderr)
+        return 1
+    rng = random.Random(seed)
+    quiet = open(os.devnull, 'w')
+
+    def measure(operation, run, before=None, after=None, repeat=rounds):
+        times = []
+        for i in range(repeat):
+            with contextlib.redirect_stdout(quiet):
+                before(i) if before else None
+                start = time.perf_counter()
+                run(i)
+                times.append(time.perf_counter() - start)
+                after(i) if after else None
+        print(json.dumps({ 'operation': operation, 'scale': count, 'seed': seed, 'rounds': repeat,
+            'first_ms': round(times[0] * 1000, 3), 'best_ms': round(min(times) * 1000, 3) }))
+
+    def command(index, args, interactive=True):
+        state = InputProcessorState(index, args, globalRecordSet)
+        state.pollingEnabled = False
+        state.interactive = interactive
+        inputProcessor(state)
+        return state
+
+    index = CompanyIndex()
+    for id, record in zip(index.ids.allocateMany(count), seededCompanies(count, seed)):
+        index[id] = record
+    measure('save (all)', lambda i: store.save(index, set(index)), repeat=1)
+    measure('load', lambda i: store.load())
+
+    index = store.load()
+    picks = rng.sample(sorted(index), min(rounds, len(index)))
+    names = [ index.stub(id)['name'] for id in picks ]
+    measure('displayRecents', lambda i: displayRecents(InputProcessorState(index, [], globalRecordSet)))
+    measure('displayAll', lambda i: displayAll(InputProcessorState(index, [], globalRecordSet)))
+    measure('displayRecentActivity', lambda i: displayRecentActivity(InputProcessorState(index, [], globalRecordSet)))
+    measure('selectCompany (ID)', lambda i: command(index, [picks[i % len(picks)]]))
+    measure('selectCompany (name)', lambda i: command(index, [names[i % len(names)]]))
+    measure('addCompany', lambda i: command(index, ['add', 'Suite Added Company {}'.format(i)]))
+
+    index = store.load()        # drops the added companies unsaved
+    edit = lambda i: command(index, [picks[i % len(picks)], 'log', dateToString(date.today()), 'Followed up by phone.'], False)
+    save = lambda i: store.save(index, { picks[i % len(picks)] })
+    measure('editLog', edit, after=save)
+    measure('save (one edit)', save, before=edit)
+
+    config = InterpreterConfig()
+    config.url = config.phone = config.address = config.email = config.date = config.message = True
+    tokens = [ value for record in seededCompanies(200, seed) for value in (record['url'], record['phone'],
+        record['address'], *record['info'].values(), *( log['date'] for log in record['log'].values() )) ]
+    measure('interpretArgument', lambda i: [ interpretArgument(token, {}, config) for token in tokens ])
+    return 0
+
+benchmarks = {
+    'classify': benchmarkClassifier,
+    'dates': benchmarkDates,
+    'startup': benchmarkStartup,
+    'format': benchmarkFormat,
+    'search': benchmarkSearch,
+    'export': benchmarkExport
+    }
+
+def runBenchmarks(argv):
+    """Runs the named benchmark, or all of them but the suite, and prints the results. Returns the exit
+    status: 1 if the suite finds a regression or a run is over its startup budget."""
+    name = get(1, argv)
+    status = 0
+    if name == 'suite':
+        status = benchmarkSuite(argv[2:])
+    elif name != None and name not in benchmarks:
+        printBuffer("Unknown benchmark '{}'. Known benchmarks: {}, suite".format(name, ', '.join(benchmarks)))
+    else:
+        for key, benchmark in benchmarks.items():
+            if name in (None, key):
+                status = benchmark() or status
+    displayBuffer()
+    return status
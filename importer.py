@@ -0,0 +1,194 @@
+import os
+import sys
+
+from workboy import (classifyArgument, dateToString, displayBuffer, foldName, get, newCompany, newContact,
+    newLog, openStore, parseDate, parseIDNumber, printBuffer, readIndexOrExit, regexCheck, regexName,
+    summarizeCompany)
+
+# 'workboy import' adds companies from a CSV or JSON Lines file, checking each row as the edit commands
+# would and spreading the checking of large files across a process pool.
+
+importColumns = ('name', 'url', 'phone', 'address', 'defunct', 'info', 'contact', 'email', 'contact phone', 'date', 'log')
+importChunkSize = 500               # Rows are checked this many at a time.
+importParallelMinimum = 20000       # Files with fewer rows than this are checked without a process pool.
+importChunksAhead = 4               # Chunks given to each of the pool's processes ahead of the one being read back.
+
+def readImportRows(file):
+    """Yields (line number, row) pairs from an open import file, as they are read. The rows of a CSV file
+    are dictionaries of column → text; those of a JSON Lines file, told apart by the '{' they start
+    with, are left as the line's text to be parsed with the rest of the checking."""
+    import csv
+    import itertools
+    head = file.readline()
+    if head.lstrip().startswith('{'):
+        for number, line in enumerate(itertools.chain([head], file), start=1):
+            if line.strip():
+                yield number, line
+        return
+
+    reader = csv.reader(itertools.chain([head], file))
+    columns = [ column.strip().lower() for column in next(reader, []) ]
+    for row in reader:
+        if any(row):
+            yield reader.line_num, dict(zip(columns, row))
+
+def importRecord(row):
+    """Returns the company record an import row describes, with each field checked and normalized by the
+    same rules as the edit commands': names against regexName, dates through parseDate(), which also
+    takes the ISO dates spreadsheets export, and the rest through classifyArgument(). Raises ValueError
+    with the reason if any field won't do."""
+    import json
+    if type(row) == str:
+        try:
+            row = json.loads(row)
+        except ValueError:
+            raise ValueError('Line is not a JSON object.')
+        if type(row) != dict:
+            raise ValueError('Line is not a JSON object.')
+        row = { str(k).strip().lower(): v for k, v in row.items() }
+    values = { k: str(v).strip() for k, v in row.items() if v != None and str(v).strip() }
+
+    unknown = [ k for k in values if k not in importColumns ]
+    if unknown:
+        raise ValueError("Unknown column '{}'.".format(unknown[0]))
+
+    def name(column):
+        value = values.get(column, '')
+        if value and not regexCheck(regexName, value):
+            raise ValueError("'{}' does not fit the {} field schema.".format(value, column))
+        return value
+
+    def field(column, kind):
+        value = values.get(column)
+        if value == None:
+            return ''
+        found, normalized = classifyArgument(value)
+        if found != kind or normalized == None:
+            raise ValueError("'{}' is not a valid {} for column '{}'.".format(value, kind, column))
+        return normalized
+
+    record = newCompany(name('name'))
+    if not record['name']:
+        raise ValueError('Row has no company name.')
+    record['url'] = field('url', 'url')
+    record['phone'] = field('phone', 'phone')
+    record['address'] = field('address', 'address')
+
+    defunct = values.get('defunct', '').lower()
+    if defunct not in ('', 'yes', 'no', 'true', 'false', '1', '0', 'x', 'defunct'):
+        raise ValueError("'{}' is not a valid yes or no for column 'defunct'.".format(values['defunct']))
+    record['defunct'] = defunct in ('yes', 'true', '1', 'x', 'defunct')
+
+    if 'info' in values:
+        record['info'][parseIDNumber(0, 2)] = values['info']
+    contact = newContact()
+    contact['name'], contact['email'], contact['phone'] = name('contact'), field('email', 'email'), field('contact phone', 'phone')
+    if contact != newContact():
+        contact['primary'] = True
+        record['contacts'][parseIDNumber(0, 2)] = contact
+    if 'log' in values or 'date' in values:
+        log = newLog()
+        if 'date' in values:
+            when = parseDate(values['date'])
+            if when == None:
+                raise ValueError("'{}' is not a valid date for column 'date'.".format(values['date']))
+            log['date'] = dateToString(when)
+        log['message'] = values.get('log', '')
+        record['log'][parseIDNumber(0, 2)] = log
+
+    record['summary'] = summarizeCompany(record)
+    return record
+
+def checkImportRows(rows):
+    """Returns a (line number, record, reason) triple for each (line number, row) pair given, the record
+    being None and the reason why if the row won't do. Runs in the import's process pool."""
+    results = []
+    for number, row in rows:
+        try:
+            results.append((number, importRecord(row), None))
+        except ValueError as e:
+            results.append((number, None, str(e)))
+    return results
+
+def checkedImportRows(rows):
+    """Yields the checkImportRows() triples for every row of an import file, in order. Rows are checked in
+    chunks, across a process pool if there are many of them and processors to share them. The pool is
+    only ever given a few chunks per process ahead of the one being yielded, so however large the file,
+    no more than that of it is read ahead and held."""
+    import collections
+    import itertools
+    chunks = iter(lambda: list(itertools.islice(rows, importChunkSize)), [])
+    head = list(itertools.islice(chunks, importParallelMinimum // importChunkSize))
+    if len(head) < importParallelMinimum // importChunkSize or (os.cpu_count() or 1) < 2:
+        for chunk in itertools.chain(head, chunks):
+            yield from checkImportRows(chunk)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    workers = min(os.cpu_count(), 61)      # the most processes a pool may have on Windows
+    with ProcessPoolExecutor(workers) as pool:
+        pending = collections.deque()
+        for chunk in itertools.chain(head, chunks):
+            pending.append(pool.submit(checkImportRows, chunk))
+            if len(pending) >= workers * importChunksAhead:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def importCompanies(argv):
+    """Adds a company for each row of the given CSV or JSON Lines file, or of stdin if it is '-', checking
+    each field as the edit commands would, then saves them at once. Rows naming companies already in
+    the index, or earlier in the file, are refused. With '--atomic', nothing is saved if any row fails.
+    Returns the exit status."""
+    import contextlib
+    import csv
+    atomic = '--atomic' in argv
+    source = get(0, [ arg for arg in argv[1:] if arg != '--atomic' ])
+    if source == None:
+        print("Failed: give the file to import companies from, or '-' for standard input.")
+        return 1
+
+    store = openStore()
+    index = readIndexOrExit(store)
+    records = []
+    failures = []   # (line number, reason)
+    names = set()
+    progress = sys.stdout.isatty()
+
+    try:
+        opened = contextlib.nullcontext(sys.stdin) if source == '-' else open(source, 'r', newline='', encoding='utf-8-sig')
+        with opened as file:
+            for count, (number, record, reason) in enumerate(checkedImportRows(readImportRows(file)), start=1):
+                if reason == None and (index.lookupName(record['name']) != None or foldName(record['name']) in names):
+                    reason = "'{}' already exists in the record.".format(record['name'])
+                if reason != None:
+                    failures.append((number, reason))
+                else:
+                    records.append(record)
+                    names.add(foldName(record['name']))
+                if progress and count % importChunkSize == 0:
+                    print('\rChecked {} rows...'.format(count), end='', flush=True)
+    except OSError as e:
+        print('Failed: could not read companies from {}: {}'.format(source, e.strerror))
+        return 1
+    except (UnicodeDecodeError, csv.Error) as e:
+        print('Failed: could not read companies from {}: {}'.format(source, e))
+        return 1
+    if progress:
+        print('\r' + ' ' * 40 + '\r', end='')
+
+    for number, reason in failures:
+        printBuffer('Line {}: {}'.format(number, reason))
+    printBuffer('{} companies read, {} rows failed.'.format(len(records), len(failures)))
+
+    if atomic and failures:
+        printBuffer('Nothing was saved.')
+    elif records:
+        ids = index.ids.allocateMany(len(records))
+        for id, record in zip(ids, records):
+            index[id] = record
+        if not store.save(index, set(ids)):
+            return 1
+        printBuffer('Imported {} companies.'.format(len(records)))
+    displayBuffer()
+    return 1 if failures else 0
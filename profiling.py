@@ -0,0 +1,90 @@
+import functools
+import sys
+
+import workboy
+from sqlitestore import SQLiteStore
+from workboy import JournalStore, Switcher
+
+# With --profile, or WORKBOY_PROFILE set, a call reports where its time went: each dispatched command
+# and each load, save and compaction of the store is timed, alongside the counts of work done which
+# workboy keeps as it goes. The timers are not in place otherwise; startProfiling wraps the timed
+# functions when asked, so unprofiled calls run the code exactly as written.
+
+profileTimings = {}     # Phase name → [calls, seconds], filled in while profiling.
+profileState = {}       # The start time and the cProfile profiler, if one was asked for.
+
+def timed(name, function):
+    "Returns function wrapped to add its calls and the time they take to the profile's timings under name."
+    import time
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timing = profileTimings.setdefault(name, [0, 0.0])
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+    return wrapper
+
+def startProfiling(targets):
+    "Puts the timers and counters in place for the rest of this call, and cProfile too if a .prof file is a target."
+    import time
+
+    workboy.workCounts.clear()
+    for phase in ('readTerms', 'compactStore', 'writeShards'):
+        setattr(workboy, phase, timed(phase, getattr(workboy, phase)))
+    for store in (JournalStore, SQLiteStore):
+        for phase in ('load', 'save'):
+            setattr(store, phase, timed(phase, getattr(store, phase)))
+
+    switch = Switcher.switch
+    def timedSwitch(self, key):
+        command = switch(self, key)
+        return timed('command ' + command.__name__, command) if command else command
+    Switcher.switch = timedSwitch
+
+    if any(target.endswith('.prof') for target in targets):
+        import cProfile
+        profileState['cProfile'] = cProfile.Profile()
+        profileState['cProfile'].enable()
+    profileState['start'] = time.perf_counter()
+
+def finishProfiling(targets, argv):
+    """Reports the profile: to each .json target as a JSON object, the cProfile statistics to each .prof
+    target, and as a summary on stderr unless a .json target takes it."""
+    import json
+    import time
+
+    total = time.perf_counter() - profileState['start']
+    if 'cProfile' in profileState:
+        profileState['cProfile'].disable()
+        for target in targets:
+            if target.endswith('.prof'):
+                profileState['cProfile'].dump_stats(target)
+
+    report = {
+        'argv': [ arg for arg in argv if arg != '--profile' and not arg.startswith('--profile=') ],
+        'total ms': round(total * 1000, 3),
+        'timings': { name: {'calls': calls, 'ms': round(seconds * 1000, 3)}
+                     for name, (calls, seconds) in sorted(profileTimings.items(), key=lambda item: -item[1][1]) },
+        'counters': dict(sorted(workboy.workCounts.items())),
+    }
+    jsonTargets = [ target for target in targets if not target.endswith('.prof') ]
+    for target in jsonTargets:
+        with open(target, 'w') as file:
+            json.dump(report, file, indent=2)
+            file.write('\n')
+    if jsonTargets:
+        return
+
+    lines = ['Profile of workboy {}: {:.1f} ms'.format(' '.join(report['argv']), report['total ms'])]
+    for name, timing in report['timings'].items():
+        lines.append('    {:<30}: {:>9.1f} ms over {} call{}'.format(name, timing['ms'], timing['calls'],
+                                                                  '' if timing['calls'] == 1 else 's'))
+    for name, count in report['counters'].items():
+        lines.append('    {:<30}: {:>9}'.format(name, count))
+    sys.stdout.flush()
+    print('\n'.join(lines), file=sys.stderr)
+
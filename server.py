@@ -0,0 +1,245 @@
+import io
+import os
+import sys
+
+import workboy
+from workboy import get, openStore, output, readIndexOrExit, runCommand, serverSocketPath, storeVersion
+
+# 'workboy serve' reads the company index once and keeps it, answering the workboy calls forwarded to
+# it over a Unix socket. While it runs, workboy itself only passes its arguments along and relays the
+# console: the server sends back lines to print and asks for lines of input, one JSON object apiece.
+# A call which the server can't take up at once, as while another waits on its user, or which hears
+# nothing back from it in time, isn't kept waiting; it reads and saves the store's files as usual.
+
+serverBusyTimeout = 0.5     # Seconds a forwarded call waits for the one before it to finish before going it alone.
+serverReplyTimeout = 2.0    # Seconds a client waits for the server to answer before going it alone.
+serverPollInterval = 0.2    # Seconds between the server's checks for having been asked to stop.
+
+class ClientStream(io.TextIOBase):
+    """Stands in for the console while a forwarded call is served: text written is sent on to the
+    client to print, and each line read is asked of it, so input() prompts at the client's end."""
+    def __init__(self, connection):
+        self.reader = connection.makefile('r', encoding='utf-8')
+        self.writer = connection.makefile('w', encoding='utf-8')
+        self.pending = []
+
+    def send(self, **message):
+        import json
+        self.writer.write(json.dumps(message) + '\n')
+        self.writer.flush()
+
+    def receive(self):
+        "Returns the client's next message, or an empty one if it has gone."
+        import json
+        line = self.reader.readline()
+        return json.loads(line) if line else {}
+
+    def write(self, text):
+        self.pending.append(text)
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            text, self.pending = ''.join(self.pending), []
+            self.send(out=text)
+
+    def readline(self, size=-1):
+        self.flush()
+        self.send(read=True)
+        return self.receive().get('line', '')
+
+    def read(self, size=-1):
+        return ''.join(iter(self.readline, ''))
+
+class IndexServer:
+    """The company index as kept by 'workboy serve', along with the store it was read from. It is read
+    again whenever the store's files have changed since, or a call may have left it half edited. Calls
+    are served one at a time, each under the server's lock; what they change is saved by a writer
+    thread once they have replied, which takes the lock too."""
+    def __init__(self):
+        import threading
+        self.store = None
+        self.index = None
+        self.signature = None
+        self.lock = threading.Lock()
+        self.changed = set()                # IDs changed by the calls served since the last save
+        self.unsaved = threading.Event()    # set while there are changes for the writer to save
+        self.stopping = threading.Event()   # set once a client has asked the server to stop
+
+    def loadedIndex(self):
+        if self.index == None or self.signature != storeVersion():
+            self.store = openStore()
+            self.index = readIndexOrExit(self.store)
+            self.signature = storeVersion()
+        return self.index
+
+    def saveChanges(self):
+        "Saves what the calls served since the last save changed. The server's lock must be held."
+        changed, self.changed = self.changed, set()
+        self.unsaved.clear()
+        if not changed:
+            return
+        # A save merged with someone else's, or refused over one, leaves this index behind the store.
+        current = self.signature == storeVersion()
+        if self.store.save(self.index, changed) and current:
+            self.signature = storeVersion()
+        else:
+            self.index = None
+
+    def writeChanges(self):
+        "Saves the changes calls leave in the index as they come, in the background, for as long as the server runs."
+        while True:
+            self.unsaved.wait()
+            with self.lock:
+                try:
+                    self.saveChanges()
+                except Exception:
+                    import traceback
+                    traceback.print_exc()
+                    self.index = None
+
+    def serve(self, connection):
+        """Carries out the call a client has forwarded, relaying its console, and replies with the exit
+        status. A client kept waiting serverBusyTimeout seconds by the call before it is told the server
+        is busy, and works on the store's files itself; a call is only carried out once its client has
+        heard it will be. What the call changed is left for the writer to save."""
+        with connection:
+            connection.settimeout(serverReplyTimeout)
+            client = ClientStream(connection)
+            request = client.receive()
+            if request.get('stop'):
+                self.stopping.set()
+                client.send(exit=0)
+                return
+            if 'argv' not in request:
+                return      # only seeing whether a server is running
+            if not self.lock.acquire(timeout=serverBusyTimeout):
+                client.send(busy=True)
+                return
+            try:
+                client.send(ready=True)
+                if client.receive().get('go'):
+                    connection.settimeout(None)     # the call may wait on the user for as long as it likes
+                    self.run(client, request.get('argv', []))
+            except OSError:
+                self.index = None       # the client went away partway through the call
+            finally:
+                self.lock.release()
+
+    def run(self, client, argv):
+        "Carries out a call with client as its console. The server's lock must be held."
+        self.saveChanges()      # so that a store changed meanwhile is read afresh over them
+        state = None
+        console = sys.stdin, sys.stdout
+        sys.stdin = sys.stdout = client
+        try:
+            status, state = runCommand(argv, self.loadedIndex)
+        except SystemExit as e:     # as when the index could not be read
+            status = e.code if type(e.code) == int else 1
+        except Exception:
+            import traceback
+            traceback.print_exc(file=client)
+            status = 1
+        finally:
+            output.end()
+            sys.stdin, sys.stdout = console
+
+        if state == None or (state.changed and not workboy.saveOnExit):
+            self.index = None       # the store was worked on directly, or the index holds unwanted edits
+        elif state.changed:
+            self.changed |= state.changed
+            self.unsaved.set()
+
+        client.flush()
+        client.send(exit=status)
+
+def serveCommands(argv):
+    """Serves workboy calls from a resident company index until interrupted, or stopped by 'workboy serve
+    stop', each connection on a thread of its own. Changes still unsaved when it stops are saved then."""
+    import socket
+    import threading
+    if get(1, argv) == 'stop':
+        status = forwardCommand(argv, stop=True)
+        print('Server stopped.' if status == 0 else 'No workboy server is running.')
+        return 0
+    if not hasattr(socket, 'AF_UNIX'):
+        print('Failed: this system does not provide the Unix sockets the server listens on.')
+        return 1
+    if forwardCommand(argv, probe=True) == 0:
+        print('Failed: a workboy server is already running.')
+        return 1
+    if os.path.exists(serverSocketPath):
+        os.remove(serverSocketPath)     # left behind by a server which did not get to close
+
+    server = IndexServer()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(serverSocketPath)
+    listener.listen()
+    listener.settimeout(serverPollInterval)     # so that a stop asked for on another thread is seen
+    threading.Thread(target=server.writeChanges, daemon=True).start()
+    print('Serving workboy at {}. Interrupt to stop.'.format(serverSocketPath))
+    sys.stdout.flush()
+    try:
+        while not server.stopping.is_set():
+            try:
+                connection, address = listener.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(target=server.serve, args=(connection,), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        os.remove(serverSocketPath)
+        with server.lock:       # once any call still running has finished
+            server.saveChanges()
+    return 0
+
+def forwardCommand(argv, stop=False, probe=False):
+    """Hands a workboy call over to the running server, relaying its console here, and returns its exit
+    status. Returns None without doing anything if no server is running."""
+    if not os.path.exists(serverSocketPath):
+        return None
+    import socket
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(serverReplyTimeout)
+    try:
+        connection.connect(serverSocketPath)
+    except OSError:
+        connection.close()
+        return None
+    if probe:
+        connection.close()
+        return 0
+
+    # A batch, import or export file is named relative to where workboy was called, which the server does not know.
+    if get(0, argv) in ('batch', 'import', 'export'):
+        argv = argv[:1] + [ arg if arg.startswith('-') or previous == '--format' else os.path.abspath(arg)
+            for previous, arg in zip(argv, argv[1:]) ]
+
+    with connection:
+        server = ClientStream(connection)
+        try:
+            server.send(**({'stop': True} if stop else {'argv': argv}))
+            if not stop:
+                # Told the server is busy, or not told anything in time, this call works on the files itself.
+                if not server.receive().get('ready'):
+                    return None
+                server.send(go=True)
+                connection.settimeout(None)
+        except OSError:
+            return None
+        while True:
+            message = server.receive()
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+            elif 'read' in message:
+                sys.stdout.flush()
+                server.send(line=sys.stdin.readline())
+            elif 'exit' in message:
+                sys.stdout.flush()
+                return message['exit']
+            else:
+                print('Failed: the workboy server stopped before answering.')
+                return 1
+
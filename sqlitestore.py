@@ -0,0 +1,400 @@
+from collections.abc import MutableMapping
+import os
+
+from workboy import (activityEntries, CompanyIndex, CompanyStub, countWork, databaseBackupPath, databasePath,
+    dateFromString, foldName, IDAllocator, newCompany, parseIDNumber, printSaveConflicts, recordTerms,
+    termsVersion)
+
+# One row per company, contact, info message and log entry, with indices for the lookups the
+# commands make: companies by name, by last contact and by whether they're defunct, and log entries
+# by date. The terms table is the search index, one row per token per company. Company IDs are
+# integers; the IDs within a record are kept as written, alongside their display position. The undo
+# table holds, for each of the last few saves, the records it changed as JSON as they were before
+# it, or NULL for records it created.
+
+databaseSchema = '''
+CREATE TABLE IF NOT EXISTS companies (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL, folded TEXT NOT NULL, url TEXT, phone TEXT, address TEXT,
+    defunct INTEGER NOT NULL, last INTEGER, logs INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS companiesByName ON companies (folded);
+CREATE INDEX IF NOT EXISTS companiesByLast ON companies (last);
+CREATE INDEX IF NOT EXISTS companiesByDefunct ON companies (defunct, logs);
+CREATE TABLE IF NOT EXISTS contacts (
+    company INTEGER NOT NULL, id TEXT NOT NULL, position INTEGER NOT NULL,
+    name TEXT, email TEXT, phone TEXT, isPrimary INTEGER, PRIMARY KEY (company, id));
+CREATE TABLE IF NOT EXISTS info (
+    company INTEGER NOT NULL, id TEXT NOT NULL, position INTEGER NOT NULL, message TEXT, PRIMARY KEY (company, id));
+CREATE TABLE IF NOT EXISTS log (
+    company INTEGER NOT NULL, id TEXT NOT NULL, position INTEGER NOT NULL,
+    date TEXT, day INTEGER, message TEXT, PRIMARY KEY (company, id));
+CREATE INDEX IF NOT EXISTS logByDay ON log (day, company, id);
+CREATE TABLE IF NOT EXISTS terms (
+    token TEXT NOT NULL, company INTEGER NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (token, company)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS termsByCompany ON terms (company);
+CREATE TABLE IF NOT EXISTS undo (save INTEGER NOT NULL, company INTEGER NOT NULL, record TEXT);
+'''
+
+databaseUndoDepth = 50      # Saves older than this many can no longer be undone.
+
+def databaseDay(s):
+    "Returns the day ordinal of a stored date string, or None if it isn't one."
+    try:
+        return dateFromString(s).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def readDatabaseRecord(db, id):
+    "Returns the company record id from the database, or None if there is none."
+    n = int(id)
+    row = db.execute('SELECT name, url, phone, address, defunct, last, logs FROM companies WHERE id = ?', (n,)).fetchone()
+    if row == None:
+        return None
+    countWork('records scanned')
+
+    name, url, phone, address, defunct, last, logs = row
+    record = newCompany(name)
+    record['url'], record['phone'], record['address'], record['defunct'] = url, phone, address, defunct != 0
+    record['summary'] = { 'last': last, 'logs': logs, 'defunct': defunct != 0 }
+    record['contacts'] = { k: { 'name': name, 'email': email, 'phone': phone, 'primary': primary != 0 }
+        for k, name, email, phone, primary in db.execute(
+            'SELECT id, name, email, phone, isPrimary FROM contacts WHERE company = ? ORDER BY position', (n,)) }
+    record['info'] = dict(db.execute('SELECT id, message FROM info WHERE company = ? ORDER BY position', (n,)))
+    record['log'] = { k: { 'date': when, 'message': message }
+        for k, when, message in db.execute('SELECT id, date, message FROM log WHERE company = ? ORDER BY position', (n,)) }
+    return record
+
+def valueSize(value):
+    "Returns the bytes a value bound into a statement takes as written: its text's UTF-8 encoding, or eight for a number."
+    if type(value) == str:
+        return len(value.encode('utf-8'))
+    return 0 if value == None else 8
+
+def insertRows(db, statement, rows):
+    "Runs an INSERT statement for each of the given rows, counting the bytes of the values it writes."
+    rows = list(rows)
+    countWork('bytes written', sum( valueSize(value) for row in rows for value in row ))
+    db.executemany(statement, rows)
+
+def writeDatabaseRecord(db, id, record):
+    "Writes company record id to the database, in place of any earlier version of it."
+    n = int(id)
+    summary = record['summary']
+    insertRows(db, 'INSERT OR REPLACE INTO companies (id, name, folded, url, phone, address, defunct, last, logs) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', [ (n, record['name'], foldName(record['name']), record['url'],
+        record['phone'], record['address'], record['defunct'], summary['last'], summary['logs']) ])
+    db.execute('DELETE FROM contacts WHERE company = ?', (n,))
+    insertRows(db, 'INSERT INTO contacts (company, id, position, name, email, phone, isPrimary) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [ (n, k, i, v['name'], v['email'], v['phone'], v['primary']) for i, (k, v) in enumerate(record['contacts'].items()) ])
+    db.execute('DELETE FROM info WHERE company = ?', (n,))
+    insertRows(db, 'INSERT INTO info (company, id, position, message) VALUES (?, ?, ?, ?)',
+        [ (n, k, i, v) for i, (k, v) in enumerate(record['info'].items()) ])
+    writeDatabaseLog(db, id, record['log'])
+    writeDatabaseTerms(db, id, recordTerms(record))
+
+def writeDatabaseTerms(db, id, terms):
+    "Writes the search-index postings of company id, given as from recordTerms(), in place of its earlier ones."
+    n = int(id)
+    db.execute('DELETE FROM terms WHERE company = ?', (n,))
+    insertRows(db, 'INSERT INTO terms (token, company, count) VALUES (?, ?, ?)',
+        [ (token, n, count) for token, count in terms.items() ])
+
+def writeDatabaseLog(db, id, log):
+    "Writes the log dictionary of company id to the database, in place of its earlier entries."
+    n = int(id)
+    db.execute('DELETE FROM log WHERE company = ?', (n,))
+    insertRows(db, 'INSERT INTO log (company, id, position, date, day, message) VALUES (?, ?, ?, ?, ?, ?)',
+        [ (n, k, i, v['date'], databaseDay(v['date']), v['message']) for i, (k, v) in enumerate(log.items()) ])
+
+def deleteDatabaseRecord(db, id):
+    "Removes company record id from the database."
+    for table in ('companies', 'contacts', 'info', 'log', 'terms'):
+        db.execute('DELETE FROM {} WHERE {} = ?'.format(table, 'id' if table == 'companies' else 'company'), (int(id),))
+
+class SQLiteIndex(MutableMapping):
+    """The collection of company records by ID, as held in a SQLite database. It answers the same calls
+    as CompanyIndex, but by query, so nothing is read up front. Records read are kept, and edits are
+    made to them in memory; queries answer for those records from memory and for the rest from the
+    database. The database itself is only written when the index is saved, so a session doesn't hold
+    its write lock while it waits on the user."""
+    def __init__(self, db):
+        self.db = db
+        self.records = {}       # full records read or created so far
+        self.removed = set()    # IDs of the records deleted since the last save
+        self.before = {}        # each record read or created so far as JSON as it was last saved, None if it is new
+        self.recordIDs = {}     # (record ID, field) → IDAllocator for that record's contacts, info or log
+        self.allocator = None   # the company ID allocator, once one is needed
+        self.compact = False
+
+    @property
+    def ids(self):
+        if self.allocator == None:
+            self.allocator = IDAllocator.fromKeys(list(self), 4)
+        return self.allocator
+
+    def __getitem__(self, id):
+        import json
+        if id in self.removed:
+            raise KeyError(id)
+        if id not in self.records:
+            record = readDatabaseRecord(self.db, id) if str(id).isdigit() else None
+            if record == None:
+                raise KeyError(id)
+            self.records[id] = record
+            self.before.setdefault(id, json.dumps(record))
+        return self.records[id]
+
+    def __setitem__(self, id, record):
+        if id not in self.records:
+            if id in self:
+                self[id]        # keeps its last saved state for undoing
+            else:
+                self.before.setdefault(id, None)
+                if self.allocator != None:
+                    self.allocator.claim(id)
+        self.removed.discard(id)
+        self.records[id] = record
+
+    def __delitem__(self, id):
+        self[id]
+        del self.records[id]
+        self.removed.add(id)
+        if self.allocator != None:
+            self.allocator.release(id)
+        self.forgetRecordIDs(id)
+
+    def __contains__(self, id):
+        if id in self.records:
+            return True
+        if id in self.removed or not str(id).isdigit():
+            return False
+        return self.db.execute('SELECT 1 FROM companies WHERE id = ?', (int(id),)).fetchone() != None
+
+    def __iter__(self):
+        saved = set( parseIDNumber(n, 4) for (n,) in self.db.execute('SELECT id FROM companies') )
+        return iter(sorted((saved - self.removed) | set(self.records), key=int))
+
+    def __len__(self):
+        return sum(1 for id in self)
+
+    def held(self):
+        "Returns the IDs of the records which this index answers for from memory rather than the database."
+        return set(self.records) | self.removed
+
+    def stub(self, id):
+        "Returns the record id if it has been read, or its stub otherwise; either has an up-to-date name and summary."
+        if id in self.records:
+            return self.records[id]
+        name, last, logs, defunct = self.db.execute(
+            'SELECT name, last, logs, defunct FROM companies WHERE id = ?', (int(id),)).fetchone()
+        return CompanyStub(name, last, logs, defunct != 0)
+
+    def readRecord(self, id):
+        "Returns record id without keeping it once read, for walking every record in constant memory."
+        return self.records[id] if id in self.records else readDatabaseRecord(self.db, id)
+
+    def listing(self, activeOnly=False):
+        "Returns (ID, stub) pairs for every company, or only those whose applications aren't defunct, in ID order."
+        query = 'SELECT id, name, last, logs, defunct FROM companies {}'.format('WHERE defunct = 0' if activeOnly else '')
+        stubs = { parseIDNumber(n, 4): CompanyStub(name, last, logs, defunct != 0)
+            for n, name, last, logs, defunct in self.db.execute(query) }
+        stubs.update(self.records)
+        for id in self.removed:
+            stubs.pop(id, None)
+        return [ (k, v) for k, v in sorted(stubs.items(), key=lambda pair: int(pair[0]))
+            if not (activeOnly and v['summary']['defunct']) ]
+
+    def lookupName(self, name):
+        "Returns the ID of the record with the given name, ignoring case, or None if there is none."
+        folded = foldName(name)
+        held = self.held()
+        matches = [ id for id, record in self.records.items() if foldName(record['name']) == folded ]
+        matches += [ id for id in (parseIDNumber(n, 4) for (n,) in self.db.execute(
+            'SELECT id FROM companies WHERE folded = ?', (folded,))) if id not in held ]
+        return min(matches, key=int) if matches else None
+
+    def rename(self, id, name):
+        "Changes the name of record id."
+        self[id]['name'] = name
+
+    def updateActivity(self, id, before, after):
+        "Nothing to do: activity queries read the logs of records held in memory from the records themselves."
+
+    def activitySince(self, start):
+        "Returns the activity-index entries dated on or after the given date ordinal, oldest first."
+        held = self.held()
+        entries = [ entry for entry in ( (when, parseIDNumber(n, 4), logID) for when, n, logID in self.db.execute(
+            'SELECT day, company, id FROM log WHERE day >= ?', (start,)) ) if entry[1] not in held ]
+        for id, record in self.records.items():
+            entries += [ entry for entry in activityEntries(id, record['log']) if entry[0] >= start ]
+        return sorted(entries)
+
+    def updateTerms(self, id, before, after):
+        "Nothing to do: search queries take the terms of records held in memory from the records themselves."
+
+    def postings(self, tokens):
+        "Returns the search-index postings of each of the given tokens: token → {company ID: occurrences}."
+        held = self.held()
+        postings = { token: {} for token in tokens }
+        query = 'SELECT token, company, count FROM terms WHERE token IN ({})'.format(', '.join('?' * len(postings)))
+        for token, n, count in self.db.execute(query, list(postings)):
+            id = parseIDNumber(n, 4)
+            if id not in held:
+                postings[token][id] = count
+        for id, record in self.records.items():
+            terms = recordTerms(record)
+            for token in postings:
+                if terms.get(token):
+                    postings[token][id] = terms[token]
+        return postings
+
+    def compactIDs(self):
+        "Reassigns every company ID such that there are no gaps, keeping the records in ID order."
+        for i, id in enumerate(list(self)):
+            newID = parseIDNumber(i, 4)
+            if newID != id:
+                record = self[id]
+                del self[id]
+                self[newID] = record
+
+    selectID = CompanyIndex.selectID
+    newRecordID = CompanyIndex.newRecordID
+    forgetRecordIDs = CompanyIndex.forgetRecordIDs
+    compactRecordIDs = CompanyIndex.compactRecordIDs
+
+class SQLiteStore:
+    "Keeps the company index in a SQLite database, each save being one small transaction."
+    format = 'sqlite'
+
+    def connect(self):
+        "Returns a connection to the database, creating its tables if need be."
+        import sqlite3
+        try:
+            db = sqlite3.connect(databasePath)
+            db.executescript(databaseSchema)
+        except sqlite3.DatabaseError as e:
+            raise ValueError(e) from e
+        return db
+
+    def load(self):
+        db = self.connect()
+
+        # Databases made before the current kind of search index have it built for them.
+        if db.execute('PRAGMA user_version').fetchone()[0] < termsVersion:
+            for (n,) in db.execute('SELECT id FROM companies').fetchall():
+                writeDatabaseTerms(db, n, recordTerms(readDatabaseRecord(db, n)))
+            db.execute('PRAGMA user_version = {}'.format(termsVersion))
+            db.commit()
+
+        return SQLiteIndex(db)
+
+    def save(self, index, changed):
+        """Commits the changed record IDs of index in one transaction, keeping their previous states for
+        undoing. Returns False, saving nothing, if another workboy has saved changes to any of the same
+        companies since index read them."""
+        import json
+        if not changed:
+            return True
+
+        db = index.db
+        db.execute('BEGIN IMMEDIATE')       # taken here, where it is only held for as long as the save takes
+        applied, conflicts = {}, []
+        for id in sorted(changed):
+            present = id in index.records
+            saved = readDatabaseRecord(db, id)
+            if not present and saved == None:
+                continue        # deleted by both, or added and deleted again here
+            name = index.records[id]['name'] if present else saved['name']
+            base = index.before.get(id)
+            owners = set( parseIDNumber(n, 4) for (n,) in db.execute(
+                'SELECT id FROM companies WHERE folded = ?', (foldName(name),)) ) - (changed - {id} if base == None else changed)
+            if present and owners:
+                conflicts.append((id, name))
+            elif (json.dumps(saved) if saved else None) == base:
+                applied[id] = id
+            elif base == None and present:
+                applied[id] = None      # both added a company, and the other got this ID first
+            else:
+                conflicts.append((id, name))
+
+        if conflicts:
+            db.rollback()
+            printSaveConflicts(conflicts)
+            return False
+
+        taken = IDAllocator.fromKeys([ n for (n,) in db.execute('SELECT id FROM companies') ] + list(index.records), 4)
+        for id in [ id for id, savedID in applied.items() if savedID == None ]:
+            applied[id] = taken.allocate()
+            print("{} was saved as {}, another workboy having given its ID to {}.".format(
+                index.records[id]['name'], applied[id], readDatabaseRecord(db, id)['name']))
+            index.records[applied[id]] = index.records.pop(id)
+            index.before[applied[id]] = index.before.pop(id)
+            index.forgetRecordIDs(id)
+            index.allocator = None
+
+        # The working records have their ID spaces closed up before they are written.
+        for id in applied.values():
+            if id in index.records:
+                index.compactRecordIDs(id)
+                writeDatabaseRecord(db, id, index.records[id])
+            else:
+                deleteDatabaseRecord(db, id)
+
+        save = db.execute('SELECT coalesce(max(save), 0) + 1 FROM undo').fetchone()[0]
+        insertRows(db, 'INSERT INTO undo (save, company, record) VALUES (?, ?, ?)',
+            [ (save, int(id), index.before.get(id)) for id in applied.values() ])
+        db.execute('DELETE FROM undo WHERE save <= ?', (save - databaseUndoDepth,))
+        db.commit()
+
+        # What was saved is kept as it now reads back, to be compared with the database at the next save.
+        for id in applied.values():
+            index.before.pop(id, None)
+            if id in index.records:
+                index.before[id] = json.dumps(readDatabaseRecord(db, id))
+        index.removed = set()
+        return True
+
+    def undo(self):
+        "Reverts the database to its state before the most recent save. Returns False if there is nothing to revert."
+        import json
+        db = self.connect()
+        save = db.execute('SELECT max(save) FROM undo').fetchone()[0]
+        if save == None:
+            return False
+        for n, record in db.execute('SELECT company, record FROM undo WHERE save = ?', (save,)).fetchall():
+            deleteDatabaseRecord(db, n)
+            if record != None:
+                writeDatabaseRecord(db, n, json.loads(record))
+        db.execute('DELETE FROM undo WHERE save = ?', (save,))
+        db.commit()
+        return True
+
+    def compact(self, index):
+        "Commits any renumbering of index, then has the database reclaim its free space."
+        self.save(index, set(index.before))
+        index.db.execute('VACUUM')
+
+    def exists(self):
+        return os.path.exists(databasePath)
+
+    def create(self, index):
+        "Replaces this store's contents with the records of any company index."
+        db = self.connect()
+        for table in ('companies', 'contacts', 'info', 'log', 'terms', 'undo'):
+            db.execute('DELETE FROM {}'.format(table))
+        for id in index:
+            writeDatabaseRecord(db, id, index[id])
+        db.execute('PRAGMA user_version = {}'.format(termsVersion))
+        db.commit()
+
+    def replace(self, records):
+        "Replaces this store's contents with full records, given as (ID, record) pairs as read from an archive; this can be undone."
+        index = self.load()
+        for id in index:
+            del index[id]
+        for id, record in CompanyIndex.fromSnapshot(dict(records)).records.items():
+            index[id] = record
+        self.save(index, set(index.before))
+
+    def retire(self):
+        "Moves the database aside into the backup, as after its data has been moved to another store."
+        os.replace(databasePath, databaseBackupPath)
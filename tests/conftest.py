@@ -0,0 +1,52 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# workboy keeps its data in %LOCALAPPDATA%\workboy. Pointing that at the working directory, and running
+# each test in a folder of its own, keeps the tests away from anyone's real store.
+os.environ['LOCALAPPDATA'] = '.'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import workboy
+
+
+@pytest.fixture
+def datafolder(tmp_path, monkeypatch):
+    "Runs the test in an empty scratch data folder, and returns the folder the store is in."
+    monkeypatch.chdir(tmp_path)
+    for path in (workboy.datafolderPath, workboy.shardfolderPath, workboy.termfolderPath, workboy.blobfolderPath):
+        os.makedirs(path, exist_ok=True)
+    return tmp_path / workboy.datafolderPath
+
+
+@pytest.fixture
+def run(datafolder, monkeypatch, capsys):
+    """Returns a function which runs one workboy call in this process, with the given text as its console
+    input, and returns its exit status and what it printed."""
+    def run(*argv, input=''):
+        monkeypatch.setattr(sys, 'stdin', io.StringIO(input))
+        capsys.readouterr()
+        status = workboy.main(list(argv))
+        return status, capsys.readouterr().out
+    return run
+
+
+@pytest.fixture
+def listed(run):
+    "Returns a function which returns the IDs 'workboy all' lists, in the order it lists them."
+    def listed():
+        status, out = run('all', '--json')
+        return [ json.loads(line)['id'] for line in out.splitlines() if line ]
+    return listed
+
+
+@pytest.fixture
+def batch(run):
+    "Returns a function which runs the given edit commands as one batch, and returns its exit status and output."
+    def batch(*lines):
+        return run('batch', '-', input=''.join(line + '\n' for line in lines))
+    return batch
+
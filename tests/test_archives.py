@@ -0,0 +1,105 @@
+import json
+from datetime import date
+
+import pytest
+
+import archives
+import workboy
+
+
+def listedNames(run):
+    "Returns the names 'workboy all' lists, in the order it lists them."
+    status, out = run('all', '--json')
+    return [ json.loads(line)['name'] for line in out.splitlines() if line ]
+
+
+@pytest.fixture(params=['json', 'compact', 'sqlite'])
+def store(request, run, batch):
+    "Fills the store with two companies and archives them, in each of the formats a store can be in."
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "add Initech www.initech.com")
+    if request.param != 'json':
+        run('convert', request.param)
+    run('archive')
+    return request.param
+
+
+def test_restore_brings_back_the_archived_records(run, batch, datafolder, store):
+    batch("add Umbrella", "del 0")
+    assert listedNames(run) == ['Initech', 'Umbrella']
+
+    assert run('restore-archive', str(date.today()))[1].strip() == 'Archive restored.'
+    assert listedNames(run) == ['Globex', 'Initech']
+    assert 'Applied' in run('once', '0', 'show')[1]
+    if store == 'compact':
+        assert (datafolder / 'workboy_data').read_bytes().startswith(workboy.compactHeaderMagic)
+
+
+def test_restore_can_be_undone_after_other_commands(run, batch, store):
+    batch("add Umbrella")
+    run('restore-archive', str(date.today()))
+    run('all')
+    run('search', 'applied')
+    run('once', '1', 'show')
+    assert listedNames(run) == ['Globex', 'Initech']
+
+    run('restore-backup')
+    assert listedNames(run) == ['Globex', 'Initech', 'Umbrella']
+    assert 'Applied' in run('once', '0', 'show')[1]
+
+
+def test_restore_refuses_a_damaged_archive(run, datafolder, store):
+    archive, = datafolder.glob('workboy_archive*')
+    archive.write_bytes(archive.read_bytes()[:-8])
+    status, out = run('restore-archive', str(date.today()))
+    assert 'could not be read' in out
+    assert listedNames(run) == ['Globex', 'Initech']
+
+
+@pytest.fixture
+def archiveOn(run, monkeypatch):
+    "Returns a function which archives the store as though it were the given day."
+    def archiveOn(day):
+        class Today(date):
+            @classmethod
+            def today(cls):
+                return day
+        monkeypatch.setattr(archives, 'date', Today)
+        run('archive')
+    return archiveOn
+
+
+def manifest(datafolder, day):
+    return archives.readArchiveFile(str(datafolder / 'workboy_archive{}.xz'.format(day)))['blobs']
+
+
+@pytest.mark.parametrize('format', ['json', 'sqlite'])
+def test_unchanged_records_share_one_blob_across_archives(run, batch, datafolder, archiveOn, format):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "add Initech", "add Umbrella")
+    if format != 'json':
+        run('convert', format)
+    first, second = date(2026, 1, 5), date(2026, 1, 6)
+    archiveOn(first)
+    batch("1 rename Initrode")
+    archiveOn(second)
+
+    old, new = manifest(datafolder, first), manifest(datafolder, second)
+    assert old['0000'] == new['0000'] and old['0002'] == new['0002'] and old['0001'] != new['0001']
+    assert sorted( path.name for path in (datafolder / 'workboy_blobs').iterdir() ) == sorted(set(old.values()) | set(new.values()))
+
+    run('delete-archive', str(first))
+    assert sorted( path.name for path in (datafolder / 'workboy_blobs').iterdir() ) == sorted(new.values())
+    assert run('restore-archive', str(second))[1].strip() == 'Archive restored.'
+    assert listedNames(run) == ['Globex', 'Initrode', 'Umbrella']
+
+
+def test_archiving_twice_in_a_day_keeps_only_the_later_blobs(run, batch, datafolder, archiveOn):
+    day = date(2026, 1, 5)
+    batch("add Globex", "add Initech")
+    archiveOn(day)
+    before = manifest(datafolder, day)
+    batch("0 rename 'Globex Corporation'")
+    archiveOn(day)
+    after = manifest(datafolder, day)
+    assert before['0000'] != after['0000'] and before['0001'] == after['0001']
+    assert sorted( path.name for path in (datafolder / 'workboy_blobs').iterdir() ) == sorted(after.values())
+    assert run('display-archives')[1].count(' records ') == 1
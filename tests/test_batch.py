@@ -0,0 +1,40 @@
+import workboy
+
+
+def atomic(run, *lines):
+    return run('batch', '-', '--atomic', input=''.join(line + '\n' for line in lines))
+
+
+def test_a_batch_saves_its_edits_at_once(batch, listed, datafolder):
+    status, out = batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "# a comment", "", "add Initech", "1 rename Initrode")
+    assert status == 0
+    assert '4 commands run, 0 failed.' in out and 'Saved changes to 2 companies.' in out
+    assert listed() == ['0000', '0001']
+    assert len((datafolder / 'workboy_journal').read_bytes().splitlines()) == 1
+
+
+def test_failed_lines_are_reported_and_the_rest_saved(batch, listed):
+    status, out = batch("add Globex", "7 rename Hooli", "compact", "add Initech")
+    assert status == 1
+    assert "Line 2: Selection '7' could not be found." in out
+    assert "Line 3: 'compact' cannot be run from a batch." in out
+    assert '4 commands run, 2 failed.' in out
+    assert listed() == ['0000', '0001']
+
+
+def test_an_atomic_batch_with_a_failed_line_saves_nothing(run, batch, listed, datafolder):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'")
+    journal = (datafolder / 'workboy_journal').read_bytes()
+
+    status, out = atomic(run, "0 rename Globex Corporation", "del 0", "add Initech", "frobnicate")
+    assert status == 1
+    assert "Line 4: Selection 'frobnicate' could not be found." in out and 'Nothing was saved.' in out
+    assert (datafolder / 'workboy_journal').read_bytes() == journal
+    assert listed() == ['0000']
+    assert workboy.loadIndex()['0000']['name'] == 'Globex'
+
+
+def test_an_atomic_batch_without_failures_saves(run, listed):
+    status, out = atomic(run, "add Globex", "add Initech")
+    assert status == 0 and 'Saved changes to 2 companies.' in out
+    assert listed() == ['0000', '0001']
@@ -0,0 +1,79 @@
+import json
+import subprocess
+
+import pytest
+
+
+def result(operation, best, scale=1000):
+    return { 'operation': operation, 'scale': scale, 'seed': 0, 'rounds': 5, 'first_ms': best * 2, 'best_ms': best }
+
+
+@pytest.fixture
+def suite(monkeypatch):
+    "Has the suite's runs report the given results rather than time anything, and returns the argument lists they were run with."
+    calls = []
+    def suite(*results):
+        def run(argv, **kwargs):
+            calls.append(argv)
+            scale = int(argv[argv.index('--scratch') + 1])
+            stdout = ''.join( json.dumps(dict(r, scale=scale)) + '\n' for r in results )
+            return subprocess.CompletedProcess(argv, 0, stdout, '')
+        monkeypatch.setattr(subprocess, 'run', run)
+        return calls
+    return suite
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    "Returns a function which writes the given results as a baseline file and returns its path."
+    def baseline(*results):
+        path = tmp_path / 'baseline.jsonl'
+        path.write_text(''.join( json.dumps(r) + '\n' for r in results ))
+        return str(path)
+    return baseline
+
+
+def test_the_suite_times_every_operation_at_each_size(run):
+    status, out = run('bench', 'suite', '20', '30', '--rounds', '2', '--json')
+    results = [ json.loads(line) for line in out.splitlines() if line ]
+    assert status == 0
+    assert set( r['scale'] for r in results ) == {20, 30}
+    assert [ r['operation'] for r in results if r['scale'] == 20 ][:3] == ['save (all)', 'load', 'displayRecents']
+    assert all( r['best_ms'] <= r['first_ms'] for r in results )
+
+
+def test_results_within_the_tolerance_pass(run, suite, baseline):
+    calls = suite(result('load', 10.0), result('editLog', 2.4))
+    status, out = run('bench', 'suite', '1000', '--baseline', baseline(result('load', 9.0), result('editLog', 2.0)), '--no-pager')
+    assert status == 0
+    assert '+11% on baseline' in out and '+20% on baseline' in out
+    assert '0 operations regressed by more than 25%.' in out
+    assert [ argv[argv.index('--scratch') + 1] for argv in calls ] == ['1000']
+
+
+def test_results_past_the_tolerance_fail(run, suite, baseline):
+    suite(result('load', 10.0), result('editLog', 2.0))
+    path = baseline(result('load', 7.0), result('editLog', 2.0), result('load', 1.0, scale=10000))
+    status, out = run('bench', 'suite', '1000', '10000', '--baseline', path, '--no-pager')
+    assert status == 1
+    assert out.count('REGRESSION') == 2     # load at either size, and not editLog
+    assert '2 operations regressed by more than 25%.' in out
+
+    status, out = run('bench', 'suite', '1000', '--baseline', path, '--tolerance', '50', '--json')
+    assert status == 0
+    assert [ (r['operation'], r['regression']) for r in map(json.loads, out.splitlines()) ] == [('load', False), ('editLog', False)]
+
+
+def test_operations_missing_from_the_baseline_are_not_compared(run, suite, baseline):
+    suite(result('load', 10.0), result('search', 5.0))
+    status, out = run('bench', 'suite', '1000', '--baseline', baseline(result('load', 10.0)), '--json')
+    assert status == 0
+    assert [ 'regression' in r for r in map(json.loads, out.splitlines()) ] == [True, False]
+
+
+def test_an_unreadable_baseline_fails(run, suite, tmp_path):
+    suite(result('load', 10.0))
+    status, out = run('bench', 'suite', '1000', '--baseline', str(tmp_path / 'missing.jsonl'))
+    assert status == 1 and 'could not read the baseline' in out
+    (tmp_path / 'bad.jsonl').write_text('{"operation": "load"}\n')
+    assert run('bench', 'suite', '1000', '--baseline', str(tmp_path / 'bad.jsonl'))[0] == 1
@@ -0,0 +1,26 @@
+import pytest
+
+import benchmarks
+import workboy
+
+# Tokens of each kind, ones on the edges of the patterns, and ones that fit none of them.
+tokens = benchmarks.benchmarkTokens + [
+    '', ' ', 'Feb 30, 2026', 'Sep 31, 2026', '12-31-1999', '2-29-23', '13-1-20', '1/2/20', 'jan 02, 2020',
+    'first.last+jobs@mail.example.co.uk', 'not an @email', '555-1234', '+1 (555) 123-4567', '1-800-555-0199',
+    '1600 Pennsylvania Ave NW, Washington, DC 20500', 'PO Box 12', 'http://example.com', 'https://www.example.com/a?b=c',
+    'example.com', 'localhost', "O'Brien", 'Mary-Jane Watson', 'J. R. R. Tolkien', 'Dr Strange 2', '12345', '10-15-2020 extra',
+    'ÉCOLE', '東京', 'a' * 300
+    ]
+
+
+@pytest.mark.parametrize('token', tokens)
+def test_compiled_classifier_agrees_with_the_regex_chain(token):
+    assert workboy.classifyArgument(token) == benchmarks.classifyArgumentChain(token)
+
+
+def test_compiled_classifier_agrees_on_generated_records():
+    records = benchmarks.seededCompanies(100)
+    values = [ value for record in records for value in (record['name'], record['url'], record['phone'], record['address'],
+        *record['info'].values(), *( log['date'] for log in record['log'].values() ), *( log['message'] for log in record['log'].values() ),
+        *( contact[field] for contact in record['contacts'].values() for field in ('name', 'email', 'phone') )) ]
+    assert [ workboy.classifyArgument(value) for value in values ] == [ benchmarks.classifyArgumentChain(value) for value in values ]
@@ -0,0 +1,46 @@
+import workboy
+
+
+def records(index):
+    "Returns every record of index by ID, as plain dictionaries."
+    return { id: dict(index[id]) for id in index }
+
+
+def test_records_round_trip_through_the_compact_format(batch):
+    batch("add 'Globex Corporation' www.globex.com", "0 log 'Jan 05, 2026' 'Applied — twice'", "0 contact 'Hank Scorpio'",
+        "0 info 'Phone 0123 456'", "add Initech")
+    index = workboy.loadIndex()
+    for id in index:
+        record = index[id]
+        data = workboy.encodeRecord(record, True)
+        assert data.startswith(workboy.compactRecordMagic)
+        assert workboy.decodeRecord(data) == record
+        assert workboy.decodeRecord(workboy.encodeRecord(record, False)) == record
+
+
+def test_records_the_format_cannot_hold_are_kept_as_json():
+    record = workboy.newCompany('Globex')
+    record['phone'] = '0123 456'
+    record['note'] = 'kept'         # a field the compact format has no place for
+    data = workboy.encodeRecord(record, True)
+    assert data.startswith(b'{')
+    assert workboy.decodeRecord(data) == record
+
+
+def test_headers_round_trip_through_the_compact_format(batch):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "add Initech", "add Umbrella", "del 1")
+    index = workboy.loadIndex()
+    index.compact = True
+    data = workboy.encodeSnapshot(index)
+    assert data.startswith(workboy.compactHeaderMagic)
+    assert workboy.sameSnapshot(workboy.decodeSnapshot(data), index)
+
+
+def test_converted_stores_read_back_the_same(run, batch, datafolder):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "add Initech www.initech.com")
+    saved = records(workboy.loadIndex())
+    run('convert', 'compact')
+    assert (datafolder / 'workboy_data').read_bytes().startswith(workboy.compactHeaderMagic)
+    assert records(workboy.loadIndex()) == saved
+    run('convert', 'json')
+    assert records(workboy.loadIndex()) == saved
@@ -0,0 +1,53 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import workboy
+
+
+@pytest.fixture(autouse=True)
+def emptyCache():
+    workboy.dateFromString.cache_clear()
+
+
+def strptimed(s):
+    return datetime.strptime(s, '%b %d, %Y').date()
+
+
+def test_stored_dates_parse_as_strptime_would():
+    days = [ date(2023, 12, 25) + timedelta(days=n) for n in range(500) ]
+    assert all( workboy.dateFromString(workboy.dateToString(day)) == day for day in days )
+    for s in ('Jan 2, 2020', 'Jan 02,2020', 'Jan 02, 20200', 'jan 02, 2020'):
+        try:
+            expected = strptimed(s)
+        except ValueError:
+            with pytest.raises(ValueError):
+                workboy.dateFromString(s)
+        else:
+            assert workboy.dateFromString(s) == expected
+
+
+@pytest.mark.parametrize('s', ['Feb 30, 2026', 'Feb 29, 2025', 'Jan 32, 2020', 'Jan 00, 2020', 'Foo 01, 2020', ''])
+def test_impossible_dates_are_refused(s):
+    with pytest.raises(ValueError):
+        workboy.dateFromString(s)
+    assert workboy.parseDate(s) == None
+
+
+def test_parsed_dates_are_memoized():
+    first = workboy.dateFromString('Mar 14, 2026')
+    assert workboy.dateFromString('Mar 14, 2026') is first
+    info = workboy.dateFromString.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_parse_date_reads_every_form_it_takes():
+    year = date.today().year
+    assert workboy.parseDate('2026-01-05') == date(2026, 1, 5)
+    assert workboy.parseDate('Jan 05, 2026') == date(2026, 1, 5)
+    assert workboy.parseDate('Jan 05') == date(year, 1, 5)
+    assert workboy.parseDate('1-5-26') == date(2026, 1, 5)
+    assert workboy.parseDate('01-05-2026') == date(2026, 1, 5)
+    assert workboy.parseDate('1-5') == date(year, 1, 5)
+    assert workboy.parseDate('2026-13-05') == None
+    assert workboy.parseDate('soon') == None
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import sys
+
+import pytest
+
+import workboy
+
+
+class ClosedPipe(io.StringIO):
+    "Stands in for stdout piped to a reader which has gone away."
+    def write(self, text):
+        raise BrokenPipeError()
+
+
+@pytest.fixture
+def companies(batch):
+    batch("add Globex www.globex.com", "0 log 'Jan 05, 2026' 'Applied; via the site, twice'", "0 log 'Jan 09, 2026' 'Phone screen'",
+        "0 contact 'Hank Scorpio' hank@globex.com", "0 info 'Remote team'", "add Initech", "add Umbrella", "del 2")
+
+
+def unfolded(ics):
+    "Returns the content lines of an iCalendar file, with folded lines joined back up."
+    return ics.replace('\r\n ', '').split('\r\n')[:-1]
+
+
+def test_csv_has_a_row_per_company(run, companies):
+    status, out = run('export', '--format', 'csv')
+    rows = list(csv.DictReader(io.StringIO(out)))
+    assert status == 0
+    assert [ (row['id'], row['name']) for row in rows ] == [('0000', 'Globex'), ('0001', 'Initech')]
+    assert rows[0]['url'] == 'www.globex.com' and rows[0]['defunct'] == 'no'
+    assert rows[0]['log'].splitlines() == ['Jan 05, 2026: Applied; via the site, twice', 'Jan 09, 2026: Phone screen']
+    assert rows[0]['contacts'] == 'Hank Scorpio | hank@globex.com' and rows[0]['info'] == 'Remote team'
+
+
+def test_jsonl_has_each_full_record(run, companies):
+    status, out = run('export', '--format=jsonl')
+    records = [ json.loads(line) for line in out.splitlines() ]
+    saved = workboy.loadIndex()
+    assert [ record.pop('id') for record in records ] == ['0000', '0001']
+    assert records == [ { k: v for k, v in saved[id].items() if k != 'summary' } for id in ('0000', '0001') ]
+
+
+def test_ics_has_an_event_per_log_entry(run, companies):
+    status, out = run('export', '--format', 'ics')
+    lines = unfolded(out)
+    assert lines[0] == 'BEGIN:VCALENDAR' and lines[-1] == 'END:VCALENDAR'
+    assert [ line for line in lines if line.startswith(('DTSTART', 'SUMMARY')) ] == [
+        'DTSTART;VALUE=DATE:20260105', 'SUMMARY:Globex: Applied\\; via the site\\, twice',
+        'DTSTART;VALUE=DATE:20260109', 'SUMMARY:Globex: Phone screen']
+    uids = [ line for line in lines if line.startswith('UID:') ]
+    assert len(set(uids)) == 2
+    assert [ line for line in unfolded(run('export', '--format', 'ics')[1]) if line.startswith('UID:') ] == uids
+
+
+def test_ics_text_is_escaped_and_long_lines_folded():
+    assert workboy.icsText('a\\b;c,d\ne') == 'a\\\\b\\;c\\,d\\ne'
+    line = 'SUMMARY:' + 'Überweisung für München ' * 6
+    folded = workboy.icsLine(line)
+    assert folded.endswith('\r\n') and all( len(part.encode('utf-8')) <= 75 for part in folded[:-2].split('\r\n') )
+    assert folded[:-2].replace('\r\n ', '') == line
+    assert workboy.icsLine('SUMMARY:short') == 'SUMMARY:short\r\n'
+
+
+def test_export_writes_a_file_when_given_one(run, companies, tmp_path):
+    path = tmp_path / 'companies.csv'
+    status, out = run('export', str(path))
+    assert status == 0 and 'Exported 2 companies' in out
+    assert path.read_text(encoding='utf-8').startswith('id,name,url')
+
+
+def test_unknown_formats_and_unwritable_files_fail(run, companies, tmp_path):
+    status, out = run('export', '--format', 'xml')
+    assert status == 1 and 'Request voided' in out
+    status, out = run('export', str(tmp_path / 'missing' / 'companies.csv'))
+    assert status == 1 and 'Could not write to' in out
+
+
+def test_a_closed_pipe_ends_the_export_quietly(companies, monkeypatch):
+    monkeypatch.setattr(sys, 'stdout', ClosedPipe())
+    assert workboy.main(['export', '--format', 'ics']) == 0
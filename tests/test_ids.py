@@ -0,0 +1,34 @@
+import copy
+
+import workboy
+
+
+def test_allocator_hands_out_freed_ids_before_new_ones():
+    ids = workboy.IDAllocator.fromKeys(['0000', '0002', '0005'])
+    assert [ ids.allocate() for _ in range(4) ] == ['0001', '0003', '0004', '0006']
+    ids.release('0002')
+    ids.claim('0009')
+    one = copy.deepcopy(ids)
+    assert ids.allocateMany(4) == [ one.allocate() for _ in range(4) ]
+    assert sorted(one.free + [one.next]) == sorted(ids.free + [ids.next]) == [11]
+
+
+def test_allocator_widens_ids_past_a_full_space():
+    ids = workboy.IDAllocator.afterKeys(['97', '99'])
+    assert [ ids.allocate() for _ in range(2) ] == ['100', '101']
+
+
+def test_new_info_goes_where_it_is_shown_and_moved(batch):
+    batch("add Globex", "0 info one", "0 info two", "0 info three", "0 info del 1", "0 info four")
+    assert list(workboy.loadIndex()['0000']['info'].values()) == ['one', 'three', 'four']
+
+    batch("add Initech", "1 info one", "1 info two", "1 info three", "1 info del 1", "1 info four", "1 info move 0 9")
+    assert list(workboy.loadIndex()['0001']['info'].values()) == ['three', 'four', 'one']
+
+
+def test_saves_close_up_record_id_gaps(batch):
+    batch("add Globex", "0 info one", "0 info two", "0 info three", "0 contact Hank", "0 contact Marge")
+    batch("0 info del 0", "0 contact del 0")
+    record = workboy.loadIndex()['0000']
+    assert record['info'] == { '00': 'two', '01': 'three' }
+    assert list(record['contacts']) == ['00']
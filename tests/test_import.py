@@ -0,0 +1,24 @@
+import json
+import os
+
+import importer
+
+
+def test_import_rows_are_checked_in_order_without_reading_far_ahead(monkeypatch):
+    monkeypatch.setattr(importer, 'importChunkSize', 10)
+    monkeypatch.setattr(importer, 'importParallelMinimum', 40)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)     # so that the pool is used on any machine
+    read = []
+    def rows():
+        for n in range(2000):
+            read.append(n)
+            yield n + 1, json.dumps({ 'name': 'Company {}'.format(n) }) if n != 7 else '['
+
+    checked = importer.checkedImportRows(rows())
+    number, record, reason = next(checked)
+    assert record['name'] == 'Company 0'
+    assert len(read) <= 40 + 2 * importer.importChunksAhead * 10
+
+    results = [(number, record, reason)] + list(checked)
+    assert [ number for number, record, reason in results ] == list(range(1, 2001))
+    assert [ number for number, record, reason in results if reason ] == [8]
@@ -0,0 +1,31 @@
+import workboy
+
+
+def addCompanies(index, names):
+    "Adds a company of each of the given names to index, as the add command would, and returns their IDs."
+    ids = []
+    for name in names:
+        ids.append(index.ids.allocate())
+        index[ids[-1]] = workboy.newCompany(name)
+    return ids
+
+
+def test_listing_order_survives_journal_replay(batch, listed):
+    batch(*( "add 'Company {}'".format(n) for n in range(12) ))
+    assert listed() == [ workboy.parseIDNumber(n, 4) for n in range(12) ]
+
+
+def test_listing_order_survives_compaction(run, batch, listed):
+    batch(*( "add 'Company {}'".format(n) for n in range(12) ))
+    run('compact')
+    assert listed() == [ workboy.parseIDNumber(n, 4) for n in range(12) ]
+
+
+def test_listing_order_survives_merge(datafolder, listed):
+    store = workboy.JournalStore()
+    first, second = store.load(), store.load()
+    addCompanies(first, [ 'First {}'.format(n) for n in range(6) ])
+    addCompanies(second, [ 'Second {}'.format(n) for n in range(6) ])
+    assert store.save(first, set(first))
+    assert store.save(second, set(second))
+    assert listed() == [ workboy.parseIDNumber(n, 4) for n in range(12) ]
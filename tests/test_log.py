@@ -0,0 +1,38 @@
+import workboy
+
+
+def entry(date, message):
+    return { 'date': date, 'message': message }
+
+def logOf(*entries):
+    "Returns a log dictionary of the given (date, message) entries, in the order given."
+    return workboy.listToIDDictionary([ entry(*pair) for pair in entries ], l=2)
+
+
+def messages(log):
+    return [ (k, v['message']) for k, v in log.items() ]
+
+
+def test_entries_go_after_others_of_the_same_date():
+    log = logOf(('Jan 02, 2026', 'a'), ('Jan 05, 2026', 'b'), ('Jan 05, 2026', 'c'), ('Jan 09, 2026', 'd'))
+    log = workboy.insertLog(log, entry('Jan 05, 2026', 'e'))
+    assert messages(log) == [('00', 'a'), ('01', 'b'), ('02', 'c'), ('03', 'e'), ('04', 'd')]
+    log = workboy.insertLog(log, entry('Jan 01, 2026', 'f'))
+    assert messages(log)[:2] == [('00', 'f'), ('01', 'a')]
+
+
+def test_latest_entries_are_appended_in_place():
+    log = logOf(('Jan 02, 2026', 'a'), ('Jan 05, 2026', 'b'))
+    assert workboy.insertLog(log, entry('Jan 05, 2026', 'c')) is log
+    assert messages(log) == [('00', 'a'), ('01', 'b'), ('02', 'c')]
+
+    gapped = { '00': log['00'], '02': log['02'] }
+    assert messages(workboy.insertLog(gapped, entry('Jan 09, 2026', 'd'))) == [('00', 'a'), ('01', 'c'), ('02', 'd')]
+
+
+def test_logged_entries_are_kept_in_date_order(batch):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "0 log 'Jan 02, 2026' 'Found the posting'",
+        "0 log 'Jan 05, 2026' 'Sent a note'", "0 log 'Jan 09, 2026' 'Phone screen'", "0 log 'Jan 02, 2026' 'Asked around'")
+    log = workboy.loadIndex()['0000']['log']
+    assert [ v['message'] for v in log.values() ] == ['Found the posting', 'Asked around', 'Applied', 'Sent a note', 'Phone screen']
+    assert list(log) == [ workboy.parseIDNumber(n, 2) for n in range(5) ]
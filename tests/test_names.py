@@ -0,0 +1,32 @@
+import pytest
+
+import workboy
+
+
+@pytest.fixture
+def companies(batch):
+    batch("add Straße", "add Globex")
+
+
+def test_names_are_looked_up_ignoring_case(run, companies):
+    assert 'Globex' in run('once', 'GLOBEX', 'show')[1]
+    assert 'Straße' in run('once', 'STRASSE', 'show')[1]
+    assert 'could not be found' in run('once', 'Initech', 'show')[1]
+
+
+def test_names_differing_only_in_case_are_refused(run, listed, companies):
+    assert 'already exists' in run('once', 'add', 'strasse')[1]
+    assert 'already exists' in run('once', '0', 'rename', 'globex')[1]
+    assert listed() == ['0000', '0001']
+
+
+def test_renames_and_deletes_keep_the_lookup_in_step(run, batch, companies):
+    batch("1 rename GLOBEX", "0 rename Initech")
+    index = workboy.loadIndex()
+    assert index.lookupName('globex') == '0001'
+    assert index.lookupName('straße') == None
+    assert index.lookupName('initech') == '0000'
+
+    batch("del 0", "add INITECH")
+    run('compact')
+    assert workboy.loadIndex().names == { 'globex': '0001', 'initech': '0000' }
@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+import workboy
+
+
+class Terminal(io.StringIO):
+    "Stands in for stdout on a terminal."
+    def isatty(self):
+        return True
+
+
+class ClosedPipe(io.StringIO):
+    "Stands in for stdout piped to a reader which has gone away."
+    def write(self, text):
+        raise BrokenPipeError()
+
+
+@pytest.fixture
+def terminal(tmp_path, monkeypatch):
+    """Returns a function which puts stdout on a five-line terminal, whose pager writes to pager.txt, and
+    returns stdout. It is called from the test itself, pytest setting stdout up afresh after fixtures."""
+    monkeypatch.setattr(workboy, 'terminalRows', lambda: 5)
+    monkeypatch.setenv('PAGER', 'cat > "{}"'.format(tmp_path / 'pager.txt'))
+    def terminal():
+        stdout = Terminal()
+        monkeypatch.setattr(sys, 'stdout', stdout)
+        return stdout
+    return terminal
+
+
+def writeBlock(writer, count):
+    for n in range(count):
+        writer.line('line {}'.format(n))
+    writer.end()
+
+
+def test_blocks_are_set_off_by_blank_lines(capsys):
+    writer = workboy.OutputWriter()
+    writeBlock(writer, 2)
+    writeBlock(writer, 1)
+    assert capsys.readouterr().out == '\nline 0\nline 1\n\n\nline 0\n\n'
+
+
+def test_short_blocks_skip_the_pager(tmp_path, terminal):
+    stdout = terminal()
+    writeBlock(workboy.OutputWriter(), 2)
+    assert stdout.getvalue() == '\nline 0\nline 1\n\n'
+    assert not (tmp_path / 'pager.txt').exists()
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='pages through a POSIX shell command')
+def test_blocks_outgrowing_the_terminal_are_paged(tmp_path, terminal):
+    stdout = terminal()
+    writeBlock(workboy.OutputWriter(), 8)
+    assert stdout.getvalue() == ''
+    assert (tmp_path / 'pager.txt').read_text() == '\n' + ''.join( 'line {}\n'.format(n) for n in range(8) ) + '\n'
+
+
+def test_no_pager_writes_long_blocks_straight_out(tmp_path, terminal):
+    stdout = terminal()
+    writeBlock(workboy.OutputWriter(paging=False), 8)
+    assert stdout.getvalue().count('line') == 8
+    assert not (tmp_path / 'pager.txt').exists()
+
+
+def test_machine_readable_output_is_only_the_data(capsys):
+    writer = workboy.OutputWriter(machineReadable=True)
+    writer.line('Globex', { 'id': '0000', 'name': 'Globex' })
+    writer.line('not data')
+    writer.end()
+    assert capsys.readouterr().out == '{"id": "0000", "name": "Globex"}\n'
+
+
+def test_a_closed_pipe_drops_the_rest_quietly(monkeypatch):
+    monkeypatch.setattr(sys, 'stdout', ClosedPipe())
+    writeBlock(workboy.OutputWriter(), 3)
+
+
+def test_commands_print_json_lines_when_asked(run, batch):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "add Initech")
+    status, out = run('all', '--json')
+    assert [ json.loads(line)['name'] for line in out.splitlines() ] == ['Globex', 'Initech']
+    status, out = run('all', '--no-pager')
+    assert 'Globex' in out and not out.lstrip().startswith('{')
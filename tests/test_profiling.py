@@ -0,0 +1,45 @@
+import json
+import os
+
+import pytest
+
+import workboy
+
+
+@pytest.fixture
+def profile(run, tmp_path):
+    "Returns a function which runs one workboy call under --profile and returns the counts it reported."
+    def profile(*argv):
+        path = tmp_path / 'profile.json'
+        workboy.dateFromString.cache_clear()       # as in a call of its own
+        run(*argv, '--profile={}'.format(path))
+        return json.loads(path.read_text())['counters']
+    return profile
+
+
+@pytest.fixture
+def companies(run, batch):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied here'", "add Initech", "1 info 'Remote team'")
+    run('compact')
+
+
+def test_search_counts(profile, companies):
+    # The query's words, then the one matching record read and its one log message's.
+    assert profile('search', 'applied') == { 'records scanned': 1, 'regexes evaluated': 2 }
+
+
+def test_edit_counts(profile, datafolder, companies):
+    counts = profile('once', '1', 'log', 'Jan 06, 2026', 'Called')
+    shard = workboy.loadIndex().stubs['0001'].shard
+    written = (datafolder / 'workboy_journal').stat().st_size + os.path.getsize(os.path.join(workboy.shardfolderPath, shard))
+    assert counts == {
+        'records scanned': 1,
+        'dates parsed': 1,          # the date given, found in the memo when the activity index takes it
+        'regexes evaluated': 7,     # the two arguments' classification, and the record's words and name before and after
+        'bytes written': written,
+    }
+
+
+def test_sqlite_writes_are_counted(run, profile, companies):
+    run('convert', 'sqlite')
+    assert profile('once', '1', 'log', 'Jan 06, 2026', 'Called')['bytes written'] > len('Jan 06, 2026Called')
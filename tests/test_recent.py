@@ -0,0 +1,77 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+import workboy
+
+
+def daysAgo(days):
+    return date.today() - timedelta(days=days)
+
+
+def recent(run, *window):
+    "Returns the (company ID, log ID, ISO date) of each entry 'workboy recent' lists for the given window, in order."
+    status, out = run('recent', *window, '--json')
+    return [ (entry['id'], entry['log'], entry['date']) for entry in map(json.loads, out.splitlines()) if entry ]
+
+
+@pytest.fixture
+def companies(batch):
+    "Adds two companies with log entries from 40, 30, 7 and 2 days ago, and returns the ISO dates of each."
+    log = lambda id, days, message: "{} log '{}' '{}'".format(id, workboy.dateToString(daysAgo(days)), message)
+    batch("add Globex", log(0, 40, 'Applied'), log(0, 7, 'Phone screen'), "add Initech", log(1, 30, 'Applied'), log(1, 2, 'Offer'))
+    return { days: daysAgo(days).isoformat() for days in (40, 30, 7, 2) }
+
+
+def test_recent_lists_the_window_oldest_first(run, companies):
+    assert recent(run) == [('0001', '00', companies[30]), ('0000', '01', companies[7]), ('0001', '01', companies[2])]
+    assert recent(run, '7') == [('0000', '01', companies[7]), ('0001', '01', companies[2])]
+    assert recent(run, '6') == [('0001', '01', companies[2])]
+    assert recent(run, 'since', workboy.dateToString(daysAgo(40))) == [('0000', '00', companies[40])] + recent(run)
+    assert recent(run, '0') == []
+
+
+def test_recent_refuses_other_windows(run, companies):
+    assert 'Request voided' in run('recent', 'lately')[1]
+    assert 'Request voided' in run('recent', 'since', 'never')[1]
+
+
+def test_recent_follows_edits_and_deletes(run, batch, companies):
+    batch("0 log del 1", "1 log '{}' 'Signed'".format(workboy.dateToString(daysAgo(1))), "add Umbrella",
+        "2 log '{}' 'Applied'".format(workboy.dateToString(daysAgo(3))))
+    assert recent(run, '7') == [('0002', '00', daysAgo(3).isoformat()), ('0001', '01', companies[2]), ('0001', '02', daysAgo(1).isoformat())]
+
+    batch("del 1")
+    run('compact')
+    assert recent(run, '7') == [('0002', '00', daysAgo(3).isoformat())]
+
+
+def test_only_recent_reads_the_activity_index(run, batch, companies, monkeypatch):
+    run('compact')
+    reads, readActivity = [], workboy.readActivity
+    monkeypatch.setattr(workboy, 'readActivity', lambda index: reads.append(index) or readActivity(index))
+    batch("0 log '{}' 'Thanked them'".format(workboy.dateToString(daysAgo(1))))
+    run('once', '0', 'show')
+    run('all')
+    run('--no-pager')
+    assert reads == [] and workboy.loadIndex().activity == None
+
+    assert recent(run, '7') == [('0000', '01', companies[7]), ('0001', '01', companies[2]), ('0000', '02', daysAgo(1).isoformat())]
+    assert len(reads) == 1
+
+
+def test_unsaved_changes_are_replayed_over_the_saved_activity_index(run, batch, companies):
+    run('compact')
+    batch("1 log del 1", "0 log '{}' 'Thanked them'".format(workboy.dateToString(daysAgo(1))))
+    index = workboy.loadIndex()
+    today = date.today().toordinal()
+    index.updateActivity('0001', {}, { '05': { 'date': workboy.dateToString(date.today()), 'message': 'Started' } })
+    assert index.activitySince(today - 7) == [(today - 7, '0000', '01'), (today - 1, '0000', '02'), (today, '0001', '05')]
+
+
+def test_headers_which_held_the_activity_index_still_read(run, companies):
+    run('compact')
+    index = workboy.loadIndex()
+    old = dict(index.snapshot(), version=5, activity=index.loadedActivity())
+    assert workboy.CompanyIndex.fromSnapshot(old).activity == index.activity
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import workboy
+
+
+def searchedIDs(run, *words):
+    "Returns the IDs of the companies 'workboy search' finds for the given words, best match first."
+    status, out = run('search', '--json', *words)
+    return list(dict.fromkeys( json.loads(line)['id'] for line in out.splitlines() if line ))
+
+
+@pytest.fixture
+def companies(batch):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied through the careers page'",
+        "add Initech", "1 info 'Remote friendly team'", "1 log 'Jan 06, 2026' 'Applied by referral'")
+
+
+def test_search_reads_journaled_and_compacted_changes(run, batch, companies):
+    assert searchedIDs(run, 'applied') == ['0000', '0001']
+    run('compact')
+    assert searchedIDs(run, 'remote', 'team') == ['0001']
+    batch("0 info 'Remote first'")
+    assert searchedIDs(run, 'remote') == ['0000', '0001']
+    run('restore-backup')
+    assert searchedIDs(run, 'remote') == ['0001']
+
+
+def test_search_never_writes_the_store(run, datafolder, companies):
+    run('compact')
+    (datafolder / 'workboy_terms').unlink()
+    version = workboy.storeVersion()
+    assert searchedIDs(run, 'applied') == ['0000', '0001']
+    assert workboy.storeVersion() == version
+    assert not (datafolder / 'workboy_terms').exists()
+
+
+def test_search_reads_only_its_tokens_files(run, datafolder, companies, monkeypatch):
+    run('compact')
+    read = []
+    readTermShard = workboy.readTermShard
+    monkeypatch.setattr(workboy, 'readTermShard', lambda shard: read.append(shard) or readTermShard(shard))
+    assert searchedIDs(run, 'referral') == ['0001']
+    assert len(read) == 1
+
+
+def nameIndex(names, contacts={}):
+    "Returns a company index held in memory of companies with the given names, and the given contacts' names by company name."
+    index = workboy.CompanyIndex()
+    for name in names:
+        record = workboy.newCompany(name)
+        for c, contactName in enumerate(contacts.get(name, [])):
+            contact = workboy.newContact()
+            contact['name'] = contactName
+            record['contacts'][workboy.parseIDNumber(c, 2)] = contact
+        index[index.ids.allocate()] = record
+    index.terms, index.termsComplete = workboy.buildTerms(index), True
+    return index
+
+
+def test_fuzzy_matches_look_past_common_trigrams():
+    index = nameIndex([ 'Company {}'.format(n) for n in range(500) ] + ['Globex'])
+    assert workboy.fuzzyMatches(index, 'Compnay 123')[0][2] == 'Company 123'
+    assert workboy.fuzzyMatches(index, 'Globx')[0][2] == 'Globex'
+    matches = workboy.fuzzyMatches(index, 'Compny')
+    assert len(matches) == 3 and all( match[2].startswith('Company ') for match in matches )
+
+
+def test_fuzzy_matches_find_contacts():
+    index = nameIndex(['Globex', 'Initech'], { 'Initech': ['Bill Lumbergh'] })
+    assert [ match[1:] for match in workboy.fuzzyMatches(index, 'Lumberg') ] == [('0001', 'Bill Lumbergh')]
@@ -0,0 +1,62 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import workboy
+from server import serverReplyTimeout
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='the server listens on a Unix socket')
+
+
+def startWorkboy(*argv, **options):
+    "Starts workboy as a process of its own on the test's data folder."
+    return subprocess.Popen([sys.executable, workboy.__file__] + list(argv), env=dict(os.environ, LOCALAPPDATA='.'),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **options)
+
+
+@pytest.fixture
+def server(run, batch):
+    "Fills the store with two companies and starts a server over it, stopping it once the test is done."
+    batch("add Globex", "add Initech")
+    process = startWorkboy('serve')
+    for _ in range(100):
+        if os.path.exists(workboy.serverSocketPath):
+            break
+        time.sleep(0.05)
+    yield process
+    run('serve', 'stop')
+    try:
+        process.communicate(timeout=10)
+    finally:
+        process.kill()
+
+
+def test_calls_go_around_a_call_waiting_on_its_user(run, listed, server):
+    waiting = startWorkboy('del', '0', stdin=subprocess.PIPE)
+    prompt = b''
+    while b'Are you sure?' not in prompt:
+        chunk = waiting.stdout.read1(1024)
+        assert chunk, prompt
+        prompt += chunk
+
+    start = time.perf_counter()
+    run('once', 'add', 'Umbrella')
+    assert time.perf_counter() - start < serverReplyTimeout
+    assert listed() == ['0000', '0001', '0002']
+
+    waiting.communicate(b'y\n', timeout=10)
+    assert listed() == ['0001', '0002']
+
+
+def test_changes_are_saved_behind_the_reply(run, listed, server):
+    run('once', 'add', 'Umbrella')
+    run('once', '0', 'log', 'Jan 05, 2026', 'Applied')
+    run('serve', 'stop')
+    server.communicate(timeout=10)
+    assert not os.path.exists(workboy.serverSocketPath)
+    assert listed() == ['0000', '0001', '0002']
+    assert 'Applied' in run('once', '0', 'show')[1]
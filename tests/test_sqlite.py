@@ -0,0 +1,64 @@
+import pytest
+
+import workboy
+from sqlitestore import SQLiteStore
+
+
+def records(index):
+    "Returns every record of index by ID, as plain dictionaries."
+    return { id: dict(index[id]) for id in index }
+
+def listedNames(index):
+    return [ stub['name'] for id, stub in index.listing() ]
+
+
+@pytest.fixture
+def database(run, batch):
+    "Fills the store with three companies and converts it to SQLite, returning the records as they were."
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "0 contact 'Hank Scorpio'", "add Initech", "1 info 'Remote team'", "add Umbrella")
+    saved = records(workboy.loadIndex())
+    run('convert', 'sqlite')
+    return saved
+
+
+def test_conversion_keeps_every_record(run, database):
+    assert records(SQLiteStore().load()) == database
+    run('convert', 'json')
+    assert records(workboy.loadIndex()) == database
+
+
+def test_saves_read_back_and_are_undone_one_at_a_time(run, batch, database):
+    batch("0 log 'Jan 06, 2026' 'Phone screen'")
+    batch("del 2")
+    index = SQLiteStore().load()
+    assert listedNames(index) == ['Globex', 'Initech']
+    assert [ log['message'] for log in index['0000']['log'].values() ] == ['Applied', 'Phone screen']
+
+    run('restore-backup')
+    assert listedNames(SQLiteStore().load()) == ['Globex', 'Initech', 'Umbrella']
+    run('restore-backup')
+    assert records(SQLiteStore().load()) == database
+
+
+def test_stale_saves_merge_or_are_refused(database, capsys):
+    store = SQLiteStore()
+    first, second, third = store.load(), store.load(), store.load()
+    first.rename('0000', 'Globex Corp')
+    second.rename('0001', 'Initrode')
+    third.rename('0000', 'Globex Inc')
+    assert store.save(first, {'0000'})
+    assert store.save(second, {'0001'})
+    assert not store.save(third, {'0000'})
+    assert 'Not saved' in capsys.readouterr().out
+    assert listedNames(store.load()) == ['Globex Corp', 'Initrode', 'Umbrella']
+
+
+def test_companies_added_by_both_keep_their_records(database, capsys):
+    store = SQLiteStore()
+    first, second = store.load(), store.load()
+    first['0003'] = workboy.newCompany('Hooli')
+    second['0003'] = workboy.newCompany('Pied Piper')
+    assert store.save(first, {'0003'})
+    assert store.save(second, {'0003'})
+    assert 'Pied Piper was saved as 0004' in capsys.readouterr().out
+    assert listedNames(store.load()) == ['Globex', 'Initech', 'Umbrella', 'Hooli', 'Pied Piper']
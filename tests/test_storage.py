@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import workboy
+
+
+def records(index):
+    "Returns every record of index by ID, as plain dictionaries."
+    return { id: dict(index[id]) for id in index }
+
+
+@pytest.fixture
+def companies(batch):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "add Initech", "1 info 'Remote team'", "add Umbrella")
+
+
+def test_journal_replay_gives_the_index_as_saved(run, batch, companies):
+    batch("0 log 'Jan 06, 2026' 'Phone screen'", "1 rename Initrode", "del 2")
+    saved = records(workboy.loadIndex())
+    assert [ record['name'] for record in saved.values() ] == ['Globex', 'Initrode']
+    assert [ log['message'] for log in saved['0000']['log'].values() ] == ['Applied', 'Phone screen']
+
+    run('compact')
+    assert records(workboy.loadIndex()) == saved
+
+
+def test_a_half_written_save_is_ignored_then_cut_away(run, batch, datafolder, companies, capsys):
+    journal = datafolder / 'workboy_journal'
+    with open(journal, 'ab') as file:
+        file.write(b'{"put": {"0003": ')
+    assert list(workboy.loadIndex()) == ['0000', '0001', '0002']
+    assert 'incomplete save' in capsys.readouterr().out
+
+    batch("add Hooli")
+    lines = journal.read_bytes().splitlines()
+    assert all( json.loads(line) for line in lines )
+    assert list(workboy.loadIndex()) == ['0000', '0001', '0002', '0003']
+
+
+def test_an_interrupted_compaction_is_finished_by_the_next_lock(batch, datafolder, companies, monkeypatch):
+    index = workboy.loadIndex()
+    index['0003'] = workboy.newCompany('Hooli')
+    replace, moves = os.replace, []
+    def crash(source, target):
+        if moves and os.path.exists(workboy.commitfilePath):
+            raise KeyboardInterrupt     # the system going down partway through the renames
+        moves.append(target)
+        replace(source, target)
+    monkeypatch.setattr(os, 'replace', crash)
+    with pytest.raises(KeyboardInterrupt):
+        workboy.compactStore(index)
+    monkeypatch.setattr(os, 'replace', replace)
+
+    assert os.path.exists(workboy.commitfilePath)
+    assert list(workboy.loadIndex()) == ['0000', '0001', '0002', '0003']
+    assert not os.path.exists(workboy.commitfilePath)
+    assert not os.path.exists(workboy.journalfilePath)
+
+
+def test_commit_files_carries_out_every_operation(datafolder):
+    for name in ('a.tmp', 'b.tmp', 'c'):
+        (datafolder / name).write_text(name)
+    workboy.commitFiles([ ('move', str(datafolder / 'a.tmp'), str(datafolder / 'a')), ('move', str(datafolder / 'b.tmp'), str(datafolder / 'b')),
+        ('remove', str(datafolder / 'c')), ('move', str(datafolder / 'gone'), str(datafolder / 'd')) ])
+    assert sorted( path.name for path in datafolder.iterdir() if path.is_file() ) == ['a', 'b']
+    assert (datafolder / 'a').read_text() == 'a.tmp'
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='tried from another process with flock')
+def test_store_lock_keeps_other_processes_out_until_released(datafolder):
+    tryLock = 'import fcntl, sys; fcntl.flock(open(sys.argv[1], "a+b"), fcntl.LOCK_EX | fcntl.LOCK_NB)'
+    def othersCanLock():
+        return subprocess.run([sys.executable, '-c', tryLock, workboy.lockfilePath], stderr=subprocess.DEVNULL).returncode == 0
+
+    with workboy.storeLock:
+        with workboy.storeLock:     # taken again by its holder
+            assert not othersCanLock()
+        assert not othersCanLock()
+    assert othersCanLock()
+
+
+def test_stale_saves_of_other_companies_are_merged(companies):
+    store = workboy.JournalStore()
+    first, second = store.load(), store.load()
+    first.rename('0000', 'Globex Corp')
+    second.rename('0001', 'Initrode')
+    assert store.save(first, {'0000'})
+    assert store.save(second, {'0001'})
+    assert [ stub['name'] for id, stub in workboy.loadIndex().listing() ] == ['Globex Corp', 'Initrode', 'Umbrella']
+
+
+def test_stale_saves_of_the_same_company_are_refused(companies, capsys):
+    store = workboy.JournalStore()
+    first, second = store.load(), store.load()
+    first.rename('0000', 'Globex Corp')
+    second.rename('0000', 'Globex Inc')
+    second['0003'] = workboy.newCompany('Hooli')
+    assert store.save(first, {'0000'})
+    assert not store.save(second, {'0000', '0003'})
+    assert 'Not saved' in capsys.readouterr().out
+    assert [ stub['name'] for id, stub in workboy.loadIndex().listing() ] == ['Globex Corp', 'Initech', 'Umbrella']
+
+
+def test_stale_saves_adding_the_same_name_are_refused(companies):
+    store = workboy.JournalStore()
+    first, second = store.load(), store.load()
+    first['0003'] = workboy.newCompany('Hooli')
+    second['0003'] = workboy.newCompany('hooli')
+    assert store.save(first, {'0003'})
+    assert not store.save(second, {'0003'})
+    assert [ stub['name'] for id, stub in workboy.loadIndex().listing() ] == ['Globex', 'Initech', 'Umbrella', 'Hooli']
@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+
+import workboy
+
+
+def logDate(days):
+    "Returns the stored form of the date the given number of days from today."
+    return workboy.dateToString(date.today() + timedelta(days=days))
+
+
+def summaries(index):
+    return { id: index.stub(id)['summary'] for id in index }
+
+
+def test_summaries_follow_log_edits_and_deletes(run, batch):
+    batch("add Globex", "0 log 'Jan 05, 2026' 'Applied'", "0 log 'Jan 02, 2026' 'Found the posting'", "add Initech")
+    batch("0 log 'Feb 10, 2026' 'Phone screen'", "1 log 'Mar 01, 2026' 'Applied'", "1 defunct")
+    assert summaries(workboy.loadIndex()) == {
+        '0000': { 'last': date(2026, 2, 10).toordinal(), 'logs': 3, 'defunct': False },
+        '0001': { 'last': date(2026, 3, 1).toordinal(), 'logs': 1, 'defunct': True }
+        }
+
+    batch("0 log del 2", "1 log del 0", "1 defunct")
+    run('compact')
+    index = workboy.loadIndex()
+    assert summaries(index) == {
+        '0000': { 'last': date(2026, 1, 5).toordinal(), 'logs': 2, 'defunct': False },
+        '0001': { 'last': None, 'logs': 0, 'defunct': False }
+        }
+    assert all( summaries(index)[id] == workboy.summarizeCompany(index[id]) for id in index )
+
+
+def test_dashboard_leaves_out_applications_only_logged_ahead(run, batch):
+    batch("add Globex", "0 log '{}' 'Applied'".format(logDate(-3)), "add Initech", "1 log '{}' 'Interview'".format(logDate(5)),
+        "add Umbrella")
+    status, out = run('--no-pager')
+    assert '3 days' in out and 'Globex' in out
+    assert 'Umbrella' in out
+    assert 'Initech' not in out
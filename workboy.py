@@ -1,15 +1,15 @@
 from datetime import date
 from datetime import datetime
-import textwrap
-import shlex
-import json
+from collections.abc import MutableMapping
+from array import array
+import functools
+import bisect
+import io
 import os
 import sys
-import re
-
-# TODO All ID dictionaries should have their ID space compressed on save.
-# Rather, the working record should do so on save.
 
+# json, re, shlex and textwrap are imported where they are used, so that commands which never touch
+# them (help, for one) don't pay for them at startup.
 
 # TODO Rework?
 # Not that this is bad. It's fine.
@@ -19,10 +19,49 @@ helpText = '''
 workboy                     : Display recent activity.
 workboy all                 : Displays the entire company index.
 workboy recent              : Displays all log activities from the last 30 days.
+workboy recent [days]       : Displays all log activities from the last given number of days.
+workboy recent since [date] : Displays all log activities from the given date onward.
+workboy search [words]      : Lists the info and log entries which mention the given words, from the
+                              companies which mention them all, best match first.
+workboy export [file]       : Writes every company to file, or to stdout if none is given. With
+                              --format csv (the default), one row per company; jsonl, each full
+                              record as one JSON object per line; ics, a calendar event for
+                              every log entry.
 workboy [name]              : Displays a company record by name or ID. Starts the edit-poller.
+                              Near-miss names are resolved to, or suggest, the closest companies.
 workboy add [name]          : Add a new company to the index. Starts the edit-poller.
 workboy del [name]          : Deletes a company by name or ID from the index.
 workboy once ...            : Prepend that ends continuous polling, treating this request as final.
+workboy batch [file]        : Runs the commands in file, one per line and '-' meaning stdin, saving
+                              once at the end. With --atomic, nothing is saved if any line fails.
+workboy import [file]       : Adds a company for each row of a CSV file with a header row, or each
+                              object of a JSON Lines file, '-' meaning stdin, saving once at the
+                              end. Columns are name, url, phone, address, defunct, info, contact,
+                              email, contact phone, date and log; each is checked as the edit
+                              commands would check it, and names already taken are refused.
+                              With --atomic, nothing is saved if any row fails.
+workboy bench [name]        : Runs workboy's performance benchmarks, or just the one named, failing if
+                              startup is over its budget.
+workboy bench suite [sizes] : Times loading, saving and each command over a seeded synthetic store
+                              of each size given, 1000 and 10000 by default. --seed [n] changes the
+                              data and --rounds [n] the repeats. With --json, the results print as
+                              JSON lines to keep as a baseline; --baseline [file] compares against
+                              one, failing if anything is over --tolerance [percent] slower (25).
+workboy serve               : Keeps the index loaded and answers every other workboy call made
+                              meanwhile, which then only forwards its arguments. A call made while
+                              another is waiting on its user works on the files as usual. Ctrl-C to stop.
+workboy serve stop          : Stops the running server.
+
+Options, given anywhere among the arguments:
+--json                      : Lists companies and activity as one JSON object per line, for scripts.
+--no-pager                  : Never sends long output through the pager ($PAGER, or less).
+--profile[=files]           : Reports the time spent in each command and in loading and saving the
+                              store, with counts of the records scanned, dates parsed, regexes
+                              evaluated and bytes written, on stderr. Given files, a .json file
+                              gets the report as JSON instead and a .prof file cProfile's
+                              statistics; comma-separated for both. WORKBOY_PROFILE=1 or
+                              WORKBOY_PROFILE=files does the same. Profiled calls never go to a
+                              running server, so that the report covers the work itself.
 
 Any command which starts edit-polling will pass the remaining arguments to the polling system.
 
@@ -44,20 +83,33 @@ rename [name]               : Changes the record's name.
 
 Archiving and data-restoration commands.
 
-workboy always saves a copy of the previous data record before writing the current one, in
-case of catastrophic data failure. workboy attempts to be smart about this, but it is still
-possible to overwrite your data and your auto-backup data, so be careful.
+workboy only ever appends your changes to its journal, and keeps the previous data record when it
+folds the journal back into the datafile, in case of catastrophic data failure. workboy attempts
+to be smart about this, but it is still possible to overwrite your data and your auto-backup data,
+so be careful.
 
 workboy's archival functions are its best data failsafes: they cannot be overwritten as a
 matter of workboy's typical operations. It is recommended to archive periodically and before
 any changes to workboy's code.
 
-workboy restore-backup          : Restores the last auto-backup to the current record.
-workboy archive                 : Save a copy of the record as is under today's date.
+workboy restore-backup          : Restores the last auto-backup to the current record, undoing
+                                  the most recent save.
+workboy compact                 : Folds the journal of saved changes into the datafile.
+workboy compact ids             : As above, and also renumbers companies so no IDs are left unused.
+workboy convert [compact/json]  : Rewrites the datafile and every record in the compact binary format,
+                                  which is smaller and quicker to load, or back in JSON. Nothing is
+                                  lost either way.
+workboy convert sqlite          : Moves the records into a SQLite database, which answers lookups by
+                                  query and saves each edit as one small transaction. Converting to
+                                  compact or json moves them back. Either way, the old store is kept
+                                  as the backup.
+workboy archive                 : Save a copy of the record as is under today's date. Records
+                                  unchanged since an earlier archive are stored only once.
 workboy restore-archive [date]  : Restores an archive file to the current data record
                                   if the given date is valid.
-workboy display-archives        : Prints all known archive files.
-workboy delete-archive          : Deletes an archive file if the given date is valid.
+workboy display-archives        : Prints the date, record count and size of each archive.
+workboy delete-archive          : Deletes an archive file if the given date is valid, along with
+                                  the records no other archive holds.
 '''.strip()
 
 
@@ -65,6 +117,18 @@ workboy delete-archive          : Deletes an archive file if the given date is v
 #### Support functions                                                                          ####
 ####################################################################################################
 
+####################################################################################################
+#### Work counters
+
+# Counts of the work a call has done, kept as it is done and reported by --profile: the records read
+# from the store, the dates parsed rather than found in a memo, every regex run and the bytes written.
+workCounts = {}
+
+def countWork(name, amount=1):
+    "Adds amount to the count of the given kind of work done."
+    workCounts[name] = workCounts.get(name, 0) + amount
+
+
 ####################################################################################################
 #### Regex strings and checkers
 
@@ -79,8 +143,26 @@ regexDateShort = r'^[01]?\d-[0123]?\d(-(\d{2}|\d{4}))?$'
 
 def regexCheck(pattern, string):
     "Returns True if the given string matches the given regex pattern."
+    import re
+    countWork('regexes evaluated')
     return re.search(pattern, string)
 
+@functools.lru_cache(maxsize=None)
+def fieldClassifier():
+    """Returns all of the field patterns above as one compiled alternation, in the order interpretArgument
+    gives them priority. The street-address pattern is unanchored at its start, so it gets a lazy lead-in
+    to match anywhere in the string the way re.search would."""
+    import re
+    return re.compile('|'.join('(?P<{}>{})'.format(field, pattern) for field, pattern in (
+        ('date', regexDate),
+        ('dateShort', regexDateShort),
+        ('email', regexEmail),
+        ('phone', regexPhoneNumber),
+        ('address', '(?s:.*?)' + regexStreetAddress),
+        ('url', regexURL),
+        ('name', regexName)
+        )))
+
 
 ####################################################################################################
 #### Dictionary and List convenience methods
@@ -119,27 +201,46 @@ def dateToString(d):
     "Converts a date object to a formatted string."
     return d.strftime('%b %d, %Y')
 
+# Month abbreviations as dateToString writes them under the current locale.
+monthNumbers = { date(2000, m, 1).strftime('%b'): m for m in range(1, 13) }
+
+@functools.lru_cache(maxsize=4096)
 def dateFromString(s):
     "Converts a formatted string to a date object."
-    return datetime.strptime(s, '%b %d, %Y').date()     # TODO Why datetime?
+    # Stored dates are all in dateToString's form, 'Jan 02, 2020', and are picked apart by hand;
+    # anything else is left to strptime. Stored dates repeat a lot, so results are memoized.
+    countWork('dates parsed')
+    month = monthNumbers.get(s[:3])
+    if month and len(s) == 12 and s[3] == ' ' and s[6:8] == ', ' and s[4:6].isdigit() and s[8:].isdigit():
+        return date(int(s[8:]), month, int(s[4:6]))
+    return datetime.strptime(s, '%b %d, %Y').date()
 
 def parseDate(s):
     "Returns a date object parsed from a string s, or returns None if one couldn't be retrieved."
     result = None
     datePatterns = (
-        '%b %d, %Y',
         '%b %d',
         '%Y-%m-%d',
         '%m-%d-%y',
         '%m-%d-%Y',
         '%m-%d'
         )
-    for pattern in datePatterns:
-        try:
-            result = datetime.strptime(s, pattern).date()
-            break
-        except ValueError:
-            pass
+    try:
+        if len(s) == 10 and s[4] == '-' and s[7] == '-':
+            countWork('dates parsed')
+            result = date.fromisoformat(s)      # fast path for the dates spreadsheets export
+        else:
+            result = dateFromString(s)      # fast path for dates in the format workboy stores them in, counted there
+    except ValueError:
+        pass
+    if result == None:
+        countWork('dates parsed')
+        for pattern in datePatterns:
+            try:
+                result = datetime.strptime(s, pattern).date()
+                break
+            except ValueError:
+                pass
     if result != None:
         if result.year == 1900:     # Just assume a year wasn't provided; I got no relationship with 1900
             result = result.replace(year=date.today().year)
@@ -165,21 +266,115 @@ def parseIDNumber(s, l=4):
 
 statusDefunct = '[Defunct]'
 statusResearching = 'Researching'
-displayString = ['','']
 
-def printBuffer(s=''):
-    "'Prints' to an internal buffer string."
-    displayString.insert(-1, s)
+def pagerCommand():
+    "Returns the shell command used to page long output."
+    return os.environ.get('PAGER') or ('more' if os.name == 'nt' else 'less -FRX')
+
+def terminalRows():
+    "Returns the height of the terminal in lines."
+    try:
+        return os.get_terminal_size(sys.stdout.fileno()).lines
+    except (OSError, ValueError):
+        return 24
+
+class OutputWriter:
+    """Streams blocks of display lines to stdout as they are produced. Blocks are set off by a blank
+    line on either side, and a block which outgrows the terminal is handed over to a pager. In
+    machine-readable mode, only lines carrying data are written, each as one JSON object."""
+    def __init__(self, machineReadable=False, paging=True):
+        self.machineReadable = machineReadable
+        self.paging = paging
+        self.target = None      # where the current block is being written, or None between blocks
+        self.held = None        # lines held back while deciding whether the current block needs the pager
+        self.pager = None
+        self.lines = 0
+
+    def line(self, s='', data=None):
+        "Adds a line to the current block, starting one if necessary."
+        if self.machineReadable:
+            if data != None:
+                import json
+                self.emit(json.dumps(data))
+            return
+        if self.target == None:
+            self.emit('')
+        self.emit(s)
+
+    def emit(self, text):
+        if self.target == None:
+            self.target = sys.stdout
+            self.held = [] if self.paging and not self.machineReadable and sys.stdout.isatty() else None
+        self.lines += text.count('\n') + 1
+        if self.held == None:
+            self.write(text)
+            return
+        self.held.append(text)
+        if self.lines >= terminalRows():
+            self.openPager()
+
+    def write(self, text):
+        try:
+            self.target.write(text + '\n')
+        except (BrokenPipeError, OSError):
+            self.target = open(os.devnull, 'w')     # the reader has gone away; quietly drop the rest
+
+    def openPager(self):
+        "Sends the current block, including the lines held back so far, through the pager."
+        import subprocess
+        try:
+            self.pager = subprocess.Popen(pagerCommand(), shell=True, stdin=subprocess.PIPE, text=True)
+            self.target = self.pager.stdin
+        except OSError:
+            pass
+        held, self.held = self.held, None
+        for text in held:
+            self.write(text)
+
+    def end(self):
+        "Finishes the current block."
+        if self.target == None:
+            return
+        if not self.machineReadable:
+            self.emit('')
+        held, self.held = self.held or [], None
+        for text in held:
+            self.write(text)
+        try:
+            self.target.flush()
+            if self.pager:
+                self.pager.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        if self.pager:
+            self.pager.wait()
+        self.target = None
+        self.pager = None
+        self.lines = 0
+
+output = OutputWriter()         # The display sink used by printBuffer(); configured by the script's options.
+
+def printBuffer(s='', data=None):
+    "Prints a line of display output, or in machine-readable mode, the given data dictionary if there is one."
+    output.line(s, data)
 
 def displayBuffer():
-    "Prints the internal buffer string to the console."
-    global displayString
-    if len(displayString) > 2:
-        print('\n'.join(displayString))
-    displayString = ['','']
+    "Ends the current block of display output."
+    output.end()
+
+rejections = []     # The requests voided so far this run, in the words they were reported with.
+
+def printRejection(s, buffered=False):
+    "Prints that a request was voided, as part of the current block of display output if buffered, and notes it."
+    rejections.append(s)
+    if buffered:
+        printBuffer(s)
+    else:
+        print(s)
 
 def lineWrap(message, indent=0, width=98):
     "Wraps the given message to some character width limit, including a left-margin equal to indent."
+    import textwrap
     lines = textwrap.wrap(message, width-indent)    # returns [line1, line2, line3, ...]
     spacer = '\n{}'.format(' '*indent)
     return spacer.join(lines)
@@ -227,15 +422,14 @@ def formatPhoneNumber(s):
 
 def applicationStatus(company):
     "Given a dictionary of company information, returns a string representing the application status with them."
-    if company['defunct']:
+    summary = company['summary']
+    if summary['defunct']:
         return statusDefunct
-    if not company['log']:
+    if not summary['logs']:
         return statusResearching
     # else
-    datesList = list(company['log'].values())
-    lastDate = dateFromString(datesList[-1]['date'])
-    difference = date.today() - lastDate
-    return '{} days'.format(difference.days)
+    difference = date.today().toordinal() - summary['last']
+    return '{} days'.format(difference)
 
 def formatCompany(id, record):
     "Given a dictionary of company information, returns a neatly readable string."
@@ -280,6 +474,18 @@ def formatCompanyShort(id, record):
     status = applicationStatus(record)
     return '{} {:<40} | {}'.format(id, record['name'], status)
 
+def companyData(id, record):
+    "Given a dictionary of company information, returns the machine-readable counterpart to formatCompanyShort()."
+    summary = record['summary']
+    return {
+        'id': id,
+        'name': record['name'],
+        'status': applicationStatus(record),
+        'lastContact': date.fromordinal(summary['last']).isoformat() if summary['last'] else None,
+        'logs': summary['logs'],
+        'defunct': summary['defunct']
+    }
+
 
 ####################################################################################################
 #### Dictionary Objects                                                                         ####
@@ -295,7 +501,8 @@ def newCompany(name=''):
         'contacts': {},         # list of personal contacts within the company
         'info': {},             # list of itemized information strings
         'log': {},              # list of recorded interactions with this company: date + description of what happened
-        'defunct': False        # whether application process is closed (failed)
+        'defunct': False,       # whether application process is closed (failed)
+        'summary': newSummary() # cached application status, see summarizeCompany()
     }
 
 def newContact():
@@ -314,27 +521,80 @@ def newLog():
         'message': ''
     }
 
+def newSummary():
+    "Returns a new application-status summary dict."
+    return {
+        'last': None,           # date of the last logged interaction, as a date ordinal
+        'logs': 0,              # number of logged interactions
+        'defunct': False        # mirror of the company's defunct flag
+    }
+
+def summarizeCompany(record):
+    "Returns the application-status summary for a company record, which listing commands read in place of its log."
+    summary = newSummary()
+    log = record['log']
+    if log:
+        summary['last'] = dateFromString(next(reversed(log.values()))['date']).toordinal()
+    summary['logs'] = len(log)
+    summary['defunct'] = record['defunct']
+    return summary
+
 
 ####################################################################################################
 #### ID Managing Functions                                                                      ####
 ####################################################################################################
 
-def newID(index, l=4):
-    "Returns a length l string guaranteed to be a unique identifier in index."
-    LIMIT = 10**l - 1               # get the maximum allowable index for the given string length
-    id = len(index.keys()) - 1      # get last theoretical element-index of record
-    openSpaceExists = id < LIMIT    # Confirm that the number of entries has not completely filled ID space.
-    idstring = ''
-
-    assert id < LIMIT, 'I think we\'re full, yo. Given record has {} elements.'.format(id)
-    assert l > 0, 'What happened, dude? ID length has to be greater than 0.'
-
-    while openSpaceExists:
-        id = (id + 1) if id <= LIMIT else 0
-        if (idstring := parseIDNumber(id, l)) not in index:
-            break
-
-    return idstring
+class IDAllocator:
+    """Hands out unused IDs for one ID space in constant time, from a high-water mark and a list of
+    IDs freed below it. IDs widen past the given width once the space is full."""
+    def __init__(self, width=4, next=0, free=None):
+        self.width = width
+        self.next = next
+        self.free = free if free != None else []
+
+    @classmethod
+    def fromKeys(cls, keys, width=4):
+        "Returns an allocator for an ID space which already holds the given ID keys."
+        used = set(int(k) for k in keys)
+        next = max(used) + 1 if used else 0
+        free = [ n for n in range(next - 1, -1, -1) if n not in used ]    # lowest IDs are handed out first
+        return cls(width, next, free)
+
+    @classmethod
+    def afterKeys(cls, keys, width=2):
+        """Returns an allocator for an ID space kept in the order its entries were added, which only hands out
+        IDs past the given ones so that ID order stays that order. Its gaps are closed up when it is saved."""
+        return cls(width, max( int(k) for k in keys ) + 1 if keys else 0)
+
+    def allocate(self):
+        "Returns an unused ID string."
+        if self.free:
+            n = self.free.pop()
+        else:
+            n = self.next
+            self.next += 1
+        return parseIDNumber(n, self.width)
+
+    def allocateMany(self, count):
+        "Returns count unused ID strings at once, the same ones count calls to allocate() would."
+        reused = self.free[max(len(self.free) - count, 0):]
+        del self.free[len(self.free) - len(reused):]
+        fresh = range(self.next, self.next + count - len(reused))
+        self.next += len(fresh)
+        return [ parseIDNumber(n, self.width) for n in reversed(reused) ] + [ parseIDNumber(n, self.width) for n in fresh ]
+
+    def claim(self, id):
+        "Marks id as used, as if it had been handed out by allocate()."
+        n = int(id)
+        if n >= self.next:
+            self.free.extend(range(n - 1, self.next - 1, -1))
+            self.next = n + 1
+        elif n in self.free:
+            self.free.remove(n)
+
+    def release(self, id):
+        "Returns id to the pool of unused IDs."
+        self.free.append(int(id))
 
 def reduceSelectionToID(input, index, l=4):
     """Returns input either parsed and formatted to a valid ID key if numerical,
@@ -345,17 +605,460 @@ def reduceSelectionToID(input, index, l=4):
 
 def IDDictionaryToList(dictionary):
     "Converts a dictionary of IDs to a list ordered by ID value."
-    return [ v for k, v in sorted(dictionary.items(), key=lambda pair: pair[0]) ]
+    return [ v for k, v in sorted(dictionary.items(), key=lambda pair: int(pair[0])) ]
 
 def listToIDDictionary(listValues, l=4):
     "Converts a list of values to an ID dictionary whose IDs are set in ascending order by occurrence."
     return { parseIDNumber(k, l=l): v for k, v in enumerate(listValues) }
 
-def compressDictionaryIDSpace(dictionary):
-    "Given a dictionary of IDs, reassigns IDs such that there are no gaps between 0 and len(dictionary)."
-    l = len(dictionary.keys()[0]) if dictionary else 0
-    a = IDDictionaryToList(dictionary)
-    return listToIDDictionary(a, l)
+
+####################################################################################################
+#### Company Index                                                                              ####
+####################################################################################################
+
+def foldName(name):
+    "Returns the form of a company name used for case-insensitive lookups."
+    return name.casefold()
+
+def activityEntries(id, log):
+    "Returns the activity-index entries for the log dictionary of company id: (date ordinal, company ID, log ID) tuples."
+    return [ (dateFromString(v['date']).toordinal(), id, k) for k, v in log.items() ]
+
+class CompanyStub:
+    """The header entry for a company record: what the listing commands need, and where the rest is stored.
+    Every company has one held in memory, so its fields are slotted rather than kept in a dict; it is
+    still read like the {name, summary, shard} dict it is journaled as."""
+    __slots__ = ('name', 'last', 'logs', 'defunct', 'shard')
+
+    def __init__(self, name, last, logs, defunct, shard=None):
+        self.name = name
+        self.last = last
+        self.logs = logs
+        self.defunct = defunct
+        self.shard = shard
+
+    def __getitem__(self, key):
+        if key == 'summary':
+            return { 'last': self.last, 'logs': self.logs, 'defunct': self.defunct }
+        if key in ('name', 'shard'):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def toDict(self):
+        "Returns this stub as a JSON-serializable dictionary."
+        return { 'name': self.name, 'summary': self['summary'], 'shard': self.shard }
+
+    @classmethod
+    def fromDict(cls, d):
+        "Returns a stub from the output of toDict()."
+        summary = d['summary']
+        return cls(d['name'], summary['last'], summary['logs'], summary['defunct'], d.get('shard'))
+
+def searchTokens(text):
+    "Returns the words of a string as the search index keys them: case-folded, and at least two characters long."
+    import re
+    countWork('regexes evaluated')
+    return re.findall(r'\w{2,}', text.casefold())
+
+def searchableTexts(record):
+    "Returns the strings of a company record which are searched: its info messages and log messages."
+    return list(record['info'].values()) + [ v['message'] for v in record['log'].values() ]
+
+def termCounts(texts):
+    "Returns the number of times each search token occurs in a list of strings."
+    counts = {}
+    for text in texts:
+        for token in searchTokens(text):
+            counts[token] = counts.get(token, 0) + 1
+    return counts
+
+termsVersion = 2       # Raised whenever what recordTerms() indexes changes, so that older search indices are rebuilt.
+
+def nameTrigrams(name):
+    "Returns the set of three-character pieces of a name, case-folded, each word padded so its first and last letters count double."
+    import re
+    countWork('regexes evaluated')
+    return set( padded[i:i+3] for word in re.findall(r'\w+', foldName(name)) for padded in ['  ' + word + ' '] for i in range(len(padded) - 2) )
+
+def nameSimilarity(grams, name):
+    "Returns how alike a name is to the one the set of trigrams grams came from, from 0 to 1."
+    other = nameTrigrams(name)
+    return 2 * len(grams & other) / (len(grams) + len(other)) if grams or other else 0
+
+def recordTerms(record):
+    """Returns the search-index terms of a company record, and how often each occurs: the words of its
+    info and log messages, and the trigrams of its own and its contacts' names, marked by a leading '#'."""
+    counts = termCounts(searchableTexts(record))
+    for name in [record['name']] + [ contact['name'] for contact in record['contacts'].values() ]:
+        for gram in nameTrigrams(name or ''):
+            counts['#' + gram] = counts.get('#' + gram, 0) + 1
+    return counts
+
+def applyTermChanges(terms, changes):
+    "Applies a list of (token, company ID, change in occurrences) triples to a search index."
+    for token, id, n in changes:
+        postings = terms.setdefault(token, {})
+        count = postings.get(id, 0) + n
+        if count > 0:
+            postings[id] = count
+        else:
+            postings.pop(id, None)
+            if not postings:
+                del terms[token]
+
+def rankCompanies(index, tokens):
+    """Returns (company ID, score) pairs for the companies whose searchable strings hold every one of the
+    given tokens, best match first. Each token's occurrences count for more the fewer companies it's in."""
+    import math
+    postings = sorted(index.postings(tokens).values(), key=len)
+    if not postings[0]:
+        return []
+    total = len(index)
+    weights = [ math.log(1 + total / len(p)) for p in postings ]
+
+    # Matches are found from the rarest token's postings, which the others are checked against.
+    matches = [ id for id in postings[0] if all(id in p for p in postings[1:]) ]
+    scores = { id: sum( (1 + math.log(p[id])) * w for p, w in zip(postings, weights) ) for id in matches }
+    return sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+
+fuzzyMatchMinimum = 0.3   # Names less alike than this to what was typed are never suggested.
+fuzzyAutoSelect = 0.6     # A suggestion this alike, and clearly ahead of the next, is selected outright.
+fuzzyCommonFraction = 0.02    # Trigrams in more than this share of companies' names (and in over 100) don't bring in candidates.
+
+def fuzzyMatches(index, name, limit=3):
+    """Returns up to limit (similarity, company ID, matched name) triples for the companies whose own or
+    contacts' names are most like name, best first. Candidates are found through the name trigrams in
+    the search index, so only companies sharing some part of name are looked at, and only the few
+    sharing the most are compared in full.
+
+    A name at least fuzzyMatchMinimum alike must share some number of name's trigrams, and so must hold
+    one of them outside the commonest few. Of those, only the ones which few companies' names hold bring
+    in candidates, so pieces like 'com' cost nothing. If none are that rare, as many companies as would
+    be allowed one are taken from the rarest."""
+    import heapq
+    import itertools
+    import math
+    grams = nameTrigrams(name)
+    if not grams:
+        return []
+
+    postings = sorted(index.postings([ '#' + gram for gram in grams ]).values(), key=len)
+    needed = max(1, math.ceil(fuzzyMatchMinimum * len(grams) / (2 - fuzzyMatchMinimum)))
+    probes = postings[:len(postings) - needed + 1]
+    common = max(100, len(index) * fuzzyCommonFraction)
+    candidates = set().union(*( p for p in probes if len(p) <= common ))
+    if not candidates:
+        candidates = set(itertools.islice(next(( p for p in probes if p ), {}), int(common)))
+
+    shared = { id: sum( id in p for p in postings ) for id in candidates }
+    shared = { id: n for id, n in shared.items() if n >= needed }
+
+    matches = []
+    for id in heapq.nlargest(limit * 4, shared, key=lambda id: (shared[id], id)):
+        companyName = index.stub(id)['name']
+        names = [companyName]
+        if len(grams & nameTrigrams(companyName)) < shared[id]:     # some of the shared trigrams are from contacts
+            names += [ contact['name'] for contact in index[id]['contacts'].values() if contact['name'] ]
+        similarity, matched = max( (nameSimilarity(grams, n), n) for n in names )
+        if similarity >= fuzzyMatchMinimum:
+            matches.append((similarity, id, matched))
+    return sorted(matches, key=lambda match: (-match[0], match[1]))[:limit]
+
+def buildTerms(index):
+    "Returns the search index of every record in a company index: token → {company ID: occurrences}."
+    terms = {}
+    for id in index:
+        for token, n in recordTerms(index[id]).items():
+            terms.setdefault(token, {})[id] = n
+    return terms
+
+def companyStub(record, shard=None):
+    "Returns the header entry for a company record."
+    summary = record['summary']
+    return CompanyStub(record['name'], summary['last'], summary['logs'], summary['defunct'], shard)
+
+class CompanyIndex(MutableMapping):
+    """The collection of company records by ID. Only a small stub of each record is held up front; the
+    full record is read from its shard the first time it is asked for. Alongside the stubs are a
+    case-folded name → ID lookup and a date-ordered index of every company's logged activity, both
+    of which are kept in sync as records are added, edited and removed. An index given its stubs but
+    not its activity reads the activity index from the store the first time it is asked for."""
+    def __init__(self, stubs=None, names=None, ids=None, activity=None, records=None):
+        self.records = records if records != None else {}      # full records read or created so far
+        self.stubs = stubs if stubs != None else { k: companyStub(v) for k, v in self.records.items() }
+        self.names = names if names != None else { foldName(v['name']): k for k, v in self.stubs.items() }
+        self.ids = ids if ids != None else IDAllocator.fromKeys(self.stubs, 4)
+        self.recordIDs = {}     # (record ID, field) → IDAllocator for that record's contacts, info or log
+        self.activity = activity if activity != None or stubs != None else sorted(
+            entry for k, v in self.records.items() for entry in activityEntries(k, v['log']) )
+        self.activityChanges = (set(), set())      # entries added to and removed from the activity index since the last save
+        self.journalActivity = []   # the activity-index changes of each save journaled since the snapshot, while the activity index is unread
+        self.terms = {}         # the postings of the search-index tokens read so far, token → {company ID: occurrences}
+        self.termsComplete = False  # whether terms holds the whole search index, as after it was built from the records
+        self.termChanges = {}   # (token, company ID) → change in occurrences since the last save; None if the search index must be rebuilt
+        self.journalTerms = []  # the search-index changes of each save journaled since the snapshot; None if any is of an older kind
+        self.removedShards = {} # company ID → the shard it was saved in, for companies deleted since the last save
+        self.edited = False     # whether any record has been edited since the last save
+        self.unsharded = False  # whether this index was read from data saved before records were sharded
+        self.compact = False    # whether this index is stored in the compact format
+        self.base = None        # the storeVersion() this index was read from or last saved as
+
+    def __getitem__(self, id):
+        if id not in self.records:
+            self.records[id] = readShard(self.stubs[id]['shard'])
+        return self.records[id]
+
+    def __setitem__(self, id, record):
+        if id in self.stubs:
+            self.unindexName(id)
+            self.updateActivity(id, self[id]['log'], record['log'])
+            self.updateTerms(id, recordTerms(self[id]), recordTerms(record))
+            shard = self.stubs[id]['shard']
+        else:
+            self.ids.claim(id)
+            self.updateActivity(id, {}, record['log'])
+            self.updateTerms(id, {}, recordTerms(record))
+            shard = None
+        self.records[id] = record
+        self.stubs[id] = companyStub(record, shard)
+        self.names[foldName(record['name'])] = id
+
+    def __delitem__(self, id):
+        self.updateActivity(id, self[id]['log'], {})
+        self.updateTerms(id, recordTerms(self[id]), {})
+        self.removedShards.setdefault(id, self.stubs[id].shard)
+        self.dropStub(id)
+
+    def __contains__(self, id):
+        return id in self.stubs
+
+    def __iter__(self):
+        return iter(self.stubs)
+
+    def __len__(self):
+        return len(self.stubs)
+
+    def stub(self, id):
+        "Returns the record id if it has been read, or its stub otherwise; either has an up-to-date name and summary."
+        return self.records.get(id) or self.stubs[id]
+
+    def readRecord(self, id):
+        "Returns record id without keeping it once read, for walking every record in constant memory."
+        return self.records[id] if id in self.records else readShard(self.stubs[id]['shard'])
+
+    def listing(self, activeOnly=False):
+        "Returns (ID, stub) pairs for every company, or only those whose applications aren't defunct, in index order."
+        pairs = ( (k, self.stub(k)) for k in self.stubs )
+        return [ (k, v) for k, v in pairs if not (activeOnly and v['summary']['defunct']) ]
+
+    def putStub(self, id, stub):
+        "Sets the stub of record id, as when replaying the journal. Its full record will be read from the stub's shard."
+        if id in self.stubs:
+            self.unindexName(id)
+        else:
+            self.ids.claim(id)
+        self.records.pop(id, None)
+        self.stubs[id] = stub
+        self.names[foldName(stub['name'])] = id
+
+    def dropStub(self, id):
+        "Removes record id from the index without touching the activity index."
+        self.unindexName(id)
+        self.records.pop(id, None)
+        del self.stubs[id]
+        self.ids.release(id)
+        self.forgetRecordIDs(id)
+
+    def commitRecord(self, id, shard):
+        "Records that record id has been written to the given shard."
+        self.stubs[id] = companyStub(self[id], shard)
+
+    def unindexName(self, id):
+        key = foldName(self.stub(id)['name'])
+        if self.names.get(key) == id:
+            del self.names[key]
+
+    def lookupName(self, name):
+        "Returns the ID of the record with the given name, ignoring case, or None if there is none."
+        return self.names.get(foldName(name))
+
+    def rename(self, id, name):
+        "Changes the name of record id, keeping the name lookup and search index in step."
+        before = recordTerms(self[id])
+        self.unindexName(id)
+        self[id]['name'] = name
+        self.names[foldName(name)] = id
+        self.updateTerms(id, before, recordTerms(self[id]))
+
+    def updateActivity(self, id, before, after):
+        """Brings the activity index up to date with company id's log having changed from dictionary before to after.
+        While the activity index is unread, the change is only noted, to be replayed over it once it is read."""
+        old = set( (k, v['date']) for k, v in before.items() )
+        new = set( (k, v['date']) for k, v in after.items() )
+        added, removed = self.activityChanges
+        for k, when in old - new:
+            entry = (dateFromString(when).toordinal(), id, k)
+            if self.activity != None:
+                self.removeActivity(entry)
+            added.discard(entry) if entry in added else removed.add(entry)
+        for k, when in new - old:
+            entry = (dateFromString(when).toordinal(), id, k)
+            if self.activity != None:
+                bisect.insort(self.activity, entry)
+            removed.discard(entry) if entry in removed else added.add(entry)
+
+    def loadedActivity(self):
+        "Returns the activity index, reading it from the store the first time it is asked for."
+        if self.activity == None:
+            with storeLock:
+                saved, journaled = readActivity(self)
+            if saved == None:
+                self.activity = sorted( entry for id in self for entry in activityEntries(id, self.readRecord(id)['log']) )
+            else:
+                added, removed = self.activityChanges
+                self.activity = saved
+                for changes in journaled + [{ 'add': added, 'del': removed }]:
+                    self.applyActivityChanges(changes)
+            self.journalActivity = []
+        return self.activity
+
+    def removeActivity(self, entry):
+        i = bisect.bisect_left(self.activity, entry)
+        if i < len(self.activity) and self.activity[i] == entry:
+            del self.activity[i]
+
+    def pendingChanges(self):
+        "Returns the changes made to the activity and search indices since the last save, in the form they are journaled."
+        added, removed = self.activityChanges
+        return {
+            'activity': { 'add': sorted(added), 'del': sorted(removed) },
+            'terms': { 'version': termsVersion, 'changes': sorted(
+                [token, id, n] for (token, id), n in (self.termChanges or {}).items() if n ) }
+        }
+
+    def clearPendingChanges(self):
+        "Forgets the changes made since the last save, to the activity and search indices among others, once they have been saved."
+        self.activityChanges = (set(), set())
+        self.termChanges = {}
+        self.removedShards = {}
+        self.edited = False
+
+    def savedShard(self, id):
+        "Returns the shard record id was in as of the last save, or None if it wasn't saved then."
+        if id in self.removedShards:
+            return self.removedShards[id]
+        return self.stubs[id].shard if id in self.stubs else None
+
+    def applyActivityChanges(self, changes):
+        """Applies the 'activity' part of pendingChanges() to the activity index, as when replaying the journal.
+        While the activity index is unread, the changes are kept to be replayed over it once it is read."""
+        if self.activity == None:
+            self.journalActivity.append(changes)
+            return
+        for entry in changes['del']:
+            self.removeActivity(tuple(entry))
+        for entry in changes['add']:
+            bisect.insort(self.activity, tuple(entry))
+
+    def activitySince(self, start):
+        "Returns the activity-index entries dated on or after the given date ordinal, oldest first."
+        activity = self.loadedActivity()
+        return activity[bisect.bisect_left(activity, (start,)):]
+
+    def updateTerms(self, id, before, after):
+        "Brings the search index up to date with company id's terms having changed from before to after, both as from recordTerms()."
+        delta = dict(after)
+        for token, n in before.items():
+            delta[token] = delta.get(token, 0) - n
+        changes = [ (token, id, n) for token, n in delta.items() if n ]
+        self.edited = True
+        if self.termChanges != None:
+            for token, id, n in changes:
+                self.termChanges[(token, id)] = self.termChanges.get((token, id), 0) + n
+        applyTermChanges(self.terms, changes if self.termsComplete else [ change for change in changes if change[0] in self.terms ])
+
+    def postings(self, tokens):
+        """Returns the search-index postings of each of the given tokens: token → {company ID: occurrences}.
+        Only the tokens not read before are looked up. If the saved search index can't be used, it is
+        built from the records, but only the next save writes it out."""
+        missing = [ token for token in tokens if token not in self.terms ] if not self.termsComplete else []
+        if missing:
+            with storeLock:
+                read = readTerms(self, missing)
+            if read == None:
+                self.terms, self.termsComplete = buildTerms(self), True
+            else:
+                self.terms.update( (token, read.get(token, {})) for token in missing )
+        return { token: self.terms.get(token, {}) for token in tokens }
+
+    def forgetTerms(self):
+        "Drops the search index, to be built from the records when next it's needed, as after they were renumbered."
+        self.terms, self.termsComplete, self.termChanges = {}, False, None
+
+    def newRecordID(self, id, field):
+        "Returns an unused ID for the contacts, info or log dictionary of record id."
+        if (id, field) not in self.recordIDs:
+            self.recordIDs[(id, field)] = IDAllocator.afterKeys(self[id][field], 2)
+        return self.recordIDs[(id, field)].allocate()
+
+    def forgetRecordIDs(self, id, *fields):
+        "Discards the ID allocators for the given fields of record id (all of them if none are given), as after its IDs were reassigned."
+        for field in fields or ('contacts', 'info', 'log'):
+            self.recordIDs.pop((id, field), None)
+
+    def compactRecordIDs(self, id):
+        "Reassigns the contacts, info and log IDs of record id such that there are no gaps, keeping their display order."
+        record = self[id]
+        log = record['log']
+        for field in ('contacts', 'info', 'log'):
+            record[field] = listToIDDictionary(record[field].values(), l=2)
+        self.updateActivity(id, log, record['log'])
+        self.forgetRecordIDs(id)
+
+    def compactIDs(self):
+        "Reassigns every company ID such that there are no gaps, keeping the records in ID order."
+        newIDs = { k: parseIDNumber(i, 4) for i, k in enumerate(sorted(self.stubs, key=int)) }
+        self.stubs = { newIDs[k]: v for k, v in sorted(self.stubs.items(), key=lambda pair: int(pair[0])) }
+        self.records = { newIDs[k]: v for k, v in self.records.items() }
+        self.names = { k: newIDs[v] for k, v in self.names.items() }
+        self.activity = sorted( (when, newIDs[k], logID) for when, k, logID in self.loadedActivity() )
+        self.ids = IDAllocator(4, len(newIDs))
+        self.recordIDs = {}
+        self.forgetTerms()
+
+    def selectID(self, input, l=4):
+        "Returns input parsed to an ID key if numerical, or the ID of the record named input otherwise."
+        return parseIDNumber(input, l) if input.isnumeric() else self.lookupName(input)
+
+    def snapshot(self):
+        "Returns the index header as a JSON-serializable dictionary; every record must have been written to a shard."
+        return {
+            'version': 6,
+            'companies': { k: v.toDict() for k, v in self.stubs.items() },
+            'names': self.names,
+            'ids': { 'next': self.ids.next, 'free': self.ids.free }
+        }
+
+    @classmethod
+    def fromSnapshot(cls, data):
+        """Returns a company index from the output of snapshot(). Snapshots from before records were
+        sharded hold the full records, and give an index with every record already read; its
+        'unsharded' flag is set. Those from before the activity index had a file of its own hold it too."""
+        if 'version' not in data:
+            data = { 'version': 1, 'companies': data }
+        if data['version'] >= 5:
+            ids = IDAllocator(4, data['ids']['next'], data['ids']['free'])
+            activity = [ tuple(entry) for entry in data['activity'] ] if data['version'] < 6 else None
+            stubs = { k: CompanyStub.fromDict(v) for k, v in data['companies'].items() }
+            return cls(stubs, data['names'], ids, activity)
+
+        records = data['companies']
+        if data['version'] < 3:
+            for record in records.values():
+                record['summary'] = summarizeCompany(record)
+        index = cls(records=records)
+        index.unsharded = True
+        return index
 
 
 ####################################################################################################
@@ -365,17 +1068,28 @@ def compressDictionaryIDSpace(dictionary):
 
 # TODO Make this immutable? The last change toward functional design, I think. Not sure it's really worth it, though.
 class InputProcessorState:
-    "Represents the input-looper's state at any one instant."
+    """Represents the input-looper's state at any one instant. The company index may be given as a function
+    which returns it, in which case it is only read once a command asks for it."""
     def __init__(self, index, args, command_set):
-        self.index = index
+        self.loadedIndex = index if not callable(index) else None
+        self.indexLoader = index if callable(index) else None
         self.record = None
         self.recordKey = None
         self.args = args
         self.last = None
         self.command_set = command_set
         self.pollingEnabled = True
+        self.interactive = True     # whether records are displayed as they are opened and deletions confirmed
         self.showOnExit = False
         self.exitSignal = False
+        self.changed = set()
+        self.status = 0             # the exit status of the call, set by commands which fail outright
+
+    @property
+    def index(self):
+        if self.loadedIndex == None:
+            self.loadedIndex = self.indexLoader()
+        return self.loadedIndex
 
     def shift(self):
         self.last, self.args = shift(self.args)
@@ -394,6 +1108,10 @@ class InputProcessorState:
             self.record = None
             self.recordKey = None
 
+    def markChanged(self, id=None):
+        "Records that the given record, or the open one if none is given, has been edited and must be saved."
+        self.changed.add(id if id != None else self.recordKey)
+
     def showRecord(self):
         if self.record:
             print( '\n'.join(['', formatCompany(self.recordKey, self.record), '']) )
@@ -413,6 +1131,7 @@ def inputProcessor(state):
     # A do-until construction
     while True:
         if state.pollingRequested():
+            import shlex
             try:
                 state.args = shlex.split( input('> ') )
             except ValueError:
@@ -452,26 +1171,28 @@ def displayHelpText(state):
 
 def displayRecents(state):
     "Display an at-a-glance look at any pending job applications."
-    beingAppliedFor = lambda c: applicationStatus(c)[0].isdigit()
-    beingResearched = lambda c: applicationStatus(c) == statusResearching
+    today = date.today().toordinal()
+    beingAppliedFor = lambda c: c['summary']['logs'] and c['summary']['last'] <= today     # not ones only logged ahead
+    beingResearched = lambda c: not c['summary']['logs']
 
     # Reduce index to active applications
-    applying    = { k:c for k, c in state.index.items() if beingAppliedFor(c) }
-    researching = { k:c for k, c in state.index.items() if beingResearched(c) }
+    stubs       = state.index.listing(activeOnly=True)
+    applying    = { k:c for k, c in stubs if beingAppliedFor(c) }
+    researching = { k:c for k, c in stubs if beingResearched(c) }
 
     printBuffer("Use 'workboy help' for more information.")
     printBuffer()
 
     # First, print in-progress applications
     for companyID in applying:                                            
-        printBuffer( formatCompanyShort(companyID, applying[companyID]) )
+        printBuffer( formatCompanyShort(companyID, applying[companyID]), companyData(companyID, applying[companyID]) )
 
     # Line break
     printBuffer() if applying and researching else None
 
     # Second, print unsent applications
     for companyID in researching:
-        printBuffer( formatCompanyShort(companyID, researching[companyID]) )
+        printBuffer( formatCompanyShort(companyID, researching[companyID]), companyData(companyID, researching[companyID]) )
 
     # If nothing was printed, tell the user why.
     if not applying and not researching:
@@ -484,80 +1205,190 @@ def displayRecents(state):
 def displayAll(state):
     "Display an at-a-glance look at all job applications, past and present."
 
-    for companyID in state.index:
-        printBuffer( formatCompanyShort(companyID, state.index[companyID]) )
-    if not state.index:
+    stubs = state.index.listing()
+    for companyID, stub in stubs:
+        printBuffer( formatCompanyShort(companyID, stub), companyData(companyID, stub) )
+    if not stubs:
         printBuffer('Company index is empty. Nothing to show.')
     displayBuffer()
 
     return cancelChanges(state)
 
 def displayRecentActivity(state):
-    "Display logged activities from the last 30 days."
-
-    today = date.today()
-    activities = []
+    "Display logged activities from the last 30 days, the last given number of days, or since a given date."
+
+    window = state.shift()
+    today = date.today().toordinal()
+
+    # Find the earliest date of the window asked for
+    if window == None:
+        start = today - 30
+    elif window.isdigit():
+        start = today - int(window)
+    elif window == 'since' and (since := parseDate(state.shift() or '')):
+        start = since.toordinal()
+    else:
+        printBuffer("'recent' accepts a number of days or 'since [date]'. Request voided.")
+        displayBuffer()
+        return cancelChanges(state)
 
-    # Collect all relevant logs from all company records
-    for record in state.index.values():
-        for log in record['log'].values():
-            log = log.copy()
-            log['company'] = record['name']
-            log['dateEval'] = dateFromString(log['date'])
-            if (today - log['dateEval']).days <= 30:
-                activities.append(log)
-
-    # Sort and print
-    calendar = sorted(activities, key=lambda log: log['dateEval'])
-    for log in calendar:
+    # The activity index is ordered by date, so the window is its tail
+    for when, companyID, logID in state.index.activitySince(start):
+        record = state.index[companyID]
+        log = record['log'][logID]
         ellipses = '...' if len(log['message']) > 70 else ''
-        printBuffer('{:<20} > {} : {:<70}{}'.format(log['company'], log['date'], log['message'], ellipses))
+        data = { 'id': companyID, 'company': record['name'], 'log': logID, 'date': date.fromordinal(when).isoformat(), 'message': log['message'] }
+        printBuffer('{:<20} > {} : {:<70}{}'.format(record['name'], log['date'], log['message'], ellipses), data)
+    displayBuffer()
+
+    return cancelChanges(state)
+
+def searchRecords(state):
+    "Displays the info and log entries which mention the given words, from the companies which mention them all, best match first."
+    query = ' '.join(state.args)
+    tokens = list(dict.fromkeys(searchTokens(query)))
+    state.clear()
+
+    if not tokens:
+        printBuffer("'search' needs one or more words to look for. Request voided.")
+        displayBuffer()
+        return cancelChanges(state)
+
+    results = rankCompanies(state.index, tokens)
+    for i, (companyID, score) in enumerate(results):
+        record = state.index[companyID]
+        printBuffer() if i else None
+        printBuffer(formatCompanyShort(companyID, record))
+        entries = [ ('info', k, v, formatInfo(v, k)) for k, v in record['info'].items() ]
+        entries += [ ('log', k, v['message'], formatLog(v, k)) for k, v in record['log'].items() ]
+        for field, k, message, line in entries:
+            if set(searchTokens(message)).intersection(tokens):
+                data = { 'id': companyID, 'company': record['name'], 'field': field, 'entry': k, 'message': message, 'score': round(score, 3) }
+                printBuffer(line, data)
+
+    if not results:
+        printBuffer("No records mention '{}'.".format(query))
     displayBuffer()
 
     return cancelChanges(state)
 
+def exportRecords(state):
+    """Writes every company to stdout, or to a file if one is given, in the format named by '--format':
+    CSV, JSON Lines or iCalendar, one company or log entry at a time as they are read."""
+    format, path = 'csv', None
+    while (arg := state.shift()) != None:
+        if arg == '--format':
+            format = state.shift()
+        elif arg.startswith('--format='):
+            format = arg[len('--format='):]
+        else:
+            path = arg
+    state.clear()
+
+    if format not in exportFormats:
+        printRejection("'export' writes csv, jsonl or ics, not '{}'. Request voided.".format(format))
+        state.status = 1
+        return cancelChanges(state)
+
+    # The file is opened without newline translation, the formats writing the line endings they require.
+    try:
+        exportfile = open(path, 'w', newline='', encoding='utf-8') if path != None else sys.stdout
+    except OSError as e:
+        printRejection('Could not write to {}: {}.'.format(path, e.strerror))
+        state.status = 1
+        return cancelChanges(state)
+    try:
+        for n, chunk in enumerate(exportFormats[format](state.index)):
+            exportfile.write(chunk)
+            if n % exportFlushInterval == 0:
+                exportfile.flush()
+        exportfile.flush()
+    except BrokenPipeError:
+        pass        # the reader has gone away, as with 'export | head'; the rest is dropped quietly
+    except OSError as e:
+        printRejection('Could not write to {}: {}.'.format(path, e.strerror))
+        state.status = 1
+        return cancelChanges(state)
+    finally:
+        if path != None:
+            exportfile.close()
+    if path != None:
+        print('Exported {} companies to {}.'.format(len(state.index), path))
+
+    return cancelChanges(state)
+
 def addCompany(state):
     "Adds a new record to the company index. Assumes all input thereafter are company details."
 
-    recordID = newID(state.index)
     name = state.shift()
 
     # Confirm that name is compliant.
     validName = name != '' and regexCheck(regexName, name)
 
     # Confirm that name is unique.
-    names = [ v['name'].lower() for k, v in state.index.items() ]
-    preexisting = name.lower() in names
+    preexisting = state.index.lookupName(name) != None
 
     if not validName:
-        print('\'{}\' does not fit the company-name field schema. Request was voided.'.format(name))
+        printRejection('\'{}\' does not fit the company-name field schema. Request was voided.'.format(name))
         state = endProcessing(state)
 
-    if preexisting:
-        print("'{}' already exists in the record. Request was voided.".format(name))
+    elif preexisting:
+        printRejection("'{}' already exists in the record. Request was voided.".format(name))
         state = endProcessing(state)
 
     else: # create new record and add to index
         record = newCompany()
         record['name'] = name
 
+        recordID = state.index.ids.allocate()
         state.index[recordID] = record
         state.setRecord(recordID)
-        if not state.showOnExit:
+        state.markChanged()
+        if state.interactive and not state.showOnExit:
             state.showRecord()
         state.command_set = companyRecordSet
 
     return state
 
+def resolveCompany(state, key):
+    """Returns the ID of the company key names by ID or name, or failing that, the one whose own or
+    contacts' names are clearly most like it, if the user is there to see the guess. Otherwise prints
+    that there's no such company, along with the likeliest few, and returns None."""
+    id = state.index.selectID(key)
+    if id and id in state.index:
+        return id
+
+    matches = fuzzyMatches(state.index, key) if not key.isnumeric() else []
+    if matches:
+        best, second = matches[0][0], (matches[1][0] if len(matches) > 1 else 0)
+        if state.interactive and best >= fuzzyAutoSelect and best - second >= 0.1:
+            similarity, id, name = matches[0]
+            print("'{}' taken to mean {} {}.".format(key, id, state.index.stub(id)['name']))
+            return id
+
+    printRejection("Selection '{}' could not be found.".format(key), buffered=True)
+    if matches:
+        printBuffer('Did you mean:')
+    for similarity, id, name in matches:
+        stub = state.index.stub(id)
+        via = ' (contact {})'.format(name) if name != stub['name'] else ''
+        printBuffer('    ' + formatCompanyShort(id, stub) + via)
+    return None
+
 def delCompany(state):
     "Deletes a record from the index, with user confirmation."
 
     key = state.shift()
-    id = reduceSelectionToID(key, state.index)
+    id = resolveCompany(state, key or '')
+
+    if not id:
+        displayBuffer()
 
-    if not id or id not in state.index:
-        printBuffer("Selection '{}' could not be found.".format(key))
+    elif not state.interactive:
+        printBuffer('Deleted {} {}.'.format(id, state.index.stub(id)['name']))
         displayBuffer()
+        del state.index[id]
+        state.markChanged(id)
 
     else:
         # Inform the user of which record they are considering
@@ -569,6 +1400,7 @@ def delCompany(state):
         affirmativeResponses = ['y', 'yes']
         if response in affirmativeResponses:
             del state.index[id]
+            state.markChanged(id)
             print('Deleted.')
 
     return endProcessing(state)
@@ -584,15 +1416,14 @@ def selectCompany(state):
 
     # key is either a numeric ID or a name string; retrieve a company ID in any case.
     key = state.last
-    id = reduceSelectionToID(key, state.index)
+    id = resolveCompany(state, key)
 
-    if not id or id not in state.index:
-        printBuffer('Selection \'{}\' could not be found.'.format(key))
+    if not id:
         state = endProcessing(state)
 
     else:
         state.setRecord(id)
-        if not state.showOnExit:
+        if state.interactive and not state.showOnExit:
             state.showRecord()
         state.command_set = companyRecordSet
 
@@ -616,6 +1447,8 @@ globalRecordSet = Switcher({
     None: displayRecents,
     'all': displayAll,
     'recent': displayRecentActivity,
+    'search': searchRecords,
+    'export': exportRecords,
     'add': addCompany,
     'del': delCompany,
     'once': editModeOnce,
@@ -659,7 +1492,7 @@ def omitKeyValuePairFromCollection(collection, selection, printFunction, l=4):
             success = True
 
     if not success:
-        print("'{}' could not be found or is not a valid selection.".format(selection))
+        printRejection("'{}' could not be found or is not a valid selection.".format(selection))
     else:
         print( printFunction(record, key) )
         print('Deleted.')
@@ -670,18 +1503,20 @@ def editInfo(state):
     "Adds a new message to the info-log, or deletes one if given 'del' and an indice to locate with."
     index = state.record['info']
     message = state.shift()
+    before = recordTerms(state.record)
 
     if message == 'del':
         state.record['info'] = omitKeyValuePairFromCollection(index, state.shift(), formatInfo, l=2)
+        state.index.forgetRecordIDs(state.recordKey, 'info')
     elif message == 'move':
         a1, a2 = state.shift(), state.shift()
 
         if not (a1.isdigit() and a2.isdigit()):
-            print("'info move [idx] [idx]' accepts two numbers: recieved {}, {}. Request voided.".format(a1, a2))
+            printRejection("'info move [idx] [idx]' accepts two numbers: recieved {}, {}. Request voided.".format(a1, a2))
         else:
             id = parseIDNumber(a1, l=2)
             if id not in index:
-                print("Message ID {} could not be found in the list.".format(id))
+                printRejection("Message ID {} could not be found in the list.".format(id))
             else:
                 msgList = IDDictionaryToList(index)
                 msg = index[id]
@@ -692,13 +1527,13 @@ def editInfo(state):
                 msgList.insert(newi, msg)
 
                 state.record['info'] = listToIDDictionary(msgList, l=2)
+                state.index.forgetRecordIDs(state.recordKey, 'info')
     else:
-        id = newID(index, l=2)
-        if id:
-            state.record['info'][id] = message
-        else:
-            print('Could not add new message: info detail ID space is full.')
+        id = state.index.newRecordID(state.recordKey, 'info')
+        state.record['info'][id] = message
 
+    state.index.updateTerms(state.recordKey, before, recordTerms(state.record))
+    state.markChanged()
     state.clear()
     return state
 
@@ -707,9 +1542,11 @@ def editContact(state):
     'del' and an indice to locate with."""
     key = state.shift()
     index = state.record['contacts']
+    before = recordTerms(state.record)
 
     if key == 'del':
         state.record['contacts'] = omitKeyValuePairFromCollection(index, state.shift(), formatContact, l=2)
+        state.index.forgetRecordIDs(state.recordKey, 'contacts')
     else:
         id = reduceSelectionToID(key, index, l=2)
         contact = None
@@ -717,7 +1554,7 @@ def editContact(state):
         if not id:
             contact = newContact()
             state.unshift() # Last token might be the name field
-            id = newID(index, 2)
+            id = state.index.newRecordID(state.recordKey, 'contacts')
         else:
             contact = index[id]
         
@@ -725,6 +1562,8 @@ def editContact(state):
         
         state.record['contacts'][id] = contact
         
+    state.index.updateTerms(state.recordKey, before, recordTerms(state.record))
+    state.markChanged()
     state.clear()
     return state
 
@@ -732,23 +1571,23 @@ def editLog(state):
     "Adds a new message to the event log or deletes one if given 'del' and an indice to locate with."
     command = state.shift()
     index = state.record['log']
+    before = index.copy()
+    beforeTerms = recordTerms(state.record)
 
     if command == 'del':
         state.record['log'] = omitKeyValuePairFromCollection(index, state.shift(), formatLog, l=2)
     
     else:
         state.unshift()
-        id = newID(index, l=2)
-        if id:
-            log = editRecord(newLog(), state.args, iptrConfig_log)
-            state.record['log'][id] = log
-        else:
-            print('Could not add new log: message ID space is full.')
+        log = editRecord(newLog(), state.args, iptrConfig_log)
+        state.record['log'] = insertLog(index, log)
 
-        # sort by date, ascending; reassign indices, too.
-        sortedList = sorted(index.items(), key=lambda i: dateFromString(i[1]['date']))
-        state.record['log'] = { parseIDNumber(str(i), l=2): v[1] for i,v in enumerate(sortedList) }
+    state.index.forgetRecordIDs(state.recordKey, 'log')
+    state.index.updateActivity(state.recordKey, before, state.record['log'])
+    state.index.updateTerms(state.recordKey, beforeTerms, recordTerms(state.record))
+    state.record['summary'] = summarizeCompany(state.record)
 
+    state.markChanged()
     state.clear()
     return state
 
@@ -757,7 +1596,10 @@ def editCompany(state):
     state.unshift()
 
     state.record = editRecord(state.record, state.args, iptrConfig_company)
+    state.record['summary'] = summarizeCompany(state.record)
     state.index[state.recordKey] = state.record
+    state.index.forgetRecordIDs(state.recordKey)
+    state.markChanged()
 
     state.clear()
     return state
@@ -767,11 +1609,14 @@ def renameCompany(state):
     newName = state.shift()
     oldName = state.record['name']
 
-    if regexCheck(regexName, newName):
-        printBuffer('{} → {}'.format(oldName, newName))
-        state.record['name'] = newName
+    if not regexCheck(regexName, newName):
+        printRejection("'{}' does not fit the company name schema. Name was not changed.".format(newName), buffered=True)
+    elif state.index.lookupName(newName) not in (None, state.recordKey):
+        printRejection("'{}' already exists in the record. Name was not changed.".format(newName), buffered=True)
     else:
-        printBuffer("'{}' does not fit the company name schema. Name was not changed.".format(newName))
+        printBuffer('{} → {}'.format(oldName, newName))
+        state.index.rename(state.recordKey, newName)
+        state.markChanged()
     displayBuffer()
 
     state.clear()
@@ -829,6 +1674,21 @@ iptrConfig_log = InterpreterConfig()
 iptrConfig_log.date = True
 iptrConfig_log.message = True
 
+def classifyArgument(s):
+    """Returns the kind of information string s contains ('date', 'email', 'phone', 'address', 'url',
+    'name', or None if it is none of these) and its normalized value, in a single regex pass. The
+    value of a date which could not be extracted is None."""
+    countWork('regexes evaluated')
+    match = fieldClassifier().match(s)
+    field = match.lastgroup if match else None
+
+    if field in ('date', 'dateShort'):
+        date = parseDate(s)
+        return ('date', dateToString(date) if date else None)
+    if field == 'phone':
+        return ('phone', parsePhoneNumber(s))
+    return (field, s)
+
 def interpretArgument(s, d, config):
     """Given a string argument s, interpret the kind of information it contains and set it to dictionary
     d, so long as the given config allows it."""
@@ -836,60 +1696,61 @@ def interpretArgument(s, d, config):
 
     # Error message shorthand
     def invalidFieldMessage(s):
-        print('Argument of type \'{}\' not valid for this record type.'.format(s))
+        printRejection('Argument of type \'{}\' not valid for this record type.'.format(s))
         nonlocal success
         success = False
 
+    field, value = classifyArgument(s)
+
     # s is a date string
-    if regexCheck(regexDate, s) or regexCheck(regexDateShort, s):
+    if field == 'date':
         if config.date:
-            date = parseDate(s)
-            if date:
-                d['date'] = date.strftime('%b %d, %Y')
+            if value:
+                d['date'] = value
             else:
-                print('Recognized date string, but could not extract date object.')
+                printRejection('Recognized date string, but could not extract date object.')
         else:
             invalidFieldMessage('date')
 
     # s is an email string
-    elif regexCheck(regexEmail, s):
+    elif field == 'email':
         if config.email:
-            d['email'] = s
+            d['email'] = value
         else:
             invalidFieldMessage('email')
 
     # s is a phone-number string
-    elif regexCheck(regexPhoneNumber, s):
+    elif field == 'phone':
         if config.phone:
-            d['phone'] = parsePhoneNumber(s)
+            d['phone'] = value
         else:
             invalidFieldMessage('phone number')
     
     # s is a street address
-    elif regexCheck(regexStreetAddress, s):
+    elif field == 'address':
         if config.address:
-            d['address'] = s
+            d['address'] = value
         else:
             invalidFieldMessage('address')
 
     # s is a url
-    elif regexCheck(regexURL, s):
+    elif field == 'url':
         if config.url:
-            d['url'] = s
+            d['url'] = value
         else:
             invalidFieldMessage('web url')
 
     # s is a name
-    elif regexCheck(regexName, s) and config.name:
-        d['name'] = s
+    elif field == 'name' and config.name:
+        d['name'] = value
 
-    # s is a string message — default condition if 'message' is allowed
+    # s is a string message — default condition if 'message' is allowed
     elif config.message:
         d['message'] = s
 
-    # default condition — s could not be interpreted.
+    # default condition — s could not be interpreted.
     else:
-        print('Could not interpret input \'{}\'.'.format(s))
+        printRejection('Could not interpret input \'{}\'.'.format(s))
         success = False
 
     return success
@@ -918,6 +1779,27 @@ def deleteInformationField(s, dictionary):
 #### Record functions                                                                           ####
 ####################################################################################################
 
+def insertLog(log, entry):
+    """Inserts a contact-log entry into a log dictionary ordered by date, after any entries of the same
+    date, and returns the log dictionary. IDs are only reassigned when the entry does not simply go on
+    the end of a gapless log."""
+    logDate = lambda v: dateFromString(v['date']).toordinal()
+    when = logDate(entry)
+
+    # Most new entries are the latest yet; those are appended under the next ID.
+    if not log or when >= logDate(next(reversed(log.values()))):
+        if not log or int(next(reversed(log))) == len(log) - 1:
+            log[parseIDNumber(len(log), l=2)] = entry
+            return log
+        i = len(log)
+    else:
+        i = bisect.bisect_right([ logDate(v) for v in log.values() ], when)
+
+    # sort by date, ascending; reassign indices, too.
+    entries = list(log.values())
+    entries.insert(i, entry)
+    return listToIDDictionary(entries, l=2)
+
 def editRecord(record, args, config):
     """Returns an edited, shallow-copy of given dict 'record' via the list of arguments 'args'
     with respect to the given config settings."""
@@ -951,147 +1833,1333 @@ def editRecord(record, args, config):
 
 
 ####################################################################################################
-#### Script Variables                                                                           ####
+#### Export                                                                                     ####
 ####################################################################################################
 
-# File path constants
-datafolderPath = '%LOCALAPPDATA%\\workboy'
-datafolderPath = os.path.expandvars(datafolderPath)
-datafilePath = datafolderPath + '\\workboy_data'
-backupfilePath = datafolderPath + '\\workboy_backup'
-archivefilePath = datafolderPath + '\\workboy_archive' + str(date.today())
+# Each export format is a generator of text, walking the index in order and reading each record
+# only as it comes to it, without keeping it. Memory stays the same however many companies there
+# are, and the output can be written as it is made.
+
+exportFlushInterval = 1000      # Output is flushed every this many pieces, so a forwarded export streams to its client.
+
+def exportedRecords(index):
+    "Yields each company's ID and record in index order, reading each only as it is reached."
+    for id in index:
+        yield id, index.readRecord(id)
+
+def exportCSV(index):
+    """Yields a CSV file of every company, one row each. Contacts, info and log entries are each listed in
+    one cell, a line apiece."""
+    import csv
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    def row(fields):
+        writer.writerow(fields)
+        text = line.getvalue()
+        line.seek(0)
+        line.truncate()
+        return text
+
+    yield row(['id', 'name', 'url', 'phone', 'address', 'defunct', 'contacts', 'info', 'log'])
+    for id, record in exportedRecords(index):
+        contacts = [ ' | '.join(field for field in (contact['name'], contact['email'], contact['phone'],
+            'primary' if contact['primary'] else '') if field) for contact in record['contacts'].values() ]
+        yield row([ id, record['name'], record['url'], record['phone'], record['address'],
+            'yes' if record['defunct'] else 'no', '\n'.join(contacts), '\n'.join(record['info'].values()),
+            '\n'.join( '{}: {}'.format(log['date'], log['message']) for log in record['log'].values() ) ])
+
+def exportJSONL(index):
+    "Yields a JSON Lines file of every company: its full record and ID, one object to a line."
+    import json
+    for id, record in exportedRecords(index):
+        yield json.dumps({ 'id': id, **{ k: v for k, v in record.items() if k != 'summary' } }) + '\n'
+
+def icsText(text):
+    "Returns text escaped for an iCalendar property value."
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def icsLine(line):
+    "Returns an iCalendar content line, folded so that no line is over 75 bytes, with its line ending."
+    if len(line.encode('utf-8')) <= 75:
+        return line + '\r\n'
+    folded, width = [], 0
+    for char in line:
+        size = len(char.encode('utf-8'))
+        if width + size > 75:
+            folded.append('\r\n ')
+            width = 1
+        folded.append(char)
+        width += size
+    return ''.join(folded) + '\r\n'
+
+def exportICS(index):
+    """Yields an iCalendar file with an all-day event for every log entry, titled with the company and the
+    entry's message. Each event's UID comes from what it records, so it stays the same across exports."""
+    import hashlib
+    import time
+    stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    yield icsLine('BEGIN:VCALENDAR') + icsLine('VERSION:2.0') + icsLine('PRODID:-//workboy//export//EN')
+    for id, record in exportedRecords(index):
+        for log in record['log'].values():
+            uid = hashlib.sha1('{}\n{}\n{}'.format(id, log['date'], log['message']).encode()).hexdigest()
+            yield ''.join(map(icsLine, (
+                'BEGIN:VEVENT',
+                'UID:{}@workboy'.format(uid),
+                'DTSTAMP:' + stamp,
+                'DTSTART;VALUE=DATE:' + dateFromString(log['date']).strftime('%Y%m%d'),
+                'SUMMARY:' + icsText('{}: {}'.format(record['name'], log['message'])),
+                'END:VEVENT'
+                )))
+    yield icsLine('END:VCALENDAR')
+
+exportFormats = {
+    'csv': exportCSV,
+    'jsonl': exportJSONL,
+    'ics': exportICS
+    }
 
-saveOnExit = True               # Whether to save the contents of the company index on exiting the program.
-backupSaveData = ''             # The datafile as a single string. Used to save a backup copy on program exit.
 
-companyIndex = {}               # Global index of saved company records. By default, empty.
+####################################################################################################
+#### Compact Format                                                                             ####
+####################################################################################################
 
-argv = sys.argv[1:]             # Shorthand for script arguments. Discards first since it is always 'workboy'
+# The store may be kept in a compact binary format in place of JSON; 'workboy convert' switches between
+# the two. Shards and snapshots in the compact format start with a magic number, so either kind is
+# read no matter which format the store is in. Strings are length-prefixed UTF-8, dates are day
+# ordinals, phone numbers and IDs are integers. A value which doesn't fit its field's compact form,
+# say a phone number with a leading zero, is kept as a string instead; a record or header which
+# can't be encoded exactly is written as JSON. Either way the conversion is lossless.
+#
+# A snapshot is laid out by column, so that each column of numbers is read in one call rather than
+# value by value, and so is the activity index, which is kept in a file of its own.
+
+compactRecordMagic = b'wbr\x01'
+compactHeaderMagic = b'wbh\x02'
+oldCompactHeaderMagic = b'wbh\x01'     # headers which held the activity index, before it had a file of its own
+compactActivityMagic = b'wba\x01'
+compactColumnType = next(t for t in 'HILQ' if array(t).itemsize == 4)     # a 32-bit unsigned integer
+
+class CompactReader:
+    "Reads the values written by the compact* functions from a bytes object, in order."
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+
+    def take(self, n):
+        "Returns the next n bytes."
+        start, self.pos = self.pos, self.pos + n
+        if self.pos > len(self.data):
+            raise ValueError('Compact data ends early')
+        return self.data[start:self.pos]
+
+    def number(self):
+        "Returns the next unsigned integer."
+        n, shift = 0, 0
+        while True:
+            if self.pos >= len(self.data):
+                raise ValueError('Compact data ends early')
+            byte = self.data[self.pos]
+            self.pos += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def flag(self):
+        return self.take(1) != b'\x00'
+
+    def text(self):
+        return self.take(self.number()).decode()
+
+    def tagged(self):
+        "Returns the next value written by compactTagged(): an integer, or else a string."
+        n = self.number()
+        return n >> 1 if not n & 1 else self.take(n >> 1).decode()
+
+    def column(self, count):
+        "Returns the next column of count unsigned integers, as written by compactColumn()."
+        values = array(compactColumnType)
+        values.frombytes(self.take(count * values.itemsize))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+def compactNumber(out, n):
+    "Appends an unsigned integer to the bytearray out, seven bits to a byte."
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+def compactFlag(out, b):
+    out.append(1 if b else 0)
+
+def compactText(out, s):
+    data = s.encode()
+    compactNumber(out, len(data))
+    out += data
+
+def compactTagged(out, n, s):
+    "Appends the integer n, or the string s if n is None, telling the two apart by the low bit."
+    if n != None:
+        compactNumber(out, n << 1)
+    else:
+        data = s.encode()
+        compactNumber(out, len(data) << 1 | 1)
+        out += data
+
+def compactColumn(out, values):
+    "Appends a list of unsigned integers as one column of fixed-width values."
+    values = array(compactColumnType, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    out += values.tobytes()
+
+def dateOrdinal(s):
+    "Returns the day ordinal of a stored date string, or None if it wouldn't be stored back the same way."
+    try:
+        n = dateFromString(s).toordinal()
+    except (TypeError, ValueError):
+        return None
+    return n if dateToString(date.fromordinal(n)) == s else None
+
+def phoneInteger(s):
+    "Returns a phone number string as an integer, or None if it wouldn't be written back the same way."
+    return int(s) if s.isdigit() and s.isascii() and str(int(s)) == s else None
+
+def idInteger(s, l):
+    "Returns an ID key as an integer, or None if it wouldn't be written back the same way at width l."
+    return int(s) if s.isdigit() and s.isascii() and parseIDNumber(int(s), l) == s else None
+
+def compactDate(out, s):
+    compactTagged(out, dateOrdinal(s), s)
+
+def compactPhone(out, s):
+    compactTagged(out, phoneInteger(s), s)
+
+def compactID(out, s, l=2):
+    compactTagged(out, idInteger(s, l), s)
+
+def readDate(reader):
+    value = reader.tagged()
+    return dateToString(date.fromordinal(value)) if type(value) is int else value
+
+def readPhone(reader):
+    value = reader.tagged()
+    return str(value) if type(value) is int else value
+
+def readID(reader, l=2):
+    value = reader.tagged()
+    return parseIDNumber(value, l) if type(value) is int else value
+
+def packRecord(record):
+    "Returns a company record in the compact format."
+    out = bytearray(compactRecordMagic)
+    compactText(out, record['name'])
+    compactText(out, record['url'])
+    compactPhone(out, record['phone'])
+    compactText(out, record['address'])
+    compactFlag(out, record['defunct'])
+
+    summary = record['summary']
+    compactNumber(out, summary['last'] + 1 if summary['last'] != None else 0)
+    compactNumber(out, summary['logs'])
+    compactFlag(out, summary['defunct'])
+
+    compactNumber(out, len(record['contacts']))
+    for k, v in record['contacts'].items():
+        compactID(out, k)
+        compactText(out, v['name'])
+        compactText(out, v['email'])
+        compactPhone(out, v['phone'])
+        compactFlag(out, v['primary'])
+
+    compactNumber(out, len(record['info']))
+    for k, v in record['info'].items():
+        compactID(out, k)
+        compactText(out, v)
+
+    compactNumber(out, len(record['log']))
+    for k, v in record['log'].items():
+        compactID(out, k)
+        compactDate(out, v['date'])
+        compactText(out, v['message'])
+
+    return bytes(out)
+
+def unpackRecord(data):
+    "Returns the company record held in the output of packRecord()."
+    reader = CompactReader(data, len(compactRecordMagic))
+    record = newCompany(reader.text())
+    record['url'] = reader.text()
+    record['phone'] = readPhone(reader)
+    record['address'] = reader.text()
+    record['defunct'] = reader.flag()
+
+    summary = record['summary']
+    last = reader.number()
+    summary['last'] = last - 1 if last else None
+    summary['logs'] = reader.number()
+    summary['defunct'] = reader.flag()
+
+    for _ in range(reader.number()):
+        k = readID(reader)
+        record['contacts'][k] = { 'name': reader.text(), 'email': reader.text(), 'phone': readPhone(reader), 'primary': reader.flag() }
+    for _ in range(reader.number()):
+        k = readID(reader)
+        record['info'][k] = reader.text()
+    for _ in range(reader.number()):
+        k = readID(reader)
+        record['log'][k] = { 'date': readDate(reader), 'message': reader.text() }
+
+    return record
+
+def packSnapshot(index):
+    "Returns the index header in the compact format; every record must have been written to a shard."
+    out = bytearray(compactHeaderMagic)
+    stubs = list(index.stubs.items())
+
+    compactNumber(out, index.ids.next)
+    compactNumber(out, len(index.ids.free))
+    compactColumn(out, index.ids.free)
+
+    compactNumber(out, len(stubs))
+    compactColumn(out, [ int(k) for k, v in stubs ])
+    compactText(out, '\x00'.join( v.name for k, v in stubs ))
+    compactColumn(out, [ v.last + 1 if v.last != None else 0 for k, v in stubs ])
+    compactColumn(out, [ v.logs for k, v in stubs ])
+    out += bytes( 1 if v.defunct else 0 for k, v in stubs )
+    out += b''.join( bytes.fromhex(v.shard) for k, v in stubs )
+
+    # The name lookup is only written out when it isn't simply every stub's name, as after a duplicate.
+    derived = index.names == { foldName(v.name): k for k, v in stubs }
+    compactFlag(out, not derived)
+    if not derived:
+        compactNumber(out, len(index.names))
+        compactText(out, '\x00'.join(index.names))
+        compactColumn(out, [ int(v) for v in index.names.values() ])
+    return bytes(out)
+
+def unpackSnapshot(data):
+    """Returns a company index from the output of packSnapshot(). Its activity index is read from its own
+    file when first asked for, unless the header is of the older kind which held it."""
+    reader = CompactReader(data, len(compactHeaderMagic))
+
+    next = reader.number()
+    ids = IDAllocator(4, next, list(reader.column(reader.number())))
+
+    count = reader.number()
+    numbers = reader.column(count)
+    keys = [ parseIDNumber(n, 4) for n in numbers ]
+    names = reader.text().split('\x00') if count else []
+    lasts = [ n - 1 if n else None for n in reader.column(count) ]
+    logs = reader.column(count)
+    defunct = [ b != 0 for b in reader.take(count) ]
+    shards = reader.take(count * 20).hex()
+    shards = [ shards[i:i+40] for i in range(0, len(shards), 40) ]
+    stubs = dict(zip(keys, map(CompanyStub, names, lasts, logs, defunct, shards)))
+
+    # Activity entries share their ID strings with the stubs rather than each holding copies.
+    companyKeys = dict(zip(numbers, keys))
+
+    if reader.flag():
+        count = reader.number()
+        lookup = dict(zip(reader.text().split('\x00') if count else [], map(companyKeys.__getitem__, reader.column(count))))
+    else:
+        lookup = dict(zip(map(foldName, names), keys))
+
+    activity = readActivityColumns(reader, companyKeys) if data.startswith(oldCompactHeaderMagic) else None
+
+    index = CompanyIndex(stubs, lookup, ids, activity)
+    index.compact = True
+    return index
+
+def packActivity(activity):
+    "Returns the activity index in the compact format."
+    out = bytearray(compactActivityMagic)
+    compactNumber(out, len(activity))
+    compactColumn(out, [ when for when, k, logID in activity ])
+    compactColumn(out, [ int(k) for when, k, logID in activity ])
+    compactColumn(out, [ int(logID) for when, k, logID in activity ])
+    return bytes(out)
+
+def readActivityColumns(reader, companyKeys=None):
+    """Returns the activity index written as columns by packActivity(), read on from reader. Its entries share
+    their company ID strings with the given company number → ID key dictionary rather than each holding copies."""
+    count = reader.number()
+    whens, companies, logIDs = reader.column(count), reader.column(count), reader.column(count)
+    if companyKeys == None:
+        companyKeys = { n: parseIDNumber(n, 4) for n in set(companies) }
+    logKeys = [ parseIDNumber(n, 2) for n in range(max(logIDs, default=-1) + 1) ]
+    return list(zip(whens, map(companyKeys.__getitem__, companies), map(logKeys.__getitem__, logIDs)))
+
+def unpackActivity(data):
+    "Returns the activity index held in the output of packActivity()."
+    return readActivityColumns(CompactReader(data, len(compactActivityMagic)))
+
+def sameSnapshot(a, b):
+    "Returns whether two company indices have the same header."
+    return a.snapshot() == b.snapshot()
+
+def encodeRecord(record, compact):
+    "Returns the bytes a shard holding record is written as: the compact format if asked for and exact, JSON otherwise."
+    import json
+    if compact:
+        try:
+            data = packRecord(record)
+            if unpackRecord(data) == record:
+                return data
+        except (AttributeError, KeyError, TypeError, ValueError, OverflowError):
+            pass
+    return json.dumps(record).encode()
+
+def encodeSnapshot(index):
+    "Returns the bytes the index header is written as, in the index's format if that would be exact, JSON otherwise."
+    import json
+    if index.compact:
+        try:
+            data = packSnapshot(index)
+            if sameSnapshot(unpackSnapshot(data), index):
+                return data
+        except (AttributeError, KeyError, TypeError, ValueError, OverflowError, IndexError):
+            pass
+    return json.dumps(index.snapshot()).encode()
+
+def encodeActivity(activity, compact):
+    "Returns the bytes the activity index is written as: the compact format if asked for and exact, JSON otherwise."
+    import json
+    if compact:
+        try:
+            data = packActivity(activity)
+            if unpackActivity(data) == activity:
+                return data
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return json.dumps(activity).encode()
+
+def decodeRecord(data):
+    "Returns the company record held in a shard's bytes, whichever format they are in."
+    import json
+    countWork('records scanned')
+    return unpackRecord(data) if data.startswith(compactRecordMagic) else json.loads(data)
+
+def decodeSnapshot(data):
+    "Returns the company index held in a snapshot's bytes, whichever format they are in."
+    import json
+    if data.startswith((compactHeaderMagic, oldCompactHeaderMagic)):
+        return unpackSnapshot(data)
+    return CompanyIndex.fromSnapshot(json.loads(data)) if data.strip() else CompanyIndex()
+
+def decodeActivity(data):
+    "Returns the activity index held in an activity file's bytes, whichever format they are in."
+    import json
+    if data.startswith(compactActivityMagic):
+        return unpackActivity(data)
+    return [ tuple(entry) for entry in json.loads(data) ]
 
 
 ####################################################################################################
-#### Open Script                                                                                ####
+#### Storage Engine                                                                             ####
 ####################################################################################################
 
-# Try to make the datafile directory if it does not exist
-try:
-    os.mkdir(datafolderPath)
-except OSError:
-    pass
+# The company index is stored as a header plus one shard file per company. A shard holds a whole
+# company record and is named for the hash of its contents, so old versions of a record are never
+# overwritten; they stay on disk until nothing refers to them. The header holds only each company's
+# stub, the name lookup and the ID allocator, so commands which don't open a record never read one,
+# and those which do read only the shards they need. The activity index, which grows with every
+# log entry, is kept in a file of its own beside the header and read only by the commands that use it.
+#
+# The datafile is a snapshot of the header as it was at its last compaction. Every save since then
+# writes the shards of the records that session changed and adds one line to the journal holding
+# their new stubs, so the cost of a save follows the size of the edit rather than the size of the
+# index. Loading replays the journal over the snapshot; once the journal would outgrow the
+# snapshot, the two are folded together.
+#
+# No file is rewritten in place. A save's journal line is appended and flushed, and a line left
+# half written by a crash is ignored, then cut away by the next save. Anything else is written
+# beside the file it replaces, flushed to disk and renamed over it. Changes which span several
+# files, such as compactions and undos, list their renames in the commit file before making any,
+# and whoever next takes the store lock finishes a list which a crash cut short. Backups are kept
+# by linking the old files rather than by copying them.
+#
+# The search index is split the same way: its tokens are spread by hash over a fixed number of files,
+# name trigrams over files of their own, each named for the hash of its contents, and the terms file
+# lists them. A search reads only the
+# files holding its own tokens and replays the journaled changes to those tokens over them, and a
+# compaction rewrites only the files whose tokens have changed since the last.
+
+journalCompactionMinimum = 64 * 1024    # Journals smaller than this many bytes are never compacted.
+shardSyncMaximum = 64                   # Saves writing more shards than this write them all before flushing any to disk.
+termShardCount = 256                    # The search index is split by token hash into this many files, so a search reads only its tokens'.
+nameShardCount = 64                     # Name trigrams are split into this many more files of their own.
+
+def fileSize(path):
+    "Returns the size in bytes of the file at path, or 0 if it does not exist."
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
 
-# Restore backed-up old datafile if told to
-if get(0, argv) == 'restore-backup':
+def storeVersion():
+    "Returns what identifies the present contents of the store's files, so as to tell whether anyone has saved since."
+    def version(path):
+        try:
+            status = os.stat(path)
+            return (status.st_ino, status.st_size, status.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+    return tuple( version(path) for path in (datafilePath, journalfilePath, databasePath) )
+
+class StoreLock:
+    """An advisory lock on the data folder, held while the store's files are read or written so that
+    workboy processes running at once take turns with them. Sessions hold it only for as long as a
+    load or a save takes, never while polling. Whoever holds it may take it again."""
+    def __init__(self):
+        self.lockfile = None
+        self.depth = 0
+
+    def __enter__(self):
+        if self.depth == 0:
+            self.lockfile = open(lockfilePath, 'a+b')
+            if os.name == 'nt':
+                import msvcrt
+                self.lockfile.seek(0)
+                msvcrt.locking(self.lockfile.fileno(), msvcrt.LK_LOCK, 1)     # gives up after ten seconds
+            else:
+                import fcntl
+                fcntl.flock(self.lockfile, fcntl.LOCK_EX)
+            finishCommit()
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exception):
+        self.depth -= 1
+        if self.depth == 0:
+            if os.name == 'nt':
+                import msvcrt
+                self.lockfile.seek(0)
+                msvcrt.locking(self.lockfile.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.lockfile, fcntl.LOCK_UN)
+            self.lockfile.close()
+            self.lockfile = None
+
+storeLock = StoreLock()
+
+def syncFolder(path):
+    "Flushes the renames made in the folder at path to disk, on systems which allow folders to be synced."
+    if os.name == 'nt':
+        return
+    folder = os.open(path, os.O_RDONLY)
     try:
-        with open(backupfilePath, 'r') as backup:
-            with open(datafilePath, 'w') as datafile:
-                save = backup.read()
-                datafile.write(save)
-        print('Backup data restored.')
-    except FileNotFoundError:
-        print('Failed: no backup file exists for workboy.')
+        os.fsync(folder)
     finally:
-        exit()  # Force quit script
+        os.close(folder)
+
+def syncFile(path):
+    "Flushes the file at path to disk."
+    with open(path, 'r+b') as file:
+        os.fsync(file.fileno())
+
+def writeFile(path, data, sync=True):
+    "Writes the given bytes or text to the file at path, and flushes them to disk unless told not to."
+    data = data if type(data) == bytes else data.encode('utf-8')
+    countWork('bytes written', len(data))
+    with open(path, 'wb') as file:
+        file.write(data)
+        if sync:
+            file.flush()
+            os.fsync(file.fileno())
+
+def writeFileAtomically(path, data, sync=True):
+    """Replaces the file at path with the given bytes or text such that it holds either all of its old
+    contents or all of its new, whenever the system might go down. If it isn't flushed to disk here,
+    the caller must see to it."""
+    writeFile(path + '.tmp', data, sync)
+    os.replace(path + '.tmp', path)
+
+def commitFiles(operations):
+    """Carries out a list of file operations such that if any of them takes effect, all of them do: if
+    the system goes down partway, whoever next takes the store lock finishes them. Each is either
+    ('move', source, target), replacing target with source unless source is gone, or ('remove', path)."""
+    import json
+    writeFileAtomically(commitfilePath, json.dumps(operations))
+    syncFolder(datafolderPath)
+    finishCommit()
+
+def finishCommit():
+    "Carries out what remains of the operations given to commitFiles(), if a crash interrupted them."
+    import json
+    try:
+        with open(commitfilePath, 'r') as commitfile:
+            operations = json.loads(commitfile.read())
+    except FileNotFoundError:
+        return
+    for operation, *paths in operations:
+        if os.path.exists(paths[0]):
+            if operation == 'move':
+                os.replace(paths[0], paths[1])
+            else:
+                os.remove(paths[0])
+    syncFolder(datafolderPath)
+    os.remove(commitfilePath)
+
+def rotateOperations(pairs):
+    "Returns the commitFiles() operations which move each of the given (path, backup path) pairs' file into its backup, or clear the backup if there's no file."
+    return [ ('move', path, backupPath) if os.path.exists(path) else ('remove', backupPath) for path, backupPath in pairs ]
+
+def backupOperations(pairs):
+    """Returns the commitFiles() operations which make the backup of each of the given (path, backup path)
+    pairs what the file is now, or clear the backup if there's no file. The backups are second links
+    to the files, made now under temporary names, so the files must only ever be replaced, not written to."""
+    operations = []
+    for path, backupPath in pairs:
+        if not os.path.exists(path):
+            operations.append(('remove', backupPath))
+            continue
+        linkPath = backupPath + '.tmp'
+        if os.path.exists(linkPath):
+            os.remove(linkPath)
+        linkFile(path, linkPath)
+        operations.append(('move', linkPath, backupPath))
+    return operations
+
+def linkFile(path, linkPath):
+    "Makes linkPath a second link to the file at path, or a copy of it where the file system has no links."
+    try:
+        os.link(path, linkPath)
+    except OSError:
+        import shutil
+        countWork('bytes written', os.path.getsize(path))
+        shutil.copyfile(path, linkPath)
+
+def readShard(shard):
+    "Returns the company record held in the given shard."
+    with open(os.path.join(shardfolderPath, shard), 'rb') as shardfile:
+        return decodeRecord(shardfile.read())
+
+def writeShard(record, compact=False, sync=True):
+    """Writes a company record to its shard, if that shard doesn't already exist, and returns the shard's name.
+    The record is written in the compact format if asked for."""
+    import hashlib
+    data = encodeRecord(record, compact)
+    shard = hashlib.sha1(data).hexdigest()
+    path = os.path.join(shardfolderPath, shard)
+    if not os.path.exists(path):
+        writeFileAtomically(path, data, sync)
+    return shard
+
+def writeShards(index, ids):
+    """Writes the records of index with the given IDs to their shards, and records that they were. Past
+    shardSyncMaximum of them, they are all written before any is flushed to disk, so that the system
+    may write them out together, rather than each being flushed as it is written."""
+    bulk = len(ids) > shardSyncMaximum
+    shards = set()
+    for id in ids:
+        shard = writeShard(index[id], index.compact, sync=not bulk)
+        index.commitRecord(id, shard)
+        shards.add(shard)
+    if bulk:
+        for shard in shards:
+            syncFile(os.path.join(shardfolderPath, shard))
+    syncFolder(shardfolderPath)
+
+def readSnapshot(path):
+    "Returns the company index held in the snapshot file at path, or an empty index if there is none."
+    try:
+        with open(path, 'rb') as snapshot:
+            return decodeSnapshot(snapshot.read())
+    except FileNotFoundError:
+        return CompanyIndex()
 
-# Archive current record
-if get(0, argv) == 'archive':
+def readJournal(path):
+    "Returns the list of change records held in the journal file at path, oldest first."
+    import json
+    changes = []
     try:
-        with open(datafilePath, 'r') as datafile:
-            with open(archivefilePath, 'w') as archivefile:
-                save = datafile.read()
-                archivefile.write(save)
-        print("History archived at:")
-        print("    " + archivefilePath)
+        with open(path, 'r') as journal:
+            for line in journal:
+                try:
+                    changes.append(json.loads(line))
+                except json.decoder.JSONDecodeError:
+                    # A save was interrupted mid-write; nothing after this point was ever committed.
+                    print('Warning: the journal ends in an incomplete save, which was ignored.')
+                    break
     except FileNotFoundError:
-        print('Failed: no record to archive.')
-    finally:
-        exit()  # Force quite script
+        pass
+    return changes
+
+def applyChange(index, change):
+    "Folds a single journal change record into the given company index."
+    for id, entry in change.get('put', {}).items():
+        if 'log' in entry:      # journals from before records were sharded hold whole records
+            if 'summary' not in entry:
+                entry['summary'] = summarizeCompany(entry)
+            index[id] = entry
+        else:
+            index.putStub(id, CompanyStub.fromDict(entry))
+    for id in change.get('del', []):
+        if index.unsharded:
+            index.pop(id, None)
+        elif id in index:
+            index.dropStub(id)
+    if 'activity' in change:
+        index.applyActivityChanges(change['activity'])
+    if not termsCurrent(change):
+        index.journalTerms = None
+    elif index.journalTerms != None:
+        index.journalTerms.append(change['terms']['changes'])
+
+def journalChange(index, changed):
+    """Returns a change record describing the current state of each of the changed record IDs. They are
+    put in ID order, so that replaying the journal lists new companies in the order they were added."""
+    return {
+        'put': { id: index.stubs[id].toDict() for id in sorted(changed, key=int) if id in index },
+        'del': [ id for id in changed if id not in index ],
+        **index.pendingChanges()
+    }
 
-# Restore archive from specified date
-if get(0, argv) == 'restore-archive':
-    dateStr = dateStr if (dateStr := get(1, argv)) != None else ''
-    when = parseDate(dateStr)
+def loadIndex():
+    "Reads the company index header from the snapshot and replays the journal over it."
+    with storeLock:
+        index = readSnapshot(datafilePath)
+        for change in readJournal(journalfilePath):
+            applyChange(index, change)
+
+        # Data saved before records were sharded is split up into shards the first time it is read.
+        if index.unsharded:
+            writeShards(index, list(index))
+            compactStore(index)
+            index.unsharded = False
+
+        index.base = storeVersion()
+    return index
+
+def termsCurrent(change):
+    "Returns whether a journal change record's search-index changes are of the current kind of search index."
+    return type(change.get('terms')) == dict and change['terms']['version'] == termsVersion
+
+def termShard(token):
+    """Returns the number of the search-index file which holds the postings of token. Name trigrams are
+    kept apart from the words of records, in the files after theirs, so neither kind of lookup reads
+    the other's postings."""
+    import zlib
+    hash = zlib.crc32(token.encode('utf-8'))
+    return termShardCount + hash % nameShardCount if token.startswith('#') else hash % termShardCount
+
+def readTermShard(shard):
+    "Returns the postings held in the given search-index file, token → {company ID: occurrences}; None is an empty one."
+    import json
+    if shard == None:
+        return {}
+    with open(os.path.join(termfolderPath, shard), 'r') as shardfile:
+        return json.loads(shardfile.read())
+
+def writeTermShard(postings):
+    "Writes the given postings to their search-index file, if that file doesn't already exist, and returns the file's name."
+    import hashlib
+    import json
+    if not postings:
+        return None
+    data = json.dumps(postings, sort_keys=True).encode('utf-8')
+    shard = hashlib.sha1(data).hexdigest()
+    path = os.path.join(termfolderPath, shard)
+    if not os.path.exists(path):
+        writeFileAtomically(path, data)
+    return shard
+
+def readTermsManifest(path):
+    """Returns the names of the files which the search index saved at path is split into, by termShard()
+    number, or None if there is none there of the current kind, split as many ways as now."""
+    import json
+    try:
+        with open(path, 'r') as termsfile:
+            saved = json.loads(termsfile.read())
+    except FileNotFoundError:
+        return None
+    shards = saved.get('shards') if saved.get('version') == termsVersion else None
+    return shards if shards != None and len(shards) == termShardCount + nameShardCount else None
+
+def savedTerms(index):
+    """Returns the names of the saved search index's files, by termShard() number, and the search-index
+    changes of each save journaled since, as index was read or as the store is now if anyone has saved
+    since. Returns (None, None) if either is missing or of an older kind of search index."""
+    journaled = index.journalTerms
+    if index.base != storeVersion():
+        changes = readJournal(journalfilePath)
+        journaled = [ change['terms']['changes'] for change in changes ] if all(map(termsCurrent, changes)) else None
+
+    shards = readTermsManifest(termsfilePath)
+    if shards == None and not os.path.exists(termsfilePath) and not os.path.exists(datafilePath):
+        shards = [None] * (termShardCount + nameShardCount)     # a store yet to be compacted, whose every change is journaled
+    if shards == None or journaled == None:
+        return None, None
+    return shards, journaled
+
+def readTerms(index, tokens):
+    """Returns the postings of the given tokens as index has them: the saved search index's, from only
+    the files which hold those tokens, with the journal's changes and index's unsaved ones replayed over
+    them. Returns None if the saved search index can't be used, or index's changes weren't kept, as
+    after its companies were renumbered; then it must be built from every record."""
+    shards, journaled = savedTerms(index)
+    if shards == None or index.termChanges == None:
+        return None
 
-    if when == None:
-        print('Date input was malformed or did not exist. Could not identify which archive date to process.')
-        exit()
-    
+    wanted = set(tokens)
+    postings = {}
+    for shard in set( shards[termShard(token)] for token in wanted ):
+        postings.update( (token, p) for token, p in readTermShard(shard).items() if token in wanted )
+    applyTermChanges(postings, [ change for changes in journaled for change in changes if change[0] in wanted ])
+    applyTermChanges(postings, [ (token, id, n) for (token, id), n in index.termChanges.items() if token in wanted ])
+    return postings
+
+def writeTerms(index):
+    """Writes the search index of index's records to its files, and returns their names by termShard()
+    number. Only the files holding tokens changed since the last compaction are rewritten, unless the
+    search index must be built afresh."""
+    shards, journaled = savedTerms(index)
+    if not index.termsComplete and (shards == None or index.termChanges == None):
+        index.terms, index.termsComplete = buildTerms(index), True
+
+    if index.termsComplete:
+        split = [ {} for n in range(termShardCount + nameShardCount) ]
+        for token, postings in index.terms.items():
+            split[termShard(token)][token] = postings
+        shards = [ writeTermShard(postings) for postings in split ]
+    else:
+        changed = {}
+        for token, id, n in [ change for changes in journaled for change in changes ] + [
+            (token, id, n) for (token, id), n in index.termChanges.items() ]:
+            changed.setdefault(termShard(token), []).append((token, id, n))
+        shards = list(shards)
+        for number, changes in changed.items():
+            postings = readTermShard(shards[number])
+            applyTermChanges(postings, changes)
+            shards[number] = writeTermShard(postings)
+    syncFolder(termfolderPath)
+    return shards
+
+def readActivity(index):
+    """Returns the saved activity index and the activity-index changes of each save journaled since, as
+    index was read or as the store is now if anyone has saved since. Returns (None, None) if there is no
+    saved activity index; then it must be built from every record."""
     try:
-        targetPath = datafolderPath + '\\workboy_archive' + str(when)
-        with open(targetPath, 'r') as archivefile:
-            with open(datafilePath, 'w') as datafile:
-                save = archivefile.read()
-                datafile.write(save)
-        print('Archive restored.')
+        with open(activityfilePath, 'rb') as activityfile:
+            activity = decodeActivity(activityfile.read())
     except FileNotFoundError:
-        print('Failed: no archive from date "{}" exists.'.format(when))
-    finally:
-        exit()
+        return None, None
+
+    journaled = index.journalActivity
+    if index.base != storeVersion():
+        journaled = [ change['activity'] for change in readJournal(journalfilePath) if 'activity' in change ]
+    return activity, journaled
+
+def appendJournal(line):
+    "Adds a save's line to the journal and flushes it to disk, first cutting away any save a crash left half written."
+    with open(journalfilePath, 'a+b') as journal:
+        size = journal.seek(0, os.SEEK_END)
+        if size:
+            journal.seek(size - 1)
+            if journal.read(1) != b'\n':
+                journal.seek(0)
+                journal.truncate(journal.read().rfind(b'\n') + 1)
+        data = line.encode('utf-8')
+        countWork('bytes written', len(data))
+        journal.write(data)
+        journal.flush()
+        os.fsync(journal.fileno())
+    if not size:
+        syncFolder(datafolderPath)
+
+def compactStore(index):
+    """Writes index as a fresh snapshot with an empty journal, along with its search index. The old
+    snapshot, journal and search index are kept as the backup."""
+    import json
+    with storeLock:
+        shards = writeTerms(index)      # written before the journal it replays is moved aside
+        activity = index.loadedActivity()
+
+        backups = backupOperations(storePaths)
+        writeFile(datafilePath + '.tmp', encodeSnapshot(index))
+        writeFile(termsfilePath + '.tmp', json.dumps({ 'version': termsVersion, 'shards': shards }))
+        writeFile(activityfilePath + '.tmp', encodeActivity(activity, index.compact))
+        commitFiles(backups + [ ('move', datafilePath + '.tmp', datafilePath),
+            ('move', termsfilePath + '.tmp', termsfilePath), ('move', activityfilePath + '.tmp', activityfilePath),
+            ('remove', journalfilePath) ])
+        index.clearPendingChanges()
+        index.journalTerms = []
+        collectShards(index)
+        index.base = storeVersion()
+
+def collectShards(index):
+    """Deletes the shards which neither index, nor the backup, nor any save journaled since either, refers to,
+    and the search-index files which neither the search index nor its backup does."""
+    referenced = set( stub.shard for stub in index.stubs.values() )
+    referenced |= set( stub.shard for stub in readSnapshot(backupfilePath).stubs.values() )
+    for change in readJournal(journalfilePath) + readJournal(backupJournalPath):
+        referenced |= set( entry['shard'] for entry in change.get('put', {}).values() if 'shard' in entry )
+
+    for shard in os.listdir(shardfolderPath):
+        if shard not in referenced:
+            os.remove(os.path.join(shardfolderPath, shard))
+
+    # The search index's files are referred to only by its own file and that file's backup.
+    referenced = set( (readTermsManifest(termsfilePath) or []) + (readTermsManifest(backupTermsPath) or []) )
+    for shard in os.listdir(termfolderPath):
+        if shard not in referenced:
+            os.remove(os.path.join(termfolderPath, shard))
+
+def printSaveConflicts(conflicts):
+    "Reports that a save was refused over the given (ID, name) pairs, companies which another workboy saved first."
+    printBuffer('Not saved: since this session read them, another workboy has saved changes to')
+    for id, name in conflicts:
+        printBuffer('    {} {}'.format(id, name))
+    printBuffer("None of this session's changes were kept. Make them again to make them over the others'.")
+    displayBuffer()
 
-# Print archive files.
-if get(0, argv) == 'display-archives':
-    files = [f for f in os.listdir(datafolderPath) if os.path.isfile(os.path.join(datafolderPath, f))]
-    files = [f for f in files if f not in ["workboy_data", "workboy_backup"]]
+def mergeIndex(index, changed):
+    """Carries the changed record IDs of index over onto the store as another workboy has since saved it.
+    Returns the index read afresh with them applied and the IDs they were applied at, which may differ
+    for new companies whose IDs were taken in the meantime. Returns None if the other save changed any
+    of the same companies or took a new company's name; nothing is applied then."""
+    fresh = loadIndex()
+    applied, conflicts = {}, []
+    for id in sorted(changed):
+        present = id in index
+        if not present and id not in fresh:
+            continue        # deleted by both, or added and deleted again here
+        name = index.stub(id)['name'] if present else fresh.stub(id)['name']
+        base, current = index.savedShard(id), fresh.savedShard(id)
+        owner = fresh.lookupName(name) if present else None
+        if owner not in (None, id):
+            conflicts.append((id, name))
+        elif base == current:
+            applied[id] = id
+        elif base == None and present and owner == None:
+            applied[id] = fresh.ids.allocate()     # both added a company, and the other got this ID first
+        else:
+            conflicts.append((id, name))
 
-    pre = "Held archives:\n" if len(files) > 0 else "No archived records."
-    printBuffer(pre)
-    for f in files:
-        printBuffer(f)
+    if conflicts:
+        printSaveConflicts(conflicts)
+        return None
 
-    displayBuffer()
-    exit()
+    for id, freshID in applied.items():
+        if id in index:
+            fresh[freshID] = index[id]
+        elif id in fresh:
+            del fresh[id]
+        if freshID != id:
+            print("{} was saved as {}, another workboy having given its ID to {}.".format(
+                index[id]['name'], freshID, fresh.stub(id)['name']))
+    return fresh, set(applied.values())
+
+def saveIndex(index, changed):
+    """Commits the changed record IDs of index to the journal, compacting the store if the journal has
+    grown too large. If another workboy has saved since index was read, they are merged with its save.
+    Returns False if that couldn't be done, in which case nothing was saved."""
+    import json
+    if not changed:
+        return True
 
-# Delete an archive file.
-if get(0, argv) == 'delete-archive':
-    dateStr = dateStr if (dateStr := get(1, argv)) != None else ''
-    when = parseDate(dateStr)
+    with storeLock:
+        if index.base != None and index.base != storeVersion():
+            merged = mergeIndex(index, changed)
+            if merged == None:
+                return False
+            index, changed = merged
+
+        # The working records have their ID spaces closed up before they are written.
+        kept = [ id for id in changed if id in index ]
+        for id in kept:
+            index.compactRecordIDs(id)
+        writeShards(index, kept)
+
+        # A save which rewrites most of the index, as an import does, would only be folded in at once.
+        bulk = len(kept) > shardSyncMaximum and len(kept) * 2 > len(index)
+        change = journalChange(index, changed)
+        line = json.dumps(change) + '\n' if not bulk else ''
+
+        # Compacting in place of the append keeps the backup at the state from before this save. A search
+        # index which must be built afresh is written out here too, searches never writing it themselves.
+        outgrown = fileSize(journalfilePath) + len(line) > max(journalCompactionMinimum, fileSize(datafilePath))
+        if bulk or outgrown or savedTerms(index)[0] == None:
+            compactStore(index)
+        else:
+            appendJournal(line)
+            if index.journalTerms != None:
+                index.journalTerms.append(change['terms']['changes'])
+            if index.activity == None:
+                index.journalActivity.append(change['activity'])
+            index.clearPendingChanges()
+            index.base = storeVersion()
+    return True
+
+def undoLastSave():
+    "Reverts the data record to its state before the most recent save. Returns False if there is nothing to revert."
+    with storeLock:
+        try:
+            with open(journalfilePath, 'rb') as journal:
+                lines = journal.read().splitlines(keepends=True)
+        except FileNotFoundError:
+            lines = []
+        if lines and not lines[-1].endswith(b'\n'):
+            lines.pop()     # a save cut short by a crash, which never took effect
+
+        # The last save is the journal's last line, unless that save compacted the journal away.
+        if lines:
+            with open(journalfilePath, 'r+b') as journal:
+                journal.truncate(sum(len(line) for line in lines[:-1]))
+                os.fsync(journal.fileno())
+            return True
+
+        if os.path.exists(backupfilePath) or os.path.exists(backupJournalPath):
+            commitFiles(rotateOperations( (backupPath, path) for path, backupPath in storePaths ))
+            return True
+        return False
 
-    if when == None:
-        print('Date input was malformed or did not exist. Could not identify which archive data to delete.')
-        exit()
 
-    try:
-        targetPath = datafolderPath + '\\workboy_archive' + str(when)
-        os.remove(targetPath)
-        print('Archive removed.')
-    except FileNotFoundError:
-        print('Failed: no archive from date "{}" exists.'.format(when))
-    finally:
-        exit()
+####################################################################################################
+#### Storage Backends
+
+# The company index may be kept by either of two stores, which answer the same calls: the datafile,
+# journal and shards above, or a SQLite database. Whichever one holds data is the one used, and
+# 'workboy convert' moves the data between them.
+
+class JournalStore:
+    "Keeps the company index as a snapshot, a journal of saves since it, and one shard per record."
+    format = 'json'
+
+    def load(self):
+        return loadIndex()
+
+    def save(self, index, changed):
+        return saveIndex(index, changed)
+
+    def undo(self):
+        return undoLastSave()
+
+    def compact(self, index):
+        compactStore(index)
+
+    def exists(self):
+        return os.path.exists(datafilePath) or os.path.exists(journalfilePath)
+
+    def create(self, index, compact=False):
+        "Replaces this store's contents with the records of any company index, in the compact format if asked."
+        if not isinstance(index, CompanyIndex):
+            index = CompanyIndex(records={ id: index[id] for id in index })
+        index.compact = compact
+        with storeLock:
+            writeShards(index, list(index))
+            index.forgetTerms()
+            compactStore(index)
+
+    def replace(self, records):
+        """Replaces this store's contents with full records, given as (ID, record) pairs as read from an archive;
+        this can be undone. Each is written to its shard as it comes, so only one is held at a time, and
+        the store is then compacted onto the new records, its old files becoming the backup."""
+        with storeLock:
+            compact = readSnapshot(datafilePath).compact
+            stubs, activity, terms = {}, [], {}
+            for id, record in records:
+                if 'summary' not in record:
+                    record['summary'] = summarizeCompany(record)
+                stubs[id] = companyStub(record, writeShard(record, compact))
+                activity += activityEntries(id, record['log'])
+                for token, n in recordTerms(record).items():
+                    terms.setdefault(token, {})[id] = n
+            syncFolder(shardfolderPath)
+
+            index = CompanyIndex(stubs=stubs, activity=sorted(activity))
+            index.compact, index.terms, index.termsComplete = compact, terms, True
+            compactStore(index)
+
+    def retire(self):
+        "Moves this store's files aside into the backup, as after its data has been moved to another store."
+        with storeLock:
+            commitFiles(rotateOperations(storePaths))
+
+def openStore():
+    "Returns the store which holds the company index: the SQLite database if there is one, the datafile otherwise."
+    if os.path.exists(databasePath):
+        from sqlitestore import SQLiteStore
+        return SQLiteStore()
+    return JournalStore()
 
-    exit()
 
-# Open and read the datafile, if it exists
-try:
-    with open(datafilePath, 'r') as datafile:
-        string = datafile.read()
-        if string.strip():
-            companyIndex = json.loads(string)
-            backupSaveData = string
-except FileNotFoundError:
-    pass    # Nothing to read here — use default, empty companyIndex
-except json.decoder.JSONDecodeError as e:
-    print(e)
-    print('Failed: datafile for workboy exists, but could not be read')
-    exit()  # Force quit script
+####################################################################################################
+#### Script Variables                                                                           ####
+####################################################################################################
+
+# File path constants
+datafolderPath = '%LOCALAPPDATA%\\workboy'
+datafolderPath = os.path.expandvars(datafolderPath)
+datafilePath = os.path.join(datafolderPath, 'workboy_data')
+journalfilePath = os.path.join(datafolderPath, 'workboy_journal')
+shardfolderPath = os.path.join(datafolderPath, 'workboy_shards')
+termfolderPath = os.path.join(datafolderPath, 'workboy_term_shards')
+blobfolderPath = os.path.join(datafolderPath, 'workboy_blobs')
+archivefilePrefix = os.path.join(datafolderPath, 'workboy_archive')
+backupfilePath = os.path.join(datafolderPath, 'workboy_backup')
+backupJournalPath = os.path.join(datafolderPath, 'workboy_backup_journal')
+termsfilePath = os.path.join(datafolderPath, 'workboy_terms')
+backupTermsPath = os.path.join(datafolderPath, 'workboy_backup_terms')
+activityfilePath = os.path.join(datafolderPath, 'workboy_activity')
+backupActivityPath = os.path.join(datafolderPath, 'workboy_backup_activity')
+databasePath = os.path.join(datafolderPath, 'workboy.db')
+databaseBackupPath = os.path.join(datafolderPath, 'workboy_backup.db')
+serverSocketPath = os.path.join(datafolderPath, 'workboy.sock')
+lockfilePath = os.path.join(datafolderPath, 'workboy.lock')
+commitfilePath = os.path.join(datafolderPath, 'workboy_commit')
+storePaths = ((datafilePath, backupfilePath), (journalfilePath, backupJournalPath), (termsfilePath, backupTermsPath),
+    (activityfilePath, backupActivityPath))
+catalogfilePath = os.path.join(datafolderPath, 'workboy_catalog')
+
+saveOnExit = True               # Whether to save the contents of the company index on exiting the program.
+
+outputOptions = ['--json', '--no-pager', '--profile']    # Options which may be given anywhere among the arguments.
 
 
 ####################################################################################################
-#### Script Command Interpreter                                                                 ####
+#### Data Maintenance Commands                                                                  ####
 ####################################################################################################
 
-processorState = InputProcessorState(companyIndex, argv, globalRecordSet)
-inputProcessor(processorState)
+# These commands work on the data files themselves, before any company index would be read.
+
+def readIndexOrExit(store):
+    "Returns the company index read from the given store, or quits with a message if it can't be read."
+    try:
+        return store.load()
+    except ValueError as e:     # as raised by a malformed JSON, compact or database file
+        print(e)
+        print('Failed: datafile for workboy exists, but could not be read')
+        sys.exit(1)     # Force quit script
+
+def restoreBackup(argv):
+    "Restores backed-up old datafile."
+    if openStore().undo():
+        print('Backup data restored.')
+    else:
+        print('Failed: no backup file exists for workboy.')
+
+def compactDatafile(argv):
+    "Folds the journal into the datafile, and optionally closes up gaps in the company ID space."
+    with storeLock:
+        store = openStore()
+        index = readIndexOrExit(store)
+        if get(1, argv) == 'ids':
+            index.compactIDs()
+        store.compact(index)
+    print('Datafile compacted.')
+
+def convertDatafile(argv):
+    """Rewrites the datafile and every record in the compact or the JSON format, or moves them into a
+    SQLite database. The store converted from is kept as the backup."""
+    target = get(1, argv)
+    if target not in ('compact', 'json', 'sqlite'):
+        print("Failed: give the format to convert to, 'compact', 'json' or 'sqlite'.")
+        return
+
+    with storeLock:
+        source = openStore()
+        index = readIndexOrExit(source)
+        if target == 'sqlite':
+            if source.format == 'sqlite':
+                print('Datafile is already stored in sqlite.')
+                return
+            from sqlitestore import SQLiteStore
+            source.retire()
+            SQLiteStore().create(index)
+        else:
+            JournalStore().create(index, compact=(target == 'compact'))
+            if source.format == 'sqlite':
+                source.retire()
+    print('Datafile converted to {}.'.format(target))
+
+def runBatch(argv):
+    """Runs the commands listed one to a line in the given file, or read from stdin if it is '-', all
+    against one reading of the company index, then saves what they changed at once. Each line reads
+    as the arguments to one workboy call would. With '--atomic', nothing is saved if any line fails.
+    Returns the exit status."""
+    import shlex
+    global saveOnExit
+    atomic = '--atomic' in argv
+    source = get(0, [ arg for arg in argv[1:] if arg != '--atomic' ])
+    if source == None:
+        print("Failed: give the file to read commands from, or '-' for standard input.")
+        return 1
+
+    try:
+        if source == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(source, 'r') as batchfile:
+                lines = batchfile.read().splitlines()
+    except OSError as e:
+        print('Failed: could not read commands from {}: {}'.format(source, e.strerror))
+        return 1
+
+    store = openStore()
+    index = readIndexOrExit(store)
+    changed = set()
+    failures = []   # (line number, reason)
+    commands = 0
+    cancelled = False
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        commands += 1
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            failures.append((number, 'Input was malformed: {}.'.format(e)))
+            continue
+        if maintenanceCommandSet.switch(args[0]) or args[0] == 'help':
+            failures.append((number, "'{}' cannot be run from a batch.".format(args[0])))
+            continue
+
+        state = InputProcessorState(index, args, globalRecordSet)
+        state.pollingEnabled = False
+        state.interactive = False
+        rejected = len(rejections)
+        saveOnExit = True
+        try:
+            inputProcessor(state)
+        except Exception as e:      # one bad line should not cost the rest of the batch its save
+            failures.append((number, 'Failed with {}: {}'.format(type(e).__name__, e)))
+        failures += [ (number, reason) for reason in rejections[rejected:] ]
+        changed |= state.changed
+
+        # The display commands decline to save as well, but only a line which edited something and
+        # then cancelled takes the batch's edits with it, those being inseparable by then.
+        cancelled = cancelled or (not saveOnExit and bool(state.changed))
+
+    for number, reason in failures:
+        printBuffer('Line {}: {}'.format(number, reason))
+    failedLines = len(set( number for number, reason in failures ))
+    printBuffer('{} commands run, {} failed.'.format(commands, failedLines))
+
+    if cancelled or (atomic and failures):
+        printBuffer('Nothing was saved.')
+    elif changed:
+        if not store.save(index, changed):
+            return 1
+        printBuffer('Saved changes to {} companies.'.format(len(changed)))
+    displayBuffer()
+    return 1 if failures else 0
+
+def moduleCommand(module, name):
+    """Returns a maintenance command which runs the function name of the given module beside the script,
+    importing the module only then, so that what is kept there costs no other command anything."""
+    def command(argv):
+        import importlib
+        return getattr(importlib.import_module(module), name)(argv)
+    command.__name__ = name
+    return command
+
+maintenanceCommandSet = Switcher({
+    'restore-backup': restoreBackup,
+    'compact': compactDatafile,
+    'convert': convertDatafile,
+    'archive': moduleCommand('archives', 'archiveDatafile'),
+    'restore-archive': moduleCommand('archives', 'restoreArchive'),
+    'display-archives': moduleCommand('archives', 'displayArchives'),
+    'delete-archive': moduleCommand('archives', 'deleteArchive'),
+    'batch': runBatch,
+    'import': moduleCommand('importer', 'importCompanies'),
+    'bench': moduleCommand('benchmarks', 'runBenchmarks')
+    },
+    None
+    )
 
 
 ####################################################################################################
-#### Close Script                                                                               ####
+#### Main                                                                                       ####
 ####################################################################################################
 
-# Save the program and backup the old data collected before program execution.
-# saveOnExit = False
-if saveOnExit:
-    with open(backupfilePath, 'w') as backup:   # Save the last-known-working-copy of the datafile
-        backup.write(backupSaveData)
-    with open(datafilePath, 'w') as datafile:   # 
-        save = json.dumps(companyIndex)
-        datafile.write(save)
\ No newline at end of file
+def runCommand(argv, index):
+    """Carries out one workboy call's arguments against the company index, or a function which returns
+    it. Returns the exit status and the input processor's final state, which is None if a maintenance
+    command worked on the store directly."""
+    global saveOnExit
+    saveOnExit = True
+    rejections.clear()
+
+    output.machineReadable = '--json' in argv
+    output.paging = '--no-pager' not in argv
+    argv = [ arg for arg in argv if arg not in outputOptions and not arg.startswith('--profile=') ]
+
+    maintenanceCommand = maintenanceCommandSet.switch(get(0, argv))
+    if maintenanceCommand:
+        return (maintenanceCommand(argv) or 0), None
+
+    processorState = InputProcessorState(index, argv, globalRecordSet)
+    inputProcessor(processorState)
+    return processorState.status, processorState
+
+def profileTargets(argv):
+    """Returns where this call's profile should go, as a list of files, or None if it isn't being
+    profiled. An empty list means a summary on stderr."""
+    value = os.environ.get('WORKBOY_PROFILE', '')
+    for arg in argv:
+        if arg == '--profile':
+            value = '1'
+        elif arg.startswith('--profile='):
+            value = arg[len('--profile='):]
+    if value in ('', '0'):
+        return None
+    return [] if value == '1' else [ target for target in value.split(',') if target ]
+
+def main(argv=None):
+    "Runs workboy with the given arguments, by default the script's own. Returns the exit status."
+    argv = sys.argv[1:] if argv == None else argv   # Discards first since it is always 'workboy'
+
+    targets = profileTargets(argv)
+    if targets == None:
+        return runSession(argv)
+
+    import profiling
+    profiling.startProfiling(targets)
+    try:
+        return runSession(argv, forward=False)
+    finally:
+        profiling.finishProfiling(targets, argv)
+
+def runSession(argv, forward=True):
+    """Runs one workboy call's arguments, passing them to a running server if there is one and forward
+    is set. Returns the exit status."""
+    # Try to make the datafile directories if they do not exist
+    for path in (datafolderPath, shardfolderPath, termfolderPath, blobfolderPath):
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass
+
+    if get(0, argv) == 'serve':
+        import server
+        return server.serveCommands(argv)
+    if forward and os.path.exists(serverSocketPath):
+        import server
+        status = server.forwardCommand(argv)
+        if status != None:
+            return status
+
+    # The index is read when the first command asks for it, so 'help' never does.
+    store = openStore()
+    status, processorState = runCommand(argv, lambda: readIndexOrExit(store))
+
+    # Save the records changed this session; the previous state stays recoverable by 'restore-backup'.
+    if processorState and saveOnExit and processorState.changed:
+        if not store.save(processorState.index, processorState.changed):
+            return 1
+    return status
+
+if __name__ == '__main__':
+    sys.modules['workboy'] = sys.modules[__name__]      # so that the modules beside the script work on this same one
+    sys.exit(main())